@@ -0,0 +1,44 @@
+"""
+Agent Loop
+Runs one assistant turn: a completion, the tool calls it asks for, and
+follow-up completions until the model answers without calling tools.
+"""
+
+from typing import Callable, Optional
+from telemetry import span
+
+def _has_tool_calls(msg) -> bool:
+    return bool(getattr(msg, "tool_calls", None))
+
+def _record_tool_round(conversation_manager, msg, tool_outputs):
+    conversation_manager.add_assistant_message(msg)
+    for tool_output in tool_outputs:
+        conversation_manager.add_tool_message(
+            tool_output["tool_call_id"],
+            tool_output["name"],
+            tool_output["content"]
+        )
+
+async def arun_turn(conversation_manager, tool_executor, prompt: Optional[str] = None, stream: bool = False,
+                    on_delta: Optional[Callable[[str], None]] = None, source: str = "terminal"):
+    """
+    Run a turn on the asyncio runtime and return the final assistant message.
+    `source` (terminal, poll, webhook) labels the turn's span and metrics.
+    """
+    async with conversation_manager.alock():
+        with span("turn", source=source) as turn:
+            conversation_manager.merge_pending_notes()
+            if prompt is not None:
+                conversation_manager.add_user_message(prompt)
+
+            msg = await conversation_manager.acreate_chat_completion(stream=stream, on_delta=on_delta)
+            completions = 1
+            while _has_tool_calls(msg):
+                tool_outputs = await tool_executor.aprocess_tool_calls(msg.tool_calls)
+                _record_tool_round(conversation_manager, msg, tool_outputs)
+                msg = await conversation_manager.acreate_chat_completion(stream=stream, on_delta=on_delta)
+                completions += 1
+
+            conversation_manager.add_assistant_message(msg)
+            turn.set(completions=completions)
+            return msg
@@ -0,0 +1,10 @@
+"""
+Offline benchmarks
+Runs the assistant's hot paths against the fake OpenAI client and the fake
+Google HTTP layer, reports per-stage timings and compares them with earlier
+runs. From the agent directory:
+
+    python -m bench                      # every scenario, saved to the history
+    python -m bench -s tool_calls -n 50  # one scenario, more iterations
+    python -m bench --check              # exit 1 if a stage regressed
+"""
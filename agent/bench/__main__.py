@@ -0,0 +1,127 @@
+"""
+Benchmark runner
+python -m bench [-s SCENARIO ...] [-n ITERATIONS] [--check] ...
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# The scenarios change directory; keep the agent modules importable.
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AGENT_DIR not in sys.path:
+    sys.path.insert(0, AGENT_DIR)
+
+from stage_timer import get_stage_timer
+from bench import history
+from bench.scenarios import SCENARIOS, BenchEnvironment, get_scenario
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_scenario(name: str, iterations: int, env: BenchEnvironment, verbose: bool = False):
+    """Run a scenario `iterations` times; returns wall-clock and per-stage statistics."""
+    scenario = get_scenario(name)
+    timer = get_stage_timer()
+    # The pipeline prints as it goes; keep that out of the timings and the report.
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        scenario.setup(env)
+        timer.reset()
+        walls = []
+        try:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                scenario.run_once()
+                walls.append(time.perf_counter() - start)
+        finally:
+            scenario.teardown()
+    stages = timer.snapshot()
+    for stats in stages.values():
+        stats["per_iteration"] = stats["total"] / iterations
+    # The first iteration also builds clients and fills caches.
+    steady = walls[1:] or walls
+    return {
+        "wall": {
+            "first": walls[0],
+            "mean": sum(steady) / len(steady),
+            "p50": _percentile(steady, 0.5),
+            "p95": _percentile(steady, 0.95),
+            "max": max(steady),
+        },
+        "stages": stages,
+    }
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:9.2f}"
+
+def print_report(record, changes):
+    for name, result in record["scenarios"].items():
+        wall = result["wall"]
+        print(f"\n{name}: {SCENARIOS[name].description}")
+        print(f"  wall ms      first {_ms(wall['first'])}  p50 {_ms(wall['p50'])}  "
+              f"p95 {_ms(wall['p95'])}  max {_ms(wall['max'])}")
+        print(f"  {'stage':<28}{'calls/it':>9}{'ms/it':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        iterations = record["config"]["iterations"]
+        for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["total"]):
+            print(f"  {stage:<28}{stats['count'] / iterations:9.1f}{_ms(stats['per_iteration'])} "
+                  f"{_ms(stats['p50'])} {_ms(stats['p95'])}")
+    if changes is None:
+        print("\nNo earlier run with these settings to compare with.")
+        return
+    if not changes:
+        print("\nNo changes beyond the threshold since the previous run.")
+        return
+    print("\nChanges since the previous run:")
+    for change in changes:
+        label = "REGRESSION" if change["regression"] else "improvement"
+        print(f"  {label:<12}{change['scenario']:<12}{change['metric']:<28}"
+              f"{_ms(change['before'])} -> {_ms(change['after'])} ms ({change['change']:+.0%})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline benchmarks for Jarvis.")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--google-latency", type=float, default=0.02, help="seconds per Google HTTP round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per chat completion")
+    parser.add_argument("--history", default=history.HISTORY_FILE, help="JSON lines file of earlier runs")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--threshold", type=float, default=history.THRESHOLD,
+                        help="relative change reported as a regression or improvement")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if anything regressed")
+    parser.add_argument("--json", action="store_true", help="print the run record as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(SCENARIOS)
+    config = {"scenarios": sorted(names), "iterations": args.iterations,
+              "google_latency": args.google_latency, "llm_latency": args.llm_latency}
+    timer = get_stage_timer()
+    timer.enabled = True
+    record = {"timestamp": datetime.now(timezone.utc).isoformat(), "commit": history.current_commit(),
+              "config": config, "scenarios": {}}
+    for name in names:
+        with BenchEnvironment(google_latency=args.google_latency, llm_latency=args.llm_latency) as env:
+            record["scenarios"][name] = run_scenario(name, args.iterations, env, verbose=args.verbose)
+
+    previous = history.previous_run(history.load(args.history), config)
+    changes = history.compare(record, previous, threshold=args.threshold) if previous else None
+    if args.json:
+        print(json.dumps(record, indent=2))
+    else:
+        print_report(record, changes)
+    if not args.no_save:
+        history.append(record, args.history)
+    if args.check and changes and any(change["regression"] for change in changes):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Benchmark history
+Stores one JSON line per run and compares a run with the latest earlier run
+made with the same settings.
+"""
+
+import json
+import os
+import subprocess
+from typing import Any, Dict, List, Optional
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl")
+# A timing counts as changed when it moves by more than this fraction...
+THRESHOLD = 0.15
+# ...and by more than this many seconds, so sub-millisecond noise is ignored.
+MIN_DELTA_SECONDS = 0.0005
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def load(path: str = HISTORY_FILE) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append(record: Dict[str, Any], path: str = HISTORY_FILE):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+def previous_run(records: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The latest record made with the same settings."""
+    for record in reversed(records):
+        if record.get("config") == config:
+            return record
+    return None
+
+def _metrics(scenario: Dict[str, Any]) -> Dict[str, float]:
+    """Comparable numbers of a scenario result: wall p50 and per-iteration time of each stage."""
+    metrics = {"wall p50": scenario["wall"]["p50"]}
+    for stage, stats in scenario["stages"].items():
+        metrics[stage] = stats["per_iteration"]
+    return metrics
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any], threshold: float = THRESHOLD,
+            min_delta: float = MIN_DELTA_SECONDS) -> List[Dict[str, Any]]:
+    """Timings that moved beyond the threshold, worst regressions first."""
+    changes = []
+    for name, scenario in current["scenarios"].items():
+        before = previous["scenarios"].get(name)
+        if before is None:
+            continue
+        old_metrics = _metrics(before)
+        for metric, new in _metrics(scenario).items():
+            old = old_metrics.get(metric)
+            if old is None or abs(new - old) <= min_delta:
+                continue
+            ratio = new / old if old else float("inf")
+            if ratio > 1 + threshold or ratio < 1 - threshold:
+                changes.append({"scenario": name, "metric": metric, "before": old, "after": new,
+                                "change": ratio - 1, "regression": ratio > 1})
+    changes.sort(key=lambda c: -c["change"])
+    return changes
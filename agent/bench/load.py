@@ -0,0 +1,347 @@
+"""
+Load generator
+Replays a synthetic stream of emails through the real email pipeline
+(JarvisAssistant's sync, poller, webhook intake and workers) against the
+fake Gmail, Calendar and OpenAI backends, and reports throughput, queueing
+delay, end-to-end latency percentiles and the growth of the main
+conversation's messages.
+
+    python -m bench.load --rate 120 --duration 60
+    python -m bench.load --rate 600 --duration 30 --webhook-share 0.5 --llm-latency 0.8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if AGENT_DIR not in sys.path:
+    sys.path.insert(0, AGENT_DIR)
+
+from bench.scenarios import BenchEnvironment, _tomorrow_at, _last_tool_result
+from email_processor import WEBHOOK_FILE
+from email_queue import message_key
+from fakes.openai_client import FakeAsyncOpenAI, ScriptedResponder
+from poll_scheduler import AdaptivePollScheduler
+
+CONTACT = "Ahmed Shehata <ahmedshehata20047@gmail.com>"
+# Body sizes in characters and how often each occurs.
+BODY_SIZES = ((300, 0.6), (3000, 0.3), (30000, 0.1))
+DEFAULT_MIX = "reschedule=3,cancel=1,meeting=2,confirm=1,newsletter=3"
+# Seconds between samples of the conversation and queue sizes.
+SAMPLE_INTERVAL = 1.0
+
+# kind -> (sender, subject, opening line, extra headers). Subjects double as
+# the fake model's script triggers.
+KINDS = {
+    "reschedule": (CONTACT, "Reschedule request", "Could we reschedule tomorrow's sync to the afternoon?", {}),
+    "cancel": (CONTACT, "Cancel our sync", "Sorry, I have to cancel our sync tomorrow.", {}),
+    "meeting": ("Lina Farouk <lina@partner.example>", "Meeting request",
+                "Would you be available for a meeting tomorrow to discuss the proposal?", {}),
+    "confirm": (CONTACT, "Confirmed", "Confirmed, see you then.", {}),
+    "newsletter": ("Weekly Digest <news@digest.example>", "This week in product",
+                   "Our top stories of the week.", {"List-Unsubscribe": "<mailto:unsubscribe@digest.example>"}),
+}
+
+def _percentile(samples: List[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _distribution(samples: List[float]) -> Dict[str, Optional[float]]:
+    return {"count": len(samples), "p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95),
+            "p99": _percentile(samples, 0.99), "max": max(samples) if samples else None}
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown email kind {kind!r}; choose from {', '.join(KINDS)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def build_responder() -> ScriptedResponder:
+    """Model script per email kind: look up the calendar, act on the first event found, answer."""
+    day = _tomorrow_at(0)
+    window = {"time_min": day.isoformat(), "time_max": (day + timedelta(days=1)).isoformat()}
+
+    def act_on_event(tool_name: str):
+        def step(messages):
+            events = _last_tool_result(messages, "list_events") or []
+            if not events:
+                return {"content": "I could not find that meeting on the calendar."}
+            arguments = {"event_id": events[0]["id"]}
+            if tool_name == "update_event":
+                arguments.update(start=_tomorrow_at(15).isoformat(), end=_tomorrow_at(16).isoformat())
+            return {"tool_calls": [{"name": tool_name, "arguments": arguments}]}
+        return step
+
+    slot = {"start": _tomorrow_at(11).isoformat(), "end": _tomorrow_at(12).isoformat()}
+    return ScriptedResponder([
+        ("subject: reschedule request", [
+            {"tool_calls": [{"name": "list_events", "arguments": window}]},
+            act_on_event("update_event"),
+            {"content": "Moved the sync to 15:00 tomorrow."},
+        ]),
+        ("subject: cancel our sync", [
+            {"tool_calls": [{"name": "list_events", "arguments": window}]},
+            act_on_event("delete_event"),
+            {"content": "Cancelled the sync."},
+        ]),
+        ("subject: meeting request", [
+            {"tool_calls": [{"name": "check_availability", "arguments": slot}]},
+            {"tool_calls": [{"name": "send_email", "arguments": {
+                "to": "lina@partner.example", "subject": "Re: Meeting request",
+                "message_text": "Tomorrow at 11:00 works for me."}}]},
+            {"content": "Proposed tomorrow at 11:00 to Lina."},
+        ]),
+    ])
+
+
+class LoadGenerator:
+    """
+    Injects emails at `rate` per minute (exponential gaps) for `duration`
+    seconds, a `webhook_share` of them through new_emails.json and the rest
+    into the fake Gmail inbox for the poller, then waits up to `drain`
+    seconds for the pipeline to finish them.
+    """
+
+    def __init__(self, env: BenchEnvironment, rate: float, duration: float, mix: Dict[str, float],
+                 webhook_share: float = 0.3, poll_interval: float = 2.0, webhook_interval: float = 1.0,
+                 workers: Optional[int] = None, drain: float = 120.0, seed: int = 1):
+        from main import JarvisAssistant, EMAIL_WORKERS
+
+        self.env = env
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.webhook_share = webhook_share
+        self.webhook_interval = webhook_interval
+        self.workers = workers or EMAIL_WORKERS
+        self.drain = drain
+        self.random = random.Random(seed)
+        responder = build_responder()
+        self.assistant = JarvisAssistant(stream=False, async_client=FakeAsyncOpenAI(responder, latency=env.llm_latency))
+        self.processor = self.assistant.email_processor
+        self.processor.poll_scheduler = AdaptivePollScheduler(min_interval=poll_interval,
+                                                              max_interval=poll_interval * 4)
+        # message key -> {"kind", "path", "injected", "started", "finished"}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.samples: List[Dict[str, Any]] = []
+        self._webhook_id = 0
+        self._seed_calendar()
+        self._track_processing()
+
+    def _seed_calendar(self):
+        # Enough events for every reschedule and cancellation to find one.
+        expected = int(self.rate * self.duration / 60) + 10
+        for i in range(expected):
+            hour = 8 + i % 10
+            self.env.http.calendar.add_event(f"Sync {i}", _tomorrow_at(hour).isoformat(),
+                                             _tomorrow_at(hour + 1).isoformat(), attendees=[CONTACT.split("<")[1][:-1]])
+
+    def _track_processing(self):
+        """Timestamp every email as a worker picks it up and as it finishes."""
+        process = self.processor.aprocess_email
+
+        async def tracked(email, source="poll"):
+            record = self.records.get(message_key(email))
+            if record is not None:
+                record.setdefault("started", time.perf_counter())
+            try:
+                return await process(email, source)
+            finally:
+                if record is not None:
+                    record["finished"] = time.perf_counter()
+
+        self.processor.aprocess_email = tracked
+
+    def _body(self, opening: str) -> str:
+        size = self.random.choices([s for s, _ in BODY_SIZES], [w for _, w in BODY_SIZES])[0]
+        filler = " Lorem ipsum dolor sit amet, consectetur adipiscing elit."
+        return (opening + filler * (size // len(filler) + 1))[:size]
+
+    def _inject(self, kind: str):
+        sender, subject, opening, headers = KINDS[kind]
+        body = self._body(opening)
+        if self.random.random() < self.webhook_share:
+            self._webhook_id += 1
+            email = {"id": f"webhook{self._webhook_id:06d}", "from": sender, "subject": subject, "body": body,
+                     "snippet": body[:100], "list_unsubscribe": headers.get("List-Unsubscribe", "")}
+            self._append_webhook(email)
+            key, path = message_key(email), "webhook"
+        else:
+            key = self.env.http.gmail.add_message(sender, subject, body, extra_headers=headers or None)
+            path = "poll"
+        self.records[key] = {"kind": kind, "path": path, "injected": time.perf_counter()}
+
+    def _append_webhook(self, email: Dict[str, Any]):
+        # Like the webhook: add to whatever has not been picked up yet, replace atomically.
+        try:
+            with open(WEBHOOK_FILE) as f:
+                emails = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            emails = []
+        emails.append(email)
+        with open(WEBHOOK_FILE + ".tmp", "w") as f:
+            json.dump(emails, f)
+        os.replace(WEBHOOK_FILE + ".tmp", WEBHOOK_FILE)
+
+    def _sample(self, start: float):
+        messages = self.assistant.conversation_manager.messages
+        finished = sum(1 for r in self.records.values() if "finished" in r)
+        depth = self.processor.queue.depth()
+        self.samples.append({
+            "t": time.perf_counter() - start,
+            "injected": len(self.records),
+            "finished": finished,
+            "queue_depth": depth.get("ready", 0) + depth.get("leased", 0),
+            "messages": len(messages),
+            "message_chars": sum(len(str(m.get("content") or "")) if isinstance(m, dict)
+                                 else len(str(getattr(m, "content", "") or "")) for m in messages),
+            "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        })
+
+    async def _sampler(self, start: float):
+        while True:
+            self._sample(start)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def run(self) -> Dict[str, Any]:
+        background, receiver = self.assistant._start_pipeline(webhook_interval=self.webhook_interval,
+                                                              workers=self.workers)
+        start = time.perf_counter()
+        sampler = asyncio.create_task(self._sampler(start))
+        kinds, weights = list(self.mix), list(self.mix.values())
+        try:
+            next_at = start
+            while True:
+                next_at += self.random.expovariate(self.rate / 60)
+                if next_at - start > self.duration:
+                    break
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                await asyncio.to_thread(self._inject, self.random.choices(kinds, weights)[0])
+            injected_until = time.perf_counter()
+            deadline = injected_until + self.drain
+            while time.perf_counter() < deadline and any("finished" not in r for r in self.records.values()):
+                await asyncio.sleep(0.1)
+            end = time.perf_counter()
+        finally:
+            sampler.cancel()
+            await self.assistant._stop_pipeline(background, receiver)
+            self._sample(start)
+        return self._report(start, injected_until, end)
+
+    def _report(self, start: float, injected_until: float, end: float) -> Dict[str, Any]:
+        done = [r for r in self.records.values() if "finished" in r]
+        latency = [r["finished"] - r["injected"] for r in done]
+        queueing = [r["started"] - r["injected"] for r in done if "started" in r]
+        by_path, by_kind = {}, {}
+        for r in done:
+            by_path.setdefault(r["path"], []).append(r["finished"] - r["injected"])
+            by_kind.setdefault(r["kind"], []).append(r["finished"] - r["injected"])
+        elapsed = (max(r["finished"] for r in done) - start) if done else end - start
+        first, last = self.samples[0], self.samples[-1]
+        return {
+            "injected": len(self.records),
+            "completed": len(done),
+            "unfinished": len(self.records) - len(done),
+            "offered_per_minute": len(self.records) / (injected_until - start) * 60,
+            "throughput_per_minute": len(done) / elapsed * 60 if elapsed else 0.0,
+            "latency": _distribution(latency),
+            "queueing_delay": _distribution(queueing),
+            "latency_by_path": {path: _distribution(values) for path, values in by_path.items()},
+            "latency_by_kind": {kind: _distribution(values) for kind, values in by_kind.items()},
+            "kinds": dict(Counter(r["kind"] for r in self.records.values())),
+            "model_calls": self.assistant.conversation_manager.get_async_client().calls,
+            "conversation": {
+                "messages_start": first["messages"], "messages_end": last["messages"],
+                "chars_start": first["message_chars"], "chars_end": last["message_chars"],
+                "messages_per_100_emails": (last["messages"] - first["messages"]) / len(done) * 100 if done else 0.0,
+            },
+            "memory": {"traced_start": first["traced_bytes"], "traced_end": last["traced_bytes"],
+                       "traced_peak": tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None},
+            "samples": self.samples,
+        }
+
+
+def _s(value: Optional[float]) -> str:
+    return "      -" if value is None else f"{value:7.2f}"
+
+def print_report(report: Dict[str, Any]):
+    print(f"Injected {report['injected']} emails ({report['offered_per_minute']:.0f}/min offered): "
+          f"{report['completed']} completed, {report['unfinished']} unfinished")
+    print(f"Throughput: {report['throughput_per_minute']:.0f} emails/min, {report['model_calls']} model calls")
+    print(f"Mix: {', '.join(f'{k}={v}' for k, v in sorted(report['kinds'].items()))}")
+    print(f"\n{'seconds':<24}{'count':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    rows = [("end-to-end", report["latency"]), ("queueing delay", report["queueing_delay"])]
+    rows += [(f"  path {path}", dist) for path, dist in sorted(report["latency_by_path"].items())]
+    rows += [(f"  kind {kind}", dist) for kind, dist in sorted(report["latency_by_kind"].items())]
+    for label, dist in rows:
+        print(f"{label:<24}{dist['count']:>7} {_s(dist['p50'])} {_s(dist['p95'])} {_s(dist['p99'])} {_s(dist['max'])}")
+    conversation = report["conversation"]
+    print(f"\nMain conversation: {conversation['messages_start']} -> {conversation['messages_end']} messages, "
+          f"{conversation['chars_start']} -> {conversation['chars_end']} characters "
+          f"({conversation['messages_per_100_emails']:.0f} messages per 100 emails)")
+    memory = report["memory"]
+    if memory["traced_end"] is not None:
+        print(f"Traced memory: {memory['traced_start'] / 1e6:.1f} -> {memory['traced_end'] / 1e6:.1f} MB "
+              f"(peak {memory['traced_peak'] / 1e6:.1f} MB)")
+    print(f"\n{'t':>6}{'injected':>10}{'finished':>10}{'queued':>8}{'messages':>10}")
+    step = max(1, len(report["samples"]) // 15)
+    rows = report["samples"][::step]
+    if rows[-1] is not report["samples"][-1]:
+        rows.append(report["samples"][-1])
+    for sample in rows:
+        print(f"{sample['t']:6.1f}{sample['injected']:10}{sample['finished']:10}{sample['queue_depth']:8}"
+              f"{sample['messages']:10}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description="Email load test for Jarvis.")
+    parser.add_argument("--rate", type=float, default=60, help="emails per minute")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of injection")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"relative weights per kind (default: {DEFAULT_MIX})")
+    parser.add_argument("--webhook-share", type=float, default=0.3, help="fraction sent through new_emails.json")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="shortest seconds between Gmail polls")
+    parser.add_argument("--webhook-interval", type=float, default=1.0, help="seconds between webhook file checks")
+    parser.add_argument("--workers", type=int, help="email workers (default: as in main.py)")
+    parser.add_argument("--drain", type=float, default=120.0, help="most seconds to wait for the backlog")
+    parser.add_argument("--google-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python memory (slower)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with BenchEnvironment(google_latency=args.google_latency, llm_latency=args.llm_latency) as env:
+        with output:
+            generator = LoadGenerator(env, args.rate, args.duration, args.mix, webhook_share=args.webhook_share,
+                                      poll_interval=args.poll_interval, webhook_interval=args.webhook_interval,
+                                      workers=args.workers, drain=args.drain, seed=args.seed)
+            report = asyncio.run(generator.run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["unfinished"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Benchmark scenarios
+Each scenario sets up its part of the pipeline once against the fakes and
+then runs one unit of work per run_once() call.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from fakes.google_http import FakeGoogleHttp
+from fakes.openai_client import FakeOpenAI, FakeAsyncOpenAI, ScriptedResponder
+from tools.oauth_integration import get_registry
+from tools.mail_tools import get_emails
+
+TIME_ZONE = ZoneInfo('Africa/Cairo')
+
+
+def _tomorrow_at(hour: int) -> datetime:
+    day = datetime.now(TIME_ZONE).date() + timedelta(days=1)
+    return datetime(day.year, day.month, day.day, hour, tzinfo=TIME_ZONE)
+
+
+def _last_tool_result(messages: List[Any], name: str) -> Any:
+    for message in reversed(messages):
+        if isinstance(message, dict) and message.get("role") == "tool" and message.get("name") == name:
+            return json.loads(message["content"])
+    return None
+
+
+class BenchEnvironment:
+    """
+    Shared fakes for one benchmark run: a FakeGoogleHttp with `google_latency`
+    per round trip routed through the client registry, and a scratch working
+    directory for the SQLite files the email pipeline creates.
+    """
+
+    def __init__(self, google_latency: float = 0.02, llm_latency: float = 0.05):
+        self.google_latency = google_latency
+        self.llm_latency = llm_latency
+        self.http = FakeGoogleHttp(latency=google_latency)
+        self._workdir = tempfile.TemporaryDirectory(prefix="jarvis-bench-")
+        self._previous_cwd = None
+
+    def __enter__(self):
+        # SystemConfig warns when no key is set; the fakes never use it.
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        self._previous_cwd = os.getcwd()
+        os.chdir(self._workdir.name)
+        get_registry().use_transport(self.http)
+        return self
+
+    def __exit__(self, *exc):
+        get_registry().use_transport(None)
+        os.chdir(self._previous_cwd)
+        self._workdir.cleanup()
+        return False
+
+
+class Scenario:
+    name = ""
+    description = ""
+
+    def setup(self, env: BenchEnvironment):
+        raise NotImplementedError
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+
+class UserTurnScenario(Scenario):
+    """JarvisAssistant._aprocess_user_input: two reads in parallel, a create with a guest, the reply."""
+
+    name = "user_turn"
+    description = "scheduling request from the terminal (3 model calls, 3 tools, 1 invitation)"
+
+    def setup(self, env: BenchEnvironment):
+        from main import JarvisAssistant
+
+        start, end = _tomorrow_at(10), _tomorrow_at(11)
+        window = {"time_min": start.replace(hour=0).isoformat(), "time_max": start.replace(hour=23).isoformat()}
+        slot = {"start": start.isoformat(), "end": end.isoformat()}
+        responder = ScriptedResponder([
+            ("schedule a meeting with ahmed", [
+                {"tool_calls": [{"name": "check_availability", "arguments": slot},
+                                {"name": "list_events", "arguments": window}]},
+                {"tool_calls": [{"name": "create_event", "arguments": dict(
+                    slot, summary="Meeting with Ahmed", guests=["ahmedshehata20047@gmail.com"])}]},
+                {"content": "Your meeting with Ahmed is booked for tomorrow at 10:00 and he has been invited."},
+            ]),
+        ])
+        self.loop = asyncio.new_event_loop()
+        self.assistant = JarvisAssistant(stream=False, async_client=FakeAsyncOpenAI(responder, latency=env.llm_latency))
+        self.initial_messages = list(self.assistant.conversation_manager.messages)
+
+    def run_once(self):
+        self.assistant.conversation_manager.messages = list(self.initial_messages)
+        if self.assistant.tool_executor.cache is not None:
+            self.assistant.tool_executor.cache.clear()
+        self.loop.run_until_complete(
+            self.assistant._aprocess_user_input("Schedule a meeting with Ahmed tomorrow at 10am for an hour"))
+
+    def teardown(self):
+        self.loop.close()
+        self.assistant.email_processor.queue.close()
+        self.assistant.email_processor.ledger.close()
+
+
+class ToolCallsScenario(Scenario):
+    """ToolExecutor.process_tool_calls on a typical mixed batch."""
+
+    name = "tool_calls"
+    description = "4 concurrent reads followed by a write, uncached"
+
+    def setup(self, env: BenchEnvironment):
+        from tool_executor import ToolExecutor
+
+        for hour in (9, 12, 15):
+            env.http.calendar.add_event(f"Block {hour}", _tomorrow_at(hour).isoformat(),
+                                        _tomorrow_at(hour + 1).isoformat())
+        for i in range(10):
+            env.http.gmail.add_message(f"sender{i}@example.com", f"Subject {i}", "Body " * 50)
+        self.executor = ToolExecutor(require_confirmation=False)
+        day = _tomorrow_at(0)
+        calls = [
+            ("list_events", {"time_min": day.isoformat(), "time_max": (day + timedelta(days=1)).isoformat()}),
+            ("check_availability", {"start": _tomorrow_at(10).isoformat(), "end": _tomorrow_at(11).isoformat()}),
+            ("find_free_slots", {"duration_minutes": 60, "time_min": day.isoformat()}),
+            ("list_emails", {"headers_only": True}),
+            ("create_event", {"summary": "Bench", "start": _tomorrow_at(17).isoformat(),
+                              "end": _tomorrow_at(18).isoformat()}),
+        ]
+        # Shaped like the tool calls of an assistant message.
+        self.tool_calls = FakeOpenAI()._tool_calls({"tool_calls": [
+            {"name": name, "arguments": arguments} for name, arguments in calls
+        ]})
+
+    def run_once(self):
+        if self.executor.cache is not None:
+            self.executor.cache.clear()
+        self.executor.process_tool_calls(self.tool_calls)
+
+
+class EmailScenario(Scenario):
+    """EmailProcessor.aprocess_email for a reschedule request from a contact."""
+
+    name = "email"
+    description = "polled reschedule email from a contact (3 model calls, list + update)"
+
+    def setup(self, env: BenchEnvironment):
+        from conversation_manager import ConversationManager
+        from email_processor import EmailProcessor
+        from system_config import SystemConfig
+        from tool_executor import ToolExecutor
+
+        self.http = env.http
+        self.event = env.http.calendar.add_event(
+            "Sync with Ahmed", _tomorrow_at(10).isoformat(), _tomorrow_at(11).isoformat(),
+            attendees=["ahmedshehata20047@gmail.com"])
+
+        def update_found_event(messages):
+            events = _last_tool_result(messages, "list_events") or []
+            event_id = events[0]["id"] if events else self.event["id"]
+            return {"tool_calls": [{"name": "update_event", "arguments": {
+                "event_id": event_id, "start": _tomorrow_at(14).isoformat(), "end": _tomorrow_at(15).isoformat()}}]}
+
+        day = _tomorrow_at(0)
+        responder = ScriptedResponder([
+            ("subject: can we move our sync", [
+                {"tool_calls": [{"name": "list_events", "arguments": {
+                    "time_min": day.isoformat(), "time_max": (day + timedelta(days=1)).isoformat()}}]},
+                update_found_event,
+                {"content": "Moved the sync with Ahmed to tomorrow at 14:00."},
+            ]),
+        ])
+        self.loop = asyncio.new_event_loop()
+        conversation = ConversationManager(SystemConfig(), async_client=FakeAsyncOpenAI(responder, latency=env.llm_latency))
+        self.processor = EmailProcessor(conversation, ToolExecutor(require_confirmation=False))
+        self.count = 0
+
+    def _new_email(self) -> Dict[str, Any]:
+        self.count += 1
+        message_id = self.http.gmail.add_message(
+            "Ahmed Shehata <ahmedshehata20047@gmail.com>", "Can we move our sync",
+            f"Hi David, could we reschedule tomorrow's sync to the afternoon? ({self.count})")
+        emails, _ = get_emails([message_id])
+        return emails[0]
+
+    def run_once(self):
+        email = self._new_email()
+        self.loop.run_until_complete(self.processor.aprocess_email(email, source="poll"))
+
+    def teardown(self):
+        self.loop.close()
+        self.processor.queue.close()
+        self.processor.ledger.close()
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (UserTurnScenario, ToolCallsScenario, EmailScenario)}
+
+
+def get_scenario(name: str) -> Optional[Scenario]:
+    scenario = SCENARIOS.get(name)
+    return scenario() if scenario is not None else None
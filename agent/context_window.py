@@ -0,0 +1,158 @@
+"""
+Context Window
+Keeps the conversation sent to the model within a token budget.
+"""
+
+from typing import List, Dict, Any, Callable, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate.
+    tiktoken = None
+
+# Room left for the messages once the model's context (16k for
+# gpt-3.5-turbo) has made space for tool schemas and the reply.
+DEFAULT_MAX_TOKENS = 12000
+# Upper bound for the running summary of evicted turns.
+SUMMARY_MAX_TOKENS = 800
+# Characters kept from each side of an evicted turn in the default summary.
+SUMMARY_SNIPPET_CHARS = 160
+# Fixed per-message cost of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of earlier conversation (older messages were removed to save space):\n"
+
+def _field(message: Any, name: str, default=None):
+    if isinstance(message, dict):
+        return message.get(name, default)
+    return getattr(message, name, default)
+
+def _default_summarizer(evicted_turns: List[List[Any]], previous_summary: str) -> str:
+    """Summarize evicted turns locally: the request and the final answer of each."""
+    lines = [previous_summary] if previous_summary else []
+    for turn in evicted_turns:
+        request = next((_field(m, "content") for m in turn if _field(m, "role") == "user"), "")
+        answer = next((_field(m, "content") for m in reversed(turn)
+                       if _field(m, "role") == "assistant" and _field(m, "content")), "")
+        tools = sorted({_field(m, "name") for m in turn if _field(m, "role") == "tool"})
+        if not (request or answer):
+            continue
+        line = f"- Asked: {(request or '').strip()[:SUMMARY_SNIPPET_CHARS]}"
+        if tools:
+            line += f" | Tools: {', '.join(tools)}"
+        if answer:
+            line += f" | Answered: {answer.strip()[:SUMMARY_SNIPPET_CHARS]}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class ContextWindow:
+    """
+    Token accounting and eviction for a chat message list.
+
+    Messages are grouped into turns: a user message plus every assistant and
+    tool message that follows it. Whole turns are evicted oldest first, so an
+    assistant tool_calls message is never separated from its tool results.
+    The system prompt is always kept; evicted turns are folded into a running
+    summary pinned right after it.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 summarizer: Optional[Callable[[List[List[Any]], str], str]] = _default_summarizer,
+                 model: str = "gpt-3.5-turbo"):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        # id(message) -> (message, tokens). The message is kept so its id
+        # cannot be reused by another object while the entry exists.
+        self._counts: Dict[int, tuple] = {}
+        self._summary_message: Optional[Dict[str, str]] = None
+        self.stats = {"evicted_turns": 0, "evicted_messages": 0, "evicted_tokens": 0, "last_total_tokens": 0}
+
+    def _count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def count(self, message: Any) -> int:
+        """Return the token count of one message, memoized."""
+        cached = self._counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        tokens = MESSAGE_OVERHEAD_TOKENS + self._count_text(_field(message, "content") or "")
+        for tool_call in _field(message, "tool_calls") or []:
+            function = _field(tool_call, "function")
+            tokens += self._count_text(_field(function, "name") or "")
+            tokens += self._count_text(_field(function, "arguments") or "")
+        self._counts[id(message)] = (message, tokens)
+        return tokens
+
+    def total(self, messages: List[Any]) -> int:
+        """Return the token count of a whole message list."""
+        return sum(self.count(m) for m in messages)
+
+    def _split(self, messages: List[Any]):
+        """Split into (pinned head, turns)."""
+        head_len = 1 if messages and _field(messages[0], "role") == "system" else 0
+        if self._summary_message is not None and len(messages) > head_len and messages[head_len] is self._summary_message:
+            head_len += 1
+        turns = []
+        for message in messages[head_len:]:
+            if not turns or _field(message, "role") == "user":
+                turns.append([])
+            turns[-1].append(message)
+        return messages[:head_len], turns
+
+    def fit(self, messages: List[Any]) -> int:
+        """
+        Trim `messages` in place until it fits the budget and return its token count.
+        The most recent turn is always kept, even when it alone is over budget.
+        """
+        total = self.total(messages)
+        if total <= self.max_tokens:
+            self.stats["last_total_tokens"] = total
+            return total
+
+        head, turns = self._split(messages)
+        # Leave room for the summary that replaces the evicted turns.
+        target = self.max_tokens - (SUMMARY_MAX_TOKENS if self.summarizer is not None else 0)
+        evicted = []
+        while len(turns) > 1 and total > target:
+            turn = turns.pop(0)
+            turn_tokens = sum(self.count(m) for m in turn)
+            evicted.append(turn)
+            total -= turn_tokens
+            self.stats["evicted_turns"] += 1
+            self.stats["evicted_messages"] += len(turn)
+            self.stats["evicted_tokens"] += turn_tokens
+
+        if evicted and self.summarizer is not None:
+            head = self._update_summary(head, evicted)
+
+        kept = head + [m for turn in turns for m in turn]
+        messages[:] = kept
+        live = {id(m) for m in kept}
+        self._counts = {key: value for key, value in self._counts.items() if key in live}
+        total = self.total(messages)
+        self.stats["last_total_tokens"] = total
+        return total
+
+    def _update_summary(self, head: List[Any], evicted: List[List[Any]]) -> List[Any]:
+        previous = ""
+        if any(m is self._summary_message for m in head):
+            previous = self._summary_message["content"][len(SUMMARY_PREFIX):]
+            head = [m for m in head if m is not self._summary_message]
+        summary = self.summarizer(evicted, previous)
+        # Keep the summary itself bounded by dropping its oldest lines.
+        lines = summary.splitlines()
+        while len(lines) > 1 and self._count_text("\n".join(lines)) > SUMMARY_MAX_TOKENS:
+            lines.pop(0)
+        self._summary_message = {"role": "system", "content": SUMMARY_PREFIX + "\n".join(lines)}
+        return head + [self._summary_message]
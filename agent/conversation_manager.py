@@ -3,17 +3,94 @@ Conversation Manager
 Handles conversation flow, message management, and user interactions.
 """
 
+import asyncio
 import json
-from typing import List, Dict, Any
-from langfuse.openai import openai
+import threading
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import List, Dict, Any, Callable, Optional
+from langfuse.openai import openai, AsyncOpenAI
 from system_config import SystemConfig
-from tools.calendar_tools import get_list_events_schema, get_create_event_schema, get_update_event_schema, get_delete_event_schema
-from tools.mail_tools import get_list_emails_schema, get_send_email_schema
-from tools.todos_tools import get_list_tasks_schema, get_add_task_schema, get_complete_task_schema
-from tools.process_new_emails_tools import get_process_new_email_schema
+from context_window import ContextWindow, DEFAULT_MAX_TOKENS
+from stage_timer import timed
+from telemetry import span
+from tools.registry import get_tool_registry
+
+# Chat model for every completion.
+MODEL = "gpt-3.5-turbo"
+
+def _cached_tokens(usage) -> int:
+    """Prompt tokens the provider served from its prompt cache (0 when not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+class _StreamAssembler:
+    """
+    Rebuilds the assistant message from a streamed completion.
+    Content deltas are passed to on_delta as they arrive. Tool calls arrive as
+    fragments keyed by index: the first carries the id and function name, the
+    rest append to the arguments string.
+    """
+
+    def __init__(self, on_delta: Optional[Callable[[str], None]] = None):
+        self.on_delta = on_delta
+        self.content_parts = []
+        self.tool_calls = {}
+        self.usage = None
+
+    def feed(self, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            # Sent in a final chunk without choices when include_usage is requested.
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        if delta.content:
+            self.content_parts.append(delta.content)
+            if self.on_delta is not None:
+                self.on_delta(delta.content)
+        for fragment in delta.tool_calls or []:
+            call = self.tool_calls.setdefault(fragment.index, SimpleNamespace(
+                id=None, type="function", function=SimpleNamespace(name="", arguments="")
+            ))
+            if fragment.id:
+                call.id = fragment.id
+            if fragment.function is not None:
+                if fragment.function.name:
+                    call.function.name += fragment.function.name
+                if fragment.function.arguments:
+                    call.function.arguments += fragment.function.arguments
+
+    def message(self) -> SimpleNamespace:
+        return SimpleNamespace(
+            role="assistant",
+            content="".join(self.content_parts) or None,
+            tool_calls=[self.tool_calls[index] for index in sorted(self.tool_calls)] or None,
+            usage=self.usage,
+        )
+
+def _assemble_stream(stream, on_delta: Optional[Callable[[str], None]] = None) -> SimpleNamespace:
+    """Consume a streamed completion and return the assembled message."""
+    assembler = _StreamAssembler(on_delta)
+    for chunk in stream:
+        assembler.feed(chunk)
+    return assembler.message()
+
+async def _assemble_stream_async(stream, on_delta: Optional[Callable[[str], None]] = None) -> SimpleNamespace:
+    """_assemble_stream() for the async client."""
+    assembler = _StreamAssembler(on_delta)
+    async for chunk in stream:
+        assembler.feed(chunk)
+    return assembler.message()
 
 class ConversationManager:
-    def __init__(self, system_config: SystemConfig):
+    def __init__(self, system_config: SystemConfig, context_budget: int = DEFAULT_MAX_TOKENS,
+                 async_client: Optional[AsyncOpenAI] = None, client=None):
+        """
+        client and async_client replace the OpenAI clients, e.g. with the
+        fakes in fakes.openai_client; by default the module-level client and
+        a lazily created AsyncOpenAI are used.
+        """
         self.system_config = system_config
         self.system_prompt = system_config.get_system_prompt()
         
@@ -25,26 +102,74 @@ class ConversationManager:
             {"role": "user", "content": ""}
         ]
         self.tools = self._initialize_tools()
+        self.context_window = ContextWindow(max_tokens=context_budget)
+        
+        # A turn (user message, completions, tool results) must not interleave
+        # with another one. Turns hold `lock` through alock(), which waits for
+        # it off the event loop; code on other threads can take it directly.
+        self.lock = threading.Lock()
+        self.client = client or openai
+        self._async_client = async_client
+        self._usage_lock = threading.Lock()
+        self.usage_stats = {"completions": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        # Notes posted by email workers wait here until the next turn starts,
+        # so posting one never waits for a turn in progress.
+        self._pending_notes: List[str] = []
+        self._notes_lock = threading.Lock()
         
     def _initialize_tools(self) -> List[Dict[str, Any]]:
         """Initialize all available tools."""
-        return [
-            {"type": "function", "function": get_list_events_schema()},
-            {"type": "function", "function": get_create_event_schema()},
-            {"type": "function", "function": get_list_emails_schema()},
-            {"type": "function", "function": get_send_email_schema()},
-            {"type": "function", "function": get_list_tasks_schema()},
-            {"type": "function", "function": get_add_task_schema()},
-            {"type": "function", "function": get_complete_task_schema()},
-            {"type": "function", "function": get_process_new_email_schema()},
-            {"type": "function", "function": get_update_event_schema()},
-            {"type": "function", "function": get_delete_event_schema()}
-        ]
+        # Built once by the registry and shared by every conversation.
+        return get_tool_registry().openai_tools()
+    
+    @asynccontextmanager
+    async def alock(self):
+        """Hold `lock` from a coroutine; waiting for it happens off the event loop."""
+        if not self.lock.acquire(blocking=False):
+            acquiring = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire))
+            try:
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # The thread still gets the lock eventually; give it back then.
+                acquiring.add_done_callback(lambda _: self.lock.release())
+                raise
+        try:
+            yield
+        finally:
+            self.lock.release()
     
     def add_user_message(self, content: str):
         """Add a user message to the conversation."""
         self.messages.append({"role": "user", "content": content})
     
+    def add_assistant_message(self, msg):
+        """Add an assistant message (as returned by the API) to the conversation."""
+        message = {"role": "assistant", "content": getattr(msg, "content", None)}
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            message["tool_calls"] = [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}
+                }
+                for tool_call in tool_calls
+            ]
+        self.messages.append(message)
+    
+    def post_note(self, text: str):
+        """Queue an assistant note; it joins the history when the next turn starts."""
+        with self._notes_lock:
+            self._pending_notes.append(text)
+    
+    def merge_pending_notes(self) -> int:
+        """Append the queued notes to the history. Call with the turn lock held; returns how many were added."""
+        with self._notes_lock:
+            notes, self._pending_notes = self._pending_notes, []
+        for text in notes:
+            self.messages.append({"role": "assistant", "content": text})
+        return len(notes)
+    
     def add_tool_message(self, tool_call_id: str, name: str, content: str):
         """Add a tool message to the conversation."""
         self.messages.append({
@@ -54,11 +179,101 @@ class ConversationManager:
             "content": content
         })
     
-    def create_chat_completion(self, require_confirmation: bool = True):
-        """Create a chat completion and return the response."""
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=self.messages,
-            tools=self.tools,
-        )
-        return response.choices[0].message
+    def create_chat_completion(self, require_confirmation: bool = True, stream: bool = False,
+                               on_delta: Optional[Callable[[str], None]] = None):
+        """
+        Create a chat completion and return the response.
+        With stream=True the reply is streamed: on_delta receives each piece of
+        content as soon as it arrives, and the assembled message is returned.
+        """
+        # Keep the history within the token budget before every request.
+        with timed("context_fit"):
+            self.context_window.fit(self.messages)
+        messages = self._request_messages()
+        with timed("llm"), span("llm", model=MODEL, stream=stream, messages=len(messages)) as call:
+            if stream:
+                msg = _assemble_stream(self.client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    tools=self.tools,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                ), on_delta)
+                self._record_usage(call, msg.usage)
+                return msg
+            response = self.client.chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                tools=self.tools,
+            )
+            self._record_usage(call, response.usage)
+            return response.choices[0].message
+    
+    def _request_messages(self) -> List[Dict[str, Any]]:
+        """
+        The conversation as sent: the stored messages, which keep the static
+        system prompt and tool schemas byte-identical at the front, followed
+        by the dynamic context (current date and time), rebuilt per request
+        and never stored in the history.
+        """
+        return self.messages + [{"role": "system", "content": self.system_config.get_dynamic_context()}]
+    
+    def _record_usage(self, call, usage):
+        """Count a completion's tokens, and put them on its span."""
+        if usage is None:
+            return
+        cached = _cached_tokens(usage)
+        call.set(prompt_tokens=usage.prompt_tokens, cached_tokens=cached, completion_tokens=usage.completion_tokens)
+        with self._usage_lock:
+            self.usage_stats["completions"] += 1
+            self.usage_stats["prompt_tokens"] += usage.prompt_tokens
+            self.usage_stats["cached_tokens"] += cached
+            self.usage_stats["completion_tokens"] += usage.completion_tokens
+    
+    def get_async_client(self) -> AsyncOpenAI:
+        """Return the async OpenAI client, creating it on first use."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self.system_config.get_openai_key())
+        return self._async_client
+    
+    async def acreate_chat_completion(self, stream: bool = False,
+                                      on_delta: Optional[Callable[[str], None]] = None):
+        """create_chat_completion() on the async OpenAI client."""
+        client = self.get_async_client()
+        with timed("context_fit"):
+            self.context_window.fit(self.messages)
+        messages = self._request_messages()
+        with timed("llm"), span("llm", model=MODEL, stream=stream, messages=len(messages)) as call:
+            if stream:
+                msg = await _assemble_stream_async(await client.chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    tools=self.tools,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                ), on_delta)
+                self._record_usage(call, msg.usage)
+                return msg
+            response = await client.chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                tools=self.tools,
+            )
+            self._record_usage(call, response.usage)
+            return response.choices[0].message
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Token totals of this conversation's completions and the share of prompt tokens served from cache."""
+        with self._usage_lock:
+            stats = dict(self.usage_stats)
+        stats["uncached_prompt_tokens"] = stats["prompt_tokens"] - stats["cached_tokens"]
+        stats["cache_hit_ratio"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        return stats
+    
+    def get_context_stats(self) -> Dict[str, Any]:
+        """Return token usage and eviction counters for the conversation."""
+        stats = dict(self.context_window.stats)
+        stats["messages"] = len(self.messages)
+        stats["tokens"] = self.context_window.total(self.messages)
+        stats["budget"] = self.context_window.max_tokens
+        return stats
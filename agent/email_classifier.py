@@ -0,0 +1,128 @@
+"""
+Email Classifier
+Rule-based triage of incoming emails, so only the ones that may need action
+reach the model.
+"""
+
+import os
+import re
+import threading
+from email.utils import parseaddr
+from typing import Dict, Any, Optional
+from tools.contacts_tools import ContactIndex, get_contact_index
+
+# Set JARVIS_EMAIL_TRIAGE=0 to send every email to the model.
+TRIAGE_ENABLED = os.environ.get('JARVIS_EMAIL_TRIAGE', '1') != '0'
+# Characters of the body scanned for intents.
+SCAN_CHARS = 2000
+
+# Actions
+AGENT = "agent"    # run the agent on it
+NOTIFY = "notify"  # tell the user, no model call
+DROP = "drop"      # bulk or automated mail, ignore
+
+# Intent rules, checked in order; the first match wins. A pattern only runs
+# when one of its trigger substrings occurs in the lowercased text, which
+# keeps the common no-match case to a few substring searches.
+INTENT_RULES = [
+    ("cancel", ("cancel", "call", "make it", "able to"), re.compile(
+        r"\b(cancel\w*|call(?:ing|ed)? (?:it )?off|can'?t make it|won'?t be able to (?:make|attend|join))\b")),
+    ("reschedule", ("reschedul", "postpon", "push", "move", "another time", "different time", "next day"), re.compile(
+        r"\b(reschedul\w*|postpon\w*|push(?:ed)? (?:it |the meeting |our meeting )?(?:back|to)|"
+        r"move (?:it|the meeting|our meeting|the call)|another time|different time|next day)\b")),
+    ("confirm", ("confirm", "see you", "works for me", "be there", "accepted"), re.compile(
+        r"\b(confirm\w*|see you (?:then|there|tomorrow)|works for me|i'?ll be there|accepted)\b")),
+    ("meeting_request", ("meet", "call", "schedul", "availab", "catch up", "sync", "appointment", "invit"), re.compile(
+        r"\b(meet(?:ing)?|call|schedule|availab\w*|catch up|sync|appointment|invite|invitation)\b")),
+]
+# Intents the agent should act on; the rest only need the user's attention.
+ACTIONABLE_INTENTS = {"cancel", "reschedule", "meeting_request"}
+
+NO_REPLY_SENDER = re.compile(r"^(no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|mailer-daemon|bounce)", re.I)
+BULK_PRECEDENCE = {"bulk", "list", "junk"}
+BULK_LABELS = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_UPDATES", "CATEGORY_FORUMS", "SPAM"}
+
+
+class EmailClassifier:
+    """
+    Decides per email whether the agent runs (AGENT), the user is just told
+    (NOTIFY) or the email is ignored (DROP):
+
+    - bulk or automated mail (List-Unsubscribe/List-Id, Precedence,
+      Auto-Submitted, no-reply senders, Gmail category labels) from
+      someone who is not a contact is dropped;
+    - a cancel, reschedule or meeting request goes to the agent;
+    - a confirmation is only reported;
+    - anything else goes to the agent if it comes from a contact and is
+      reported otherwise.
+
+    Contacts are looked up in the contact index on every email, so edits to
+    contacts.json apply without a restart. Every decision is counted per
+    action and per rule.
+    """
+
+    def __init__(self, contact_index: Optional[ContactIndex] = None, unknown_sender_action: str = NOTIFY):
+        # None: the process-wide index
+        self.contact_index = contact_index
+        self.unknown_sender_action = unknown_sender_action
+        self._lock = threading.Lock()
+        self.stats = {"total": 0, "actions": {}, "rules": {}}
+
+    def _bulk_rule(self, email: Dict[str, Any], address: str) -> Optional[str]:
+        if email.get('list_unsubscribe') or email.get('list_id'):
+            return "mailing_list"
+        if (email.get('precedence') or '').strip().lower() in BULK_PRECEDENCE:
+            return "bulk_precedence"
+        auto_submitted = (email.get('auto_submitted') or '').strip().lower()
+        if auto_submitted and auto_submitted != 'no':
+            return "auto_submitted"
+        if NO_REPLY_SENDER.match(address.split('@')[0]):
+            return "no_reply_sender"
+        if BULK_LABELS.intersection(email.get('labels') or []):
+            return "category_label"
+        return None
+
+    def intent(self, email: Dict[str, Any]) -> Optional[str]:
+        """The first intent whose pattern matches the subject or the start of the body."""
+        text = f"{email.get('subject', '')}\n{(email.get('body') or email.get('snippet') or '')[:SCAN_CHARS]}".lower()
+        for name, triggers, pattern in INTENT_RULES:
+            if any(trigger in text for trigger in triggers) and pattern.search(text):
+                return name
+        return None
+
+    def classify(self, email: Dict[str, Any]) -> Dict[str, Any]:
+        """Return {"action", "rule", "intent", "known_sender"} for an email."""
+        address = parseaddr(email.get('from', ''))[1].lower()
+        known_sender = (self.contact_index or get_contact_index()).is_contact(address)
+        intent = None
+        rule = None if known_sender else self._bulk_rule(email, address)
+        if rule is not None:
+            action = DROP
+        else:
+            intent = self.intent(email)
+            if intent in ACTIONABLE_INTENTS:
+                action, rule = AGENT, f"intent:{intent}"
+            elif intent == "confirm":
+                action, rule = NOTIFY, "intent:confirm"
+            elif known_sender:
+                action, rule = AGENT, "known_sender"
+            else:
+                action, rule = self.unknown_sender_action, "unknown_sender"
+        self._record(action, rule)
+        return {"action": action, "rule": rule, "intent": intent, "known_sender": known_sender}
+
+    def _record(self, action: str, rule: str):
+        with self._lock:
+            self.stats["total"] += 1
+            self.stats["actions"][action] = self.stats["actions"].get(action, 0) + 1
+            self.stats["rules"][rule] = self.stats["rules"].get(rule, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counts and hit rates per action and per rule."""
+        with self._lock:
+            total = self.stats["total"]
+            return {
+                "total": total,
+                "actions": {a: {"count": n, "rate": n / total} for a, n in self.stats["actions"].items()},
+                "rules": {r: {"count": n, "rate": n / total} for r, n in self.stats["rules"].items()},
+            }
@@ -3,54 +3,230 @@ Email Processor
 Handles email polling, processing, and proactive email handling.
 """
 
+import asyncio
 import json
 import os
-import time
 from datetime import datetime
-from typing import List, Dict, Any
-from tools.mail_tools import list_emails, mark_email_as_read
+from typing import List, Dict, Any, Optional, Tuple
+from tools.mail_tools import (
+    list_message_ids, mark_emails_as_read, get_emails, get_mailbox_history_id,
+    list_new_message_ids, HistoryExpiredError
+)
 from tools.process_new_emails_tools import process_new_email_tool
+from session_manager import SessionManager, SESSION_WORKERS
+from email_queue import EmailQueue, QUEUE_FILE, message_key
+from message_ledger import MessageLedger, LEDGER_FILE, DONE, BUSY
+from poll_scheduler import AdaptivePollScheduler
+from email_classifier import EmailClassifier, TRIAGE_ENABLED, AGENT, NOTIFY
+
+# Where the last synced Gmail historyId is persisted between runs.
+SYNC_STATE_FILE = "gmail_sync_state.json"
+# Where the webhook stores the emails it receives.
+WEBHOOK_FILE = "new_emails.json"
+# Handled polled emails are marked as read together: one batchModify per
+# MARK_READ_BATCH emails, or MARK_READ_DELAY seconds after the first one.
+MARK_READ_BATCH = 100
+MARK_READ_DELAY = 0.5
 
 class EmailProcessor:
-    def __init__(self, conversation_manager, tool_executor):
+    def __init__(self, conversation_manager, tool_executor, sync_mode: str = "history",
+                 sync_state_path: str = SYNC_STATE_FILE, session_workers: int = SESSION_WORKERS,
+                 queue_path: str = QUEUE_FILE, ledger_path: str = LEDGER_FILE,
+                 poll_scheduler: Optional[AdaptivePollScheduler] = None):
+        """
+        sync_mode is "history" (incremental sync from the last seen Gmail
+        historyId) or "query" (re-run the unread search on every poll).
+        Each email is handled in its own session; session_workers of them
+        run at once. Incoming emails go through a durable queue at queue_path,
+        and the ledger at ledger_path records every email ever taken in.
+        Unless JARVIS_EMAIL_TRIAGE=0, a rule-based classifier decides which
+        emails reach the agent at all. poll_scheduler decides when to poll
+        next, from the outcome of each poll.
+        """
+        if sync_mode not in ("history", "query"):
+            raise ValueError(f"Unknown sync mode: {sync_mode}")
         self.conversation_manager = conversation_manager
         self.tool_executor = tool_executor
+        self.sessions = SessionManager(conversation_manager.system_config, tool_executor, conversation_manager,
+                                       max_workers=session_workers)
+        self.queue = EmailQueue(queue_path)
+        self.ledger = MessageLedger(ledger_path, claim_seconds=self.queue.lease_seconds)
+        self.classifier = EmailClassifier() if TRIAGE_ENABLED else None
+        self.sync_mode = sync_mode
+        self.sync_state_path = sync_state_path
+        self.poll_scheduler = poll_scheduler or AdaptivePollScheduler()
+        self.sync_stats = {"polls": 0, "skipped_polls": 0, "incremental_syncs": 0, "full_syncs": 0,
+                           "failed_fetches": 0}
+        # Handled polled items waiting to be marked as read and acked.
+        self._unread_items: List[Dict[str, Any]] = []
+        self._flush_timer: Optional[asyncio.Task] = None
+        
+    def ingest_webhook_emails(self) -> int:
+        """
+        Move the emails stored by the webhook into the queue. Returns how many were new.
+        
+        The file is renamed before it is read, so whatever the webhook writes
+        meanwhile lands in a fresh file instead of being overwritten. The
+        renamed file is only deleted once its emails are queued; if we crash
+        before that, the next call picks it up again.
+        """
+        draining = WEBHOOK_FILE + ".draining"
+        if not os.path.exists(draining):
+            try:
+                os.replace(WEBHOOK_FILE, draining)
+            except FileNotFoundError:
+                return 0
+        
+        try:
+            with open(draining, "r") as f:
+                emails = json.load(f)
+        except json.JSONDecodeError:
+            # The webhook may still be writing to it; try again next time.
+            return 0
         
-    def fetch_and_clear_new_emails(self) -> List[Dict[str, Any]]:
-        """Fetch and clear new emails from the webhook storage."""
-        if not os.path.exists("new_emails.json"):
-            return []
-            
-        with open("new_emails.json", "r") as f:
-            emails = json.load(f)
-            
-        # Clear the file
-        with open("new_emails.json", "w") as f:
-            json.dump([], f)
-            
+        added = self.enqueue_emails(emails, source="webhook")
+        os.remove(draining)
+        return added
+    
+    def enqueue_emails(self, emails: List[Dict[str, Any]], source: str = "poll") -> int:
+        """
+        Queue emails for processing and record them in the ledger. Returns
+        how many were new. Polled emails stay unread until they are handled;
+        see ahandle().
+        """
+        added = self.queue.enqueue_many(emails, source=source)
+        self.ledger.record_queued([message_key(email) for email in emails])
+        if emails and self.tool_executor.cache is not None:
+            # New mail: cached inbox listings are stale.
+            self.tool_executor.cache.invalidate("list_emails")
+        return added
+    
+    def _mark_read(self, emails: List[Dict[str, Any]]):
+        """Mark handled emails as read. Raises if Gmail fails."""
+        if not emails:
+            return
+        try:
+            mark_emails_as_read([email['id'] for email in emails])
+        except Exception as e:
+            print(f"[Polling] Could not mark {len(emails)} emails as read, will retry: {e}")
+            raise
+        if self.tool_executor.cache is not None:
+            # Read flags changed: cached inbox listings are stale.
+            self.tool_executor.cache.invalidate("list_emails")
+    
+    def collect_new_emails(self) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fetch the emails that need processing, without processing them.
+        Returns the emails and the sync point to pass to commit_sync() once
+        they have been handled.
+        """
+        self.sync_stats["polls"] += 1
+        try:
+            if self.sync_mode == "history":
+                emails, history_id = self._sync_from_history()
+            else:
+                emails, history_id = self._fetch_unread_emails(), None
+        except Exception as e:
+            self.poll_scheduler.record_error(e)
+            raise
+        self.poll_scheduler.record_result(len(emails))
+        return emails, history_id
+    
+    def commit_sync(self, history_id: Optional[str]):
+        """Persist the sync point returned by collect_new_emails()."""
+        if history_id is not None:
+            self._save_history_id(history_id)
+    
+    def _unread_message_ids(self) -> List[str]:
+        """Search for today's unread emails."""
+        # Get today's date in YYYY/MM/DD format
+        today = datetime.now().strftime('%Y/%m/%d')
+        # Gmail query: unread emails after today 00:00
+        gmail_query = f'is:unread after:{today}'
+        return list_message_ids(query=gmail_query, max_results=50)
+    
+    def _fetch_unread_emails(self) -> List[Dict[str, Any]]:
+        """Fetch today's unread emails."""
+        emails, _ = self._fetch_unseen(self._unread_message_ids())
+        # Messages that could not be fetched stay unread, so the next search finds them again.
         return emails
     
-    def poll_unread_emails(self, interval: int = 60):
-        """Poll for unread emails and process them."""
-        while True:
-            try:
-                # Get today's date in YYYY/MM/DD format
-                today = datetime.now().strftime('%Y/%m/%d')
-                # Gmail query: unread emails after today 00:00
-                gmail_query = f'is:unread after:{today}'
-                unread_emails = list_emails(query=gmail_query, max_results=50)
-                
-                for email in unread_emails.get('emails', []):
-                    self._process_single_email(email)
-                    
-                time.sleep(interval)
-                
-            except Exception as e:
-                print(f"Polling error: {e}")
-                time.sleep(interval)
-    
-    def _process_single_email(self, email: Dict[str, Any]):
-        """Process a single email."""
+    def _fetch_unseen(self, message_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Fetch the content of the messages the ledger has not seen yet.
+        Returns the emails and the IDs that could not be fetched and should
+        be tried again; messages deleted in the meantime (404) are not among them.
+        """
+        emails, errors = get_emails(self.ledger.unseen(message_ids))
+        failed = []
+        for error in errors:
+            if error.get('status') == 404:
+                print(f"[Polling] Email {error['id']} no longer exists, skipping it.")
+                continue
+            print(f"[Polling] Could not fetch email {error['id']}, will retry on the next poll: {error['error']}")
+            failed.append(error['id'])
+        return emails, failed
+    
+    def _sync_from_history(self) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fetch only the messages added since the last seen historyId.
+        Returns the emails and the historyId to persist once they are processed.
+        """
+        history_id = self._load_history_id()
+        if history_id is None:
+            return self._full_resync()
+        
+        try:
+            message_ids, latest_history_id = list_new_message_ids(history_id)
+        except HistoryExpiredError:
+            print("[Polling] Gmail history expired, running a full resync.")
+            return self._full_resync()
+        
+        if not message_ids:
+            self.sync_stats["skipped_polls"] += 1
+            return [], (latest_history_id if latest_history_id != history_id else None)
+        
+        self.sync_stats["incremental_syncs"] += 1
+        emails, failed = self._fetch_unseen(message_ids)
+        if failed:
+            # Keep the old sync point so the next poll lists these messages again;
+            # the ones fetched now are in the ledger and are filtered out then.
+            self.sync_stats["failed_fetches"] += len(failed)
+            return emails, None
+        return emails, latest_history_id
+    
+    def _full_resync(self) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Run the unread search and restart incremental sync from the current historyId."""
+        self.sync_stats["full_syncs"] += 1
+        # Read the historyId first so nothing that arrives during the scan is missed.
+        history_id = get_mailbox_history_id()
+        emails, failed = self._fetch_unseen(self._unread_message_ids())
+        if failed:
+            # Without a sync point the next poll runs the unread search again.
+            self.sync_stats["failed_fetches"] += len(failed)
+            return emails, None
+        return emails, history_id
+    
+    def _load_history_id(self) -> Optional[str]:
+        """Load the persisted historyId, if any."""
+        if not os.path.exists(self.sync_state_path):
+            return None
+        try:
+            with open(self.sync_state_path, "r") as f:
+                return json.load(f).get("history_id")
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: could not read {self.sync_state_path}: {e}")
+            return None
+    
+    def _save_history_id(self, history_id: str):
+        """Persist the historyId atomically."""
+        tmp_path = f"{self.sync_state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"history_id": str(history_id), "updated_at": datetime.now().isoformat()}, f)
+        os.replace(tmp_path, self.sync_state_path)
+    
+    def _prepare_email(self, email: Dict[str, Any]):
+        """Run the process_new_email tool on an email."""
         print(f"\n[Polling] New unread email from {email['from']}: {email['subject']}")
         
         # Process the email
@@ -60,47 +236,116 @@ class EmailProcessor:
             'body': email.get('body', '')
         })
         print(f"Processed new email: {result}")
-        
-        # Mark email as read
-        mark_email_as_read(email['id'])
-        print(f"Marked email {email['id']} as read.")
-        
-        # Process email proactively
-        self._process_email_proactively(email)
     
-    def _process_email_proactively(self, email: Dict[str, Any]):
-        """Process email proactively using the AI agent."""
-        email_prompt = self._create_email_prompt(email)
-        
-        # Add to conversation
-        self.conversation_manager.add_user_message(email_prompt)
-        
-        # Get AI response
-        msg = self.conversation_manager.create_chat_completion()
-        
-        # Process tool calls
-        while hasattr(msg, "tool_calls") and msg.tool_calls:
-            tool_outputs = self.tool_executor.process_tool_calls(msg.tool_calls)
-            
-            # Add messages to conversation
-            self.conversation_manager.messages.append(msg)
-            for tool_output in tool_outputs:
-                self.conversation_manager.add_tool_message(
-                    tool_output["tool_call_id"],
-                    tool_output["name"],
-                    tool_output["content"]
-                )
-            
-            # Get next response
-            msg = self.conversation_manager.create_chat_completion()
-            
-            if not (hasattr(msg, "tool_calls") and msg.tool_calls):
-                break
-        
-        # Add final message
-        self.conversation_manager.messages.append(msg)
-        
-        # Print response
+    async def aprocess_email(self, email: Dict[str, Any], source: str = "poll") -> bool:
+        """
+        Process one email on the asyncio runtime. Emails the ledger already
+        has as processed are skipped without calling the model. Returns
+        False, without processing it, while another worker holds the email;
+        otherwise True once it is handled.
+        """
+        key = message_key(email)
+        claim = await asyncio.to_thread(self.ledger.begin, key)
+        if claim == BUSY:
+            return False
+        if claim == DONE:
+            return True
+        decision = self._triage(email)
+        if decision is not None:
+            await asyncio.to_thread(self.ledger.finish, key, f"triage: {decision['action']} ({decision['rule']})")
+            self._post_triage_note(email, decision)
+            return True
+        try:
+            prompt = await asyncio.to_thread(self._prompt_for, {"email": email, "source": source})
+            msg = await self.sessions.arun(email, prompt, source)
+        except Exception as e:
+            await asyncio.to_thread(self.ledger.fail, key, str(e))
+            raise
+        self._print_final_message(msg)
+        await asyncio.to_thread(self.ledger.finish, key, getattr(msg, "content", None))
+        return True
+    
+    async def ahandle(self, item: Dict[str, Any]):
+        """
+        Process an item leased from the queue: ack it once it is handled,
+        nack it if processing failed, and leave it leased while another
+        worker holds it (the lease brings it back if that worker dies).
+        Handled polled items are only acked once they are marked as read,
+        which happens in batches; see aflush_read_marks().
+        """
+        try:
+            handled = await self.aprocess_email(item["email"], item["source"])
+        except Exception as e:
+            print(f"Email processing error: {e}")
+            await asyncio.to_thread(self.queue.nack, item["message_id"], str(e))
+            return
+        if not handled:
+            return
+        if item["source"] != "poll":
+            await asyncio.to_thread(self.queue.ack, item["message_id"])
+            return
+        self._unread_items.append(item)
+        if len(self._unread_items) >= MARK_READ_BATCH:
+            await self.aflush_read_marks()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_read_marks_later())
+    
+    async def _flush_read_marks_later(self):
+        await asyncio.sleep(MARK_READ_DELAY)
+        self._flush_timer = None
+        await self.aflush_read_marks()
+    
+    async def aflush_read_marks(self):
+        """
+        Mark every handled polled item as read with one batchModify and ack
+        them. If Gmail fails they are nacked, so the queue retries them and
+        the ledger skips straight to marking them as read.
+        """
+        timer, self._flush_timer = self._flush_timer, None
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        items, self._unread_items = self._unread_items, []
+        if items:
+            await asyncio.to_thread(self._complete, items)
+    
+    def _complete(self, items: List[Dict[str, Any]]):
+        try:
+            self._mark_read([item["email"] for item in items])
+        except Exception as e:
+            for item in items:
+                self.queue.nack(item["message_id"], f"mark as read: {e}")
+            return
+        for item in items:
+            self.queue.ack(item["message_id"])
+    
+    def _triage(self, email: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Classify an email. Returns the decision if it should not go to the agent, else None."""
+        if self.classifier is None:
+            return None
+        decision = self.classifier.classify(email)
+        print(f"[Triage] {decision['action']} ({decision['rule']}): {email.get('from', '')} - {email.get('subject', '')}")
+        return None if decision['action'] == AGENT else decision
+    
+    def _post_triage_note(self, email: Dict[str, Any], decision: Dict[str, Any]):
+        """Tell the user about an email the agent skipped; dropped emails get no note."""
+        if decision['action'] != NOTIFY:
+            return
+        note = f"[New email from {email.get('from', '')} - Subject: {email.get('subject', '')}] {email.get('snippet', '')}".rstrip()
+        print(f"\n{note}")
+        self.sessions.post_note(note)
+    
+    def _prompt_for(self, item: Dict[str, Any]) -> str:
+        """Prompt for a queued email; polled emails go through process_new_email first."""
+        email = item['email']
+        if item['source'] == "poll":
+            self._prepare_email(email)
+            return self._create_email_prompt(email)
+        prompt = self._create_webhook_prompt(email)
+        print(f"\n[Proactive] {prompt}")
+        return prompt
+    
+    def _print_final_message(self, msg):
+        """Print the agent's answer to a proactive email."""
         if hasattr(msg, "content") and msg.content:
             print("\n--- Final Assistant Message (Proactive Email) ---")
             print(msg.content)
@@ -122,46 +367,10 @@ class EmailProcessor:
             "10. If the email says 'push to next day', find today's meeting and move it to tomorrow"
         )
     
-    def process_webhook_emails(self):
-        """Process emails from webhook storage."""
-        new_emails = self.fetch_and_clear_new_emails()
-        
-        for email in new_emails:
-            email_prompt = (
-                f"You received a new email from {email['from']}. Subject: {email['subject']}. Body: {email['body']}. "
-                "If this is a reschedule request, find the relevant event and update it accordingly. "
-                "Always confirm with the user before making changes."
-            )
-            
-            print(f"\n[Proactive] {email_prompt}")
-            self.conversation_manager.add_user_message(email_prompt)
-            
-            # Get AI response
-            msg = self.conversation_manager.create_chat_completion()
-            
-            # Process tool calls
-            while hasattr(msg, "tool_calls") and msg.tool_calls:
-                tool_outputs = self.tool_executor.process_tool_calls(msg.tool_calls)
-                
-                # Add messages to conversation
-                self.conversation_manager.messages.append(msg)
-                for tool_output in tool_outputs:
-                    self.conversation_manager.add_tool_message(
-                        tool_output["tool_call_id"],
-                        tool_output["name"],
-                        tool_output["content"]
-                    )
-                
-                # Get next response
-                msg = self.conversation_manager.create_chat_completion()
-                
-                if not (hasattr(msg, "tool_calls") and msg.tool_calls):
-                    break
-            
-            # Add final message
-            self.conversation_manager.messages.append(msg)
-            
-            # Print response
-            if hasattr(msg, "content") and msg.content:
-                print("\n--- Final Assistant Message (Proactive Email) ---")
-                print(msg.content)
+    def _create_webhook_prompt(self, email: Dict[str, Any]) -> str:
+        """Create a prompt for an email delivered by the webhook."""
+        return (
+            f"You received a new email from {email['from']}. Subject: {email['subject']}. Body: {email['body']}. "
+            "If this is a reschedule request, find the relevant event and update it accordingly. "
+            "Always confirm with the user before making changes."
+        )
@@ -0,0 +1,214 @@
+"""
+Email Queue
+Durable work queue for incoming emails, backed by SQLite in WAL mode.
+"""
+
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+# Where the queue is stored.
+QUEUE_FILE = "email_queue.db"
+# Seconds a worker may hold an item before it is handed to another worker.
+LEASE_SECONDS = 300
+# Attempts before an item is parked as dead.
+MAX_ATTEMPTS = 5
+# Retry delay: RETRY_BASE_SECONDS * 2^(attempt - 1), capped, with jitter.
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 600.0
+# Handled items are kept this long so redeliveries are still recognized.
+DONE_RETENTION_SECONDS = 7 * 24 * 3600
+# Handled items are pruned every this many acks.
+PRUNE_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    message_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    source TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_ready ON items (state, available_at);
+"""
+
+def message_key(email: Dict[str, Any]) -> str:
+    """Deduplication key: the Gmail message ID, or a content hash for emails without one."""
+    if email.get("id"):
+        return email["id"]
+    content = "\0".join(str(email.get(field, "")) for field in ("from", "subject", "body"))
+    return "sha1:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class EmailQueue:
+    """
+    Append-only queue with enqueue/lease/ack semantics.
+
+    Every message ID is stored once (duplicates are ignored on enqueue, also
+    after the message was handled, until it is pruned). lease() hands out
+    ready items and marks them leased until ack() or nack(); a lease that
+    expires, e.g. because the process crashed, makes the item available
+    again. nack() schedules a retry with exponential backoff, and after
+    max_attempts the item is parked in the 'dead' state for inspection.
+    """
+
+    def __init__(self, path: str = QUEUE_FILE, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._started = time.time()
+        self.stats = {"enqueued": 0, "duplicates": 0, "leased": 0, "acked": 0, "retried": 0,
+                      "dead": 0, "expired_leases": 0, "total_latency": 0.0}
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, email: Dict[str, Any], source: str = "poll") -> bool:
+        """Add an email. Returns False if it was already queued or handled."""
+        return self.enqueue_many([email], source) == 1
+
+    def enqueue_many(self, emails: List[Dict[str, Any]], source: str = "poll") -> int:
+        """Add emails in one transaction. Returns how many were new."""
+        if not emails:
+            return 0
+        now = time.time()
+        rows = [(message_key(email), json.dumps(email), source, now, now) for email in emails]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (message_id, payload, source, available_at, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            added = conn.total_changes - before
+            self.stats["enqueued"] += added
+            self.stats["duplicates"] += len(rows) - added
+        return added
+
+    def lease(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Take up to `limit` items that are due. Each is returned as
+        {"message_id", "email", "source", "attempts"} and stays leased until
+        ack()/nack() or until the lease expires.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # Items whose lease ran out on their last allowed attempt are not retried.
+            expired = conn.execute(
+                "UPDATE items SET state = 'dead', finished_at = ?, last_error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_expires <= ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            ).rowcount
+            self.stats["dead"] += expired
+            rows = conn.execute(
+                "SELECT message_id, payload, source, attempts, state FROM items "
+                "WHERE (state = 'ready' AND available_at <= ?) OR (state = 'leased' AND lease_expires <= ?) "
+                "ORDER BY available_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = 'leased', lease_expires = ?, attempts = attempts + 1 WHERE message_id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows]
+            )
+            self.stats["leased"] += len(rows)
+            self.stats["expired_leases"] += sum(1 for row in rows if row[4] == "leased")
+        return [
+            {"message_id": row[0], "email": json.loads(row[1]), "source": row[2], "attempts": row[3] + 1}
+            for row in rows
+        ]
+
+    def ack(self, message_id: str):
+        """Mark a leased item as handled."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT enqueued_at FROM items WHERE message_id = ? AND state = 'leased'",
+                               (message_id,)).fetchone()
+            if row is None:
+                return
+            conn.execute("UPDATE items SET state = 'done', finished_at = ?, lease_expires = NULL WHERE message_id = ?",
+                         (now, message_id))
+            self.stats["acked"] += 1
+            self.stats["total_latency"] += now - row[0]
+            if self.stats["acked"] % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM items WHERE state = 'done' AND finished_at < ?",
+                             (now - DONE_RETENTION_SECONDS,))
+
+    def nack(self, message_id: str, error: Optional[str] = None):
+        """Give a leased item back after a failure; it is retried later or parked as dead."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM items WHERE message_id = ? AND state = 'leased'",
+                               (message_id,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0]
+            if attempts >= self.max_attempts:
+                conn.execute("UPDATE items SET state = 'dead', finished_at = ?, lease_expires = NULL, last_error = ? "
+                             "WHERE message_id = ?", (now, error, message_id))
+                self.stats["dead"] += 1
+                return
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            # Jitter keeps items that failed together from retrying together.
+            delay *= random.uniform(0.5, 1.0)
+            conn.execute("UPDATE items SET state = 'ready', available_at = ?, lease_expires = NULL, last_error = ? "
+                         "WHERE message_id = ?", (now + delay, error, message_id))
+            self.stats["retried"] += 1
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next ready item is due (0 if one is due now), or None if there is none."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(available_at) FROM items WHERE state = 'ready'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def pending(self) -> int:
+        """Number of items not handled yet: ready, waiting for a retry, or leased."""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM items WHERE state IN ('ready', 'leased')").fetchone()
+        return row[0]
+
+    def depth(self) -> Dict[str, int]:
+        """Number of items per state."""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters, queue depth, throughput (acks per second) and mean enqueue-to-ack latency."""
+        with self._lock:
+            stats = dict(self.stats)
+        elapsed = max(time.time() - self._started, 1e-9)
+        total_latency = stats.pop("total_latency")
+        stats["depth"] = self.depth()
+        stats["throughput_per_sec"] = stats["acked"] / elapsed
+        stats["avg_latency_sec"] = total_latency / stats["acked"] if stats["acked"] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
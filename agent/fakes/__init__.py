@@ -0,0 +1,4 @@
+"""
+Offline stand-ins for the external services Jarvis talks to.
+Used to exercise the tools and pipelines without network access.
+"""
@@ -0,0 +1,416 @@
+"""
+Fake Google HTTP transport
+In-memory Gmail and Calendar backends exposed through an httplib2-compatible
+object, so the real googleapiclient services (including batch requests) run
+fully offline.
+
+    http = FakeGoogleHttp(latency=0.05)
+    http.gmail.add_message("a@example.com", "Hi", "Body")
+    get_registry().use_transport(http)
+"""
+
+import base64
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.parser import FeedParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+
+REASONS = {
+    200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found', 410: 'Gone',
+    429: 'Too Many Requests', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+# Gmail rejects batch requests with more calls than this.
+MAX_BATCH_SIZE = 100
+# users.messages.batchModify accepts at most this many IDs.
+MAX_BATCH_MODIFY_IDS = 1000
+
+def _error(status: int, message: str, reason: str = 'backendError') -> Tuple[int, Dict[str, Any]]:
+    return status, {'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}}
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+class FakeGmailBackend:
+    """In-memory mailbox implementing the subset of the Gmail API the tools use."""
+
+    def __init__(self, address: str = 'david@example.com'):
+        self.address = address
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        # Message IDs, oldest first.
+        self.order: List[str] = []
+        self.history_id = 1000
+        # Body of the last users.watch call, if any.
+        self.watch: Optional[Dict[str, Any]] = None
+        # History records as (historyId, record), oldest first.
+        self.history: List[Tuple[int, Dict[str, Any]]] = []
+        # startHistoryId values at or below this are reported as expired.
+        self.history_floor = 0
+        self._next_id = 1
+
+    def add_message(self, sender: str, subject: str, body: str, unread: bool = True,
+                    extra_headers: Optional[Dict[str, str]] = None) -> str:
+        """Deliver a plain-text message to the inbox and return its ID."""
+        message_id = f"msg{self._next_id:06d}"
+        self._next_id += 1
+        self.history_id += 1
+        headers = {'From': sender, 'To': self.address, 'Subject': subject}
+        headers.update(extra_headers or {})
+        labels = ['INBOX'] + (['UNREAD'] if unread else [])
+        self.messages[message_id] = {
+            'id': message_id,
+            'threadId': message_id,
+            'labelIds': labels,
+            'snippet': body[:100],
+            'historyId': str(self.history_id),
+            'payload': {
+                'mimeType': 'text/plain',
+                'headers': [{'name': name, 'value': value} for name, value in headers.items()],
+                'body': {'data': _b64(body), 'size': len(body)},
+            },
+        }
+        self.order.append(message_id)
+        self.history.append((self.history_id, {
+            'id': str(self.history_id),
+            'messagesAdded': [{'message': {'id': message_id, 'threadId': message_id, 'labelIds': list(labels)}}],
+        }))
+        return message_id
+
+    def expire_history(self):
+        """Drop all history so the next history.list call answers 404."""
+        self.history_floor = self.history_id
+        self.history = []
+
+    def _matches(self, message: Dict[str, Any], query: str, label_ids: List[str]) -> bool:
+        labels = message['labelIds']
+        if 'is:unread' in query and 'UNREAD' not in labels:
+            return False
+        return all(label in labels for label in label_ids)
+
+    def _list(self, query: Dict[str, List[str]]):
+        q = query.get('q', [''])[0]
+        label_ids = query.get('labelIds', [])
+        max_results = int(query.get('maxResults', ['100'])[0])
+        matching = [m for m in reversed(self.order) if self._matches(self.messages[m], q, label_ids)]
+        page = matching[:max_results]
+        return 200, {
+            'messages': [{'id': m, 'threadId': self.messages[m]['threadId']} for m in page],
+            'resultSizeEstimate': len(matching),
+        }
+
+    def _get(self, message_id: str, query: Dict[str, List[str]]):
+        message = self.messages.get(message_id)
+        if message is None:
+            return _error(404, 'Requested entity was not found.', 'notFound')
+        message = json.loads(json.dumps(message))
+        if query.get('format', ['full'])[0] == 'metadata':
+            wanted = {h.lower() for h in query.get('metadataHeaders', [])}
+            payload = message['payload']
+            headers = [h for h in payload['headers'] if not wanted or h['name'].lower() in wanted]
+            message['payload'] = {'mimeType': payload['mimeType'], 'headers': headers}
+        return 200, message
+
+    def _history(self, query: Dict[str, List[str]]):
+        start = int(query['startHistoryId'][0])
+        if start < self.history_floor:
+            return _error(404, 'Requested entity was not found.', 'notFound')
+        label_id = query.get('labelId', [None])[0]
+        max_results = int(query.get('maxResults', ['100'])[0])
+        offset = int(query.get('pageToken', ['0'])[0])
+        records = []
+        for history_id, record in self.history:
+            if history_id <= start:
+                continue
+            added = [a for a in record.get('messagesAdded', [])
+                     if label_id is None or label_id in a['message']['labelIds']]
+            if added:
+                records.append(dict(record, messagesAdded=added))
+        page = records[offset:offset + max_results]
+        response = {'historyId': str(self.history_id)}
+        if page:
+            response['history'] = page
+        if offset + max_results < len(records):
+            response['nextPageToken'] = str(offset + max_results)
+        return 200, response
+
+    def _modify(self, message_id: str, body: Dict[str, Any]):
+        message = self.messages.get(message_id)
+        if message is None:
+            return _error(404, 'Requested entity was not found.', 'notFound')
+        labels = [l for l in message['labelIds'] if l not in body.get('removeLabelIds', [])]
+        labels += [l for l in body.get('addLabelIds', []) if l not in labels]
+        message['labelIds'] = labels
+        self.history_id += 1
+        return 200, {'id': message_id, 'threadId': message['threadId'], 'labelIds': labels}
+
+    def _batch_modify(self, body: Dict[str, Any]):
+        ids = body.get('ids', [])
+        if len(ids) > MAX_BATCH_MODIFY_IDS:
+            return _error(400, f"Too many ids; max is {MAX_BATCH_MODIFY_IDS}", 'invalidArgument')
+        for message_id in ids:
+            message = self.messages.get(message_id)
+            if message is None:
+                continue
+            labels = [l for l in message['labelIds'] if l not in body.get('removeLabelIds', [])]
+            labels += [l for l in body.get('addLabelIds', []) if l not in labels]
+            message['labelIds'] = labels
+        self.history_id += 1
+        return 204, None
+
+    def _send(self, body: Dict[str, Any]):
+        self.history_id += 1
+        message_id = f"sent{self._next_id:06d}"
+        self._next_id += 1
+        return 200, {'id': message_id, 'threadId': message_id, 'labelIds': ['SENT']}
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Optional[str]):
+        """Dispatch one REST call; `path` is relative to /gmail/v1/users/me."""
+        data = json.loads(body) if body else {}
+        if method == 'GET' and path == '/messages':
+            return self._list(query)
+        if method == 'GET' and path == '/profile':
+            return 200, {'emailAddress': self.address, 'messagesTotal': len(self.messages),
+                         'historyId': str(self.history_id)}
+        if method == 'GET' and path == '/history':
+            return self._history(query)
+        if method == 'POST' and path == '/messages/send':
+            return self._send(data)
+        if method == 'POST' and path == '/messages/batchModify':
+            return self._batch_modify(data)
+        if method == 'POST' and path == '/watch':
+            self.watch = data
+            expiration = int((datetime.now(timezone.utc) + timedelta(days=7)).timestamp() * 1000)
+            return 200, {'historyId': str(self.history_id), 'expiration': str(expiration)}
+        match = re.fullmatch(r'/messages/([^/]+)(/modify)?', path)
+        if match and method == 'GET' and not match.group(2):
+            return self._get(match.group(1), query)
+        if match and method == 'POST' and match.group(2):
+            return self._modify(match.group(1), data)
+        return _error(404, f"Fake Gmail has no handler for {method} {path}", 'notFound')
+
+
+def _event_instant(value: Dict[str, str]) -> datetime:
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'])
+    return datetime.fromisoformat(value['date'] + 'T00:00:00+02:00')
+
+
+class FakeCalendarBackend:
+    """In-memory primary calendar with sync-token support."""
+
+    def __init__(self, time_zone: str = 'Africa/Cairo'):
+        self.time_zone = time_zone
+        self.events: Dict[str, Dict[str, Any]] = {}
+        # Change sequence: every write bumps it and records the event ID.
+        self.sequence = 0
+        self.changes: List[Tuple[int, str]] = []
+        # Sync tokens older than this are answered with 410 Gone.
+        self.token_floor = 0
+        self._next_id = 1
+
+    def add_event(self, summary: str, start: str, end: str, attendees: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Create an event directly in the backend (as if made from another client)."""
+        return self._insert({
+            'summary': summary,
+            'start': {'dateTime': start, 'timeZone': self.time_zone},
+            'end': {'dateTime': end, 'timeZone': self.time_zone},
+            'attendees': [{'email': email} for email in attendees or []],
+        })[1]
+
+    def expire_sync_tokens(self):
+        """Invalidate every sync token handed out so far."""
+        self.token_floor = self.sequence
+
+    def _touch(self, event_id: str):
+        self.sequence += 1
+        self.changes.append((self.sequence, event_id))
+        event = self.events[event_id]
+        event['updated'] = datetime.now().isoformat()
+        event['etag'] = f'"{self.sequence}"'
+
+    def _insert(self, body: Dict[str, Any]):
+        event_id = f"evt{self._next_id:05d}"
+        self._next_id += 1
+        event = dict(body, id=event_id, kind='calendar#event', status='confirmed',
+                     htmlLink=f'https://calendar.example.com/event?eid={event_id}',
+                     iCalUID=f'{event_id}@example.com', reminders={'useDefault': True})
+        if not event.get('attendees'):
+            event.pop('attendees', None)
+        self.events[event_id] = event
+        self._touch(event_id)
+        return 200, event
+
+    def _list(self, query: Dict[str, List[str]]):
+        sync_token = query.get('syncToken', [None])[0]
+        if sync_token is not None:
+            since = int(sync_token)
+            if since < self.token_floor:
+                return _error(410, 'Sync token is no longer valid, a full sync is required.', 'fullSyncRequired')
+            changed = {event_id for seq, event_id in self.changes if seq > since}
+            items = [self.events[event_id] for event_id in sorted(changed)]
+        else:
+            items = [e for e in self.events.values() if e['status'] != 'cancelled']
+            if 'timeMin' in query:
+                time_min = datetime.fromisoformat(query['timeMin'][0])
+                items = [e for e in items if _event_instant(e['end']) > time_min]
+            if 'timeMax' in query:
+                time_max = datetime.fromisoformat(query['timeMax'][0])
+                items = [e for e in items if _event_instant(e['start']) < time_max]
+            items.sort(key=lambda e: _event_instant(e['start']))
+
+        max_results = int(query.get('maxResults', ['250'])[0])
+        offset = int(query.get('pageToken', ['0'])[0])
+        response = {'kind': 'calendar#events', 'timeZone': self.time_zone,
+                    'items': items[offset:offset + max_results]}
+        if offset + max_results < len(items):
+            response['nextPageToken'] = str(offset + max_results)
+        else:
+            response['nextSyncToken'] = str(self.sequence)
+        return 200, response
+
+    def freebusy(self, body: Dict[str, Any]):
+        """freebusy.query for the primary calendar."""
+        time_min = datetime.fromisoformat(body['timeMin'])
+        time_max = datetime.fromisoformat(body['timeMax'])
+        busy = [
+            {'start': e['start']['dateTime'], 'end': e['end']['dateTime']}
+            for e in sorted(self.events.values(), key=lambda e: _event_instant(e['start']))
+            if e['status'] != 'cancelled' and 'dateTime' in e['start']
+            and _event_instant(e['start']) < time_max and _event_instant(e['end']) > time_min
+        ]
+        return 200, {'kind': 'calendar#freeBusy', 'timeMin': body['timeMin'], 'timeMax': body['timeMax'],
+                     'calendars': {'primary': {'busy': busy}}}
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Optional[str]):
+        """Dispatch one REST call; `path` is relative to /calendar/v3/calendars/primary."""
+        data = json.loads(body) if body else {}
+        if path == '/events':
+            if method == 'GET':
+                return self._list(query)
+            if method == 'POST':
+                return self._insert(data)
+        match = re.fullmatch(r'/events/([^/]+)', path)
+        if match:
+            event = self.events.get(match.group(1))
+            if event is None or event['status'] == 'cancelled':
+                return _error(404, 'Not Found', 'notFound')
+            if method == 'GET':
+                return 200, event
+            if method == 'PUT':
+                event_id = event['id']
+                updated = dict(data, id=event_id, kind='calendar#event', status='confirmed',
+                               htmlLink=event['htmlLink'], iCalUID=event['iCalUID'])
+                self.events[event_id] = updated
+                self._touch(event_id)
+                return 200, updated
+            if method == 'DELETE':
+                event['status'] = 'cancelled'
+                self._touch(event['id'])
+                return 204, None
+        return _error(404, f"Fake Calendar has no handler for {method} {path}", 'notFound')
+
+
+class FakeGoogleHttp:
+    """
+    httplib2.Http stand-in routing googleapiclient requests to fake backends.
+    `latency` seconds are slept once per HTTP round trip (a batch request is a
+    single round trip). Thread-safe, so one instance can back every thread's
+    services.
+    """
+
+    def __init__(self, latency: float = 0.0, gmail: Optional[FakeGmailBackend] = None,
+                 calendar: Optional[FakeCalendarBackend] = None):
+        self.latency = latency
+        self.gmail = gmail or FakeGmailBackend()
+        self.calendar = calendar or FakeCalendarBackend()
+        self.timeout = None
+        self.redirect_codes = set()
+        # (method, path) of every call served, batch items included.
+        self.request_log: List[Tuple[str, str]] = []
+        self.round_trips = 0
+        self._failures: List[List[Any]] = []
+        self._lock = threading.RLock()
+
+    def fail(self, path_fragment: str, status: int = 500, times: int = 1):
+        """Make the next `times` calls whose path contains `path_fragment` fail with `status`."""
+        with self._lock:
+            self._failures.append([path_fragment, status, times])
+
+    def _injected_failure(self, path: str):
+        for failure in self._failures:
+            fragment, status, remaining = failure
+            if remaining > 0 and fragment in path:
+                failure[2] -= 1
+                return _error(status, 'Injected failure', 'rateLimitExceeded' if status == 429 else 'backendError')
+        return None
+
+    def _dispatch(self, method: str, uri: str, body: Optional[str]):
+        parsed = urlparse(uri)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+        with self._lock:
+            self.request_log.append((method, path))
+            failure = self._injected_failure(path)
+            if failure is not None:
+                return failure
+            if path.startswith('/gmail/v1/users/me'):
+                return self.gmail.handle(method, path[len('/gmail/v1/users/me'):], query, body)
+            if path == '/calendar/v3/freeBusy' and method == 'POST':
+                return self.calendar.freebusy(json.loads(body))
+            if path.startswith('/calendar/v3/calendars/primary'):
+                return self.calendar.handle(method, path[len('/calendar/v3/calendars/primary'):], query, body)
+        return _error(404, f"No fake backend for {path}", 'notFound')
+
+    def _batch(self, body: str, headers: Dict[str, str]):
+        parser = FeedParser()
+        parser.feed(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        parts = parser.close().get_payload()
+        if len(parts) > MAX_BATCH_SIZE:
+            return self._response(*_error(400, f"Too many requests in batch; max is {MAX_BATCH_SIZE}", 'badRequest'))
+
+        boundary = 'fake_batch_boundary'
+        chunks = []
+        for part in parts:
+            content_id = part['Content-ID'].strip('<>')
+            raw = part.get_payload()
+            request_line, _, rest = raw.partition('\n')
+            method, target, _ = request_line.strip().split(' ', 2)
+            split = re.split(r'\r?\n\r?\n', rest, maxsplit=1)
+            item_body = split[1].strip() if len(split) > 1 else None
+            status, payload = self._dispatch(method, target, item_body or None)
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        content = ''.join(chunks) + f"--{boundary}--\r\n"
+        response = httplib2.Response({'status': '200', 'content-type': f'multipart/mixed; boundary={boundary}'})
+        return response, content.encode('utf-8')
+
+    def _response(self, status: int, payload: Any):
+        response = httplib2.Response({'status': str(status), 'content-type': 'application/json; charset=UTF-8'})
+        response.reason = REASONS.get(status, 'Unknown')
+        content = b'' if status == 204 else json.dumps(payload).encode('utf-8')
+        return response, content
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        """httplib2.Http.request() signature; returns (response, content)."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if urlparse(uri).path.startswith('/batch'):
+            return self._batch(body, headers)
+        return self._response(*self._dispatch(method, uri, body))
@@ -0,0 +1,222 @@
+"""
+Fake OpenAI chat completions
+Scripted stand-ins for the OpenAI and AsyncOpenAI clients, returning objects
+shaped like the SDK's (message, tool calls, usage, stream chunks), so agent
+turns run offline.
+
+    responder = ScriptedResponder([
+        ("schedule", [
+            {"tool_calls": [{"name": "check_availability", "arguments": {...}}]},
+            {"content": "Done, the meeting is booked."},
+        ]),
+    ])
+    manager = ConversationManager(config, client=FakeOpenAI(responder, latency=0.3))
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+Step = Union[Dict[str, Any], Callable[[List[Dict[str, Any]]], Dict[str, Any]]]
+
+# Rough characters per token for the usage numbers.
+CHARS_PER_TOKEN = 4
+# Characters of content per streamed chunk.
+STREAM_CHUNK_CHARS = 16
+# Prompt caching as OpenAI does it: prompts of at least CACHE_MIN_TOKENS
+# reuse the longest prefix shared with a recent prompt, in CACHE_BLOCK_TOKENS steps.
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+CACHED_PROMPTS = 32
+
+def _field(message: Any, name: str, default=None):
+    if isinstance(message, dict):
+        return message.get(name, default)
+    return getattr(message, name, default)
+
+
+class ScriptedResponder:
+    """
+    Picks each reply from the conversation itself, so it works for any
+    number of concurrent conversations: the first script whose trigger
+    occurs (case-insensitively) in the latest user message is used, at the
+    step given by the number of assistant messages since that message.
+    When the script runs out, or nothing matches, `default` is answered.
+
+    A step is {"content": str}, {"tool_calls": [{"name", "arguments"}]}, or
+    a callable taking the messages and returning one of those.
+    """
+
+    def __init__(self, scripts: List[Tuple[str, List[Step]]], default: str = "OK."):
+        self.scripts = [(trigger.lower(), steps) for trigger, steps in scripts]
+        self.default = default
+
+    def __call__(self, messages: List[Any]) -> Dict[str, Any]:
+        last_user = max((i for i, m in enumerate(messages) if _field(m, "role") == "user"), default=None)
+        if last_user is None:
+            return {"content": self.default}
+        prompt = (_field(messages[last_user], "content") or "").lower()
+        step_index = sum(1 for m in messages[last_user + 1:] if _field(m, "role") == "assistant")
+        for trigger, steps in self.scripts:
+            if trigger in prompt:
+                if step_index >= len(steps):
+                    break
+                step = steps[step_index]
+                return step(messages) if callable(step) else step
+        return {"content": self.default}
+
+
+def _common_prefix(a: str, b: str) -> int:
+    """Length of the common prefix of two strings."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class _Completions:
+    def __init__(self, owner: "FakeOpenAI"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Any], tools=None, stream: bool = False, **kwargs):
+        step = self._owner._next_step(model, messages, tools)
+        time.sleep(self._owner.latency)
+        if stream:
+            return iter(self._owner._chunks(messages, tools, step, kwargs.get("stream_options")))
+        return self._owner._response(model, messages, tools, step)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model: str, messages: List[Any], tools=None, stream: bool = False, **kwargs):
+        step = self._owner._next_step(model, messages, tools)
+        await asyncio.sleep(self._owner.latency)
+        if stream:
+            return _AsyncChunks(self._owner._chunks(messages, tools, step, kwargs.get("stream_options")))
+        return self._owner._response(model, messages, tools, step)
+
+
+class _AsyncChunks:
+    def __init__(self, chunks: List[SimpleNamespace]):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeOpenAI:
+    """
+    Client with `chat.completions.create()`. Every call sleeps `latency`
+    seconds and answers with `responder(messages)`. Requests are counted
+    and their size logged in `requests`.
+    """
+
+    _completions_class = _Completions
+
+    def __init__(self, responder: Optional[Callable[[List[Any]], Dict[str, Any]]] = None, latency: float = 0.0):
+        self.responder = responder or ScriptedResponder([])
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=self._completions_class(self))
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.calls = 0
+        self._recent_prompts = deque(maxlen=CACHED_PROMPTS)
+        # (model, message count, tool calls in the reply) per request.
+        self.requests: List[Tuple[str, int, int]] = []
+
+    def _next_step(self, model: str, messages: List[Any], tools) -> Dict[str, Any]:
+        step = self.responder(messages)
+        with self._lock:
+            self.calls += 1
+            self.requests.append((model, len(messages), len(step.get("tool_calls") or [])))
+        return step
+
+    def _usage(self, messages: List[Any], tools: Optional[List[Dict[str, Any]]], reply_chars: int) -> SimpleNamespace:
+        # Tool schemas come first in the prompt, then the messages.
+        prompt = (json.dumps(tools) if tools else "") + json.dumps([
+            {"role": _field(m, "role"), "content": _field(m, "content"), "tool_calls": _field(m, "tool_calls")}
+            for m in messages
+        ], default=str)
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        with self._lock:
+            shared = max((_common_prefix(prompt, recent) for recent in self._recent_prompts), default=0)
+            self._recent_prompts.append(prompt)
+        cached_tokens = shared // CHARS_PER_TOKEN // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+        if prompt_tokens < CACHE_MIN_TOKENS or cached_tokens < CACHE_MIN_TOKENS:
+            cached_tokens = 0
+        completion_tokens = max(1, reply_chars // CHARS_PER_TOKEN)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens,
+                               prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens))
+
+    def _tool_calls(self, step: Dict[str, Any]) -> Optional[List[SimpleNamespace]]:
+        if not step.get("tool_calls"):
+            return None
+        calls = []
+        for call in step["tool_calls"]:
+            with self._lock:
+                call_id = f"call_{self._next_id:06d}"
+                self._next_id += 1
+            arguments = call.get("arguments", {})
+            calls.append(SimpleNamespace(
+                id=call_id, type="function",
+                function=SimpleNamespace(name=call["name"],
+                                         arguments=arguments if isinstance(arguments, str) else json.dumps(arguments)),
+            ))
+        return calls
+
+    def _response(self, model: str, messages: List[Any], tools, step: Dict[str, Any]) -> SimpleNamespace:
+        tool_calls = self._tool_calls(step)
+        content = step.get("content")
+        message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+        reply_chars = len(content or "") + sum(len(c.function.arguments) for c in tool_calls or [])
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message,
+                                     finish_reason="tool_calls" if tool_calls else "stop")],
+            usage=self._usage(messages, tools, reply_chars),
+        )
+
+    def _chunks(self, messages: List[Any], tools, step: Dict[str, Any],
+                stream_options: Optional[Dict[str, Any]] = None) -> List[SimpleNamespace]:
+        def chunk(content=None, tool_calls=None):
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(
+                content=content, tool_calls=tool_calls))], usage=None)
+
+        chunks = []
+        content = step.get("content") or ""
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            chunks.append(chunk(content=content[start:start + STREAM_CHUNK_CHARS]))
+        tool_calls = self._tool_calls(step) or []
+        for index, call in enumerate(tool_calls):
+            # Like the API: id and name first, then the arguments in pieces.
+            chunks.append(chunk(tool_calls=[SimpleNamespace(
+                index=index, id=call.id, function=SimpleNamespace(name=call.function.name, arguments=""))]))
+            arguments = call.function.arguments
+            for start in range(0, len(arguments), STREAM_CHUNK_CHARS):
+                chunks.append(chunk(tool_calls=[SimpleNamespace(
+                    index=index, id=None,
+                    function=SimpleNamespace(name=None, arguments=arguments[start:start + STREAM_CHUNK_CHARS]))]))
+        if stream_options and stream_options.get("include_usage"):
+            reply_chars = len(content) + sum(len(c.function.arguments) for c in tool_calls)
+            chunks.append(SimpleNamespace(choices=[], usage=self._usage(messages, tools, reply_chars)))
+        return chunks
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """FakeOpenAI whose `chat.completions.create()` is a coroutine."""
+
+    _completions_class = _AsyncCompletions
@@ -0,0 +1,71 @@
+"""
+Stand-in for the Pub/Sub push subscription that delivers Gmail notifications.
+
+FakePubSubPublisher POSTs push envelopes, in the format Pub/Sub uses, to a
+PushReceiver endpoint. Pair it with FakeGmailBackend to simulate mail
+arriving: add messages, then publish() the backend's new historyId.
+"""
+
+import base64
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from typing import Optional
+
+SUBSCRIPTION = 'projects/jarvis-local/subscriptions/gmail-push'
+
+
+class FakePubSubPublisher:
+    def __init__(self, endpoint: str, email_address: str = 'david@example.com', token: Optional[str] = None):
+        self.endpoint = endpoint + (f"?token={token}" if token else '')
+        self.email_address = email_address
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.published = 0
+        self.failed = 0
+
+    def envelope(self, history_id) -> dict:
+        with self._lock:
+            message_id = str(self._next_id)
+            self._next_id += 1
+        data = json.dumps({'emailAddress': self.email_address, 'historyId': int(history_id)})
+        return {
+            'message': {
+                'data': base64.b64encode(data.encode('utf-8')).decode('ascii'),
+                'messageId': message_id,
+                'publishTime': datetime.now(timezone.utc).isoformat(),
+            },
+            'subscription': SUBSCRIPTION,
+        }
+
+    def publish(self, history_id) -> int:
+        """Deliver one notification; returns the HTTP status of the push endpoint."""
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(self.envelope(history_id)).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        with self._lock:
+            if 200 <= status < 300:
+                self.published += 1
+            else:
+                self.failed += 1
+        return status
+
+    def publish_for(self, gmail) -> int:
+        """Publish the current historyId of a FakeGmailBackend, like Gmail does after a change."""
+        return self.publish(gmail.history_id)
+
+    def burst(self, gmail, count: int, interval: float = 0.0):
+        """Publish `count` notifications back to back, as Gmail does for a burst of mail."""
+        for _ in range(count):
+            self.publish_for(gmail)
+            if interval:
+                time.sleep(interval)
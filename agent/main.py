@@ -3,20 +3,52 @@ Jarvis Personal Assistant - Refactored Main Entry Point
 Clean, modular implementation using separated concerns.
 """
 
-import threading
+import asyncio
 from tools.oauth_integration import get_credentials
 from conversation_manager import ConversationManager
 from tool_executor import ToolExecutor
 from email_processor import EmailProcessor
 from system_config import SystemConfig
+from agent_loop import arun_turn
+from terminal import get_terminal
+from session_manager import SESSION_WORKERS
+from poll_scheduler import AdaptivePollScheduler
+from push_receiver import PushReceiver, PUSH_ENABLED, PUBSUB_TOPIC
+from tools.mail_tools import watch_mailbox
+from telemetry import MetricsServer, get_telemetry, METRICS_ENABLED, METRICS_DUMP_FILE
+
+# With push notifications, polling is only a safety net for missed ones:
+# the adaptive poll interval stays between these bounds (seconds)
+PUSH_POLL_MIN_INTERVAL = 300
+PUSH_POLL_MAX_INTERVAL = 3600
+# Notifications arriving within this many seconds share one history sync
+PUSH_COALESCE_SECONDS = 0.25
+# A Gmail watch expires after 7 days; renew it daily
+WATCH_RENEW_SECONDS = 24 * 3600
+WATCH_RETRY_SECONDS = 60
+# Seconds between checks of the webhook's new_emails.json
+WEBHOOK_CHECK_INTERVAL = 2
+# Longest an idle email worker waits before checking the queue for due retries
+WORKER_IDLE_SECONDS = 1
+# Emails handled concurrently, each in its own session
+EMAIL_WORKERS = SESSION_WORKERS
+# Emails waiting for a worker; intake (Gmail sync and webhook) pauses while
+# the queue holds this many, so a backlog stays in Gmail instead of piling up
+EMAIL_QUEUE_SIZE = 100
+
+EXIT_COMMANDS = ["thank you", "goodbye", "exit", "quit"]
 
 class JarvisAssistant:
-    def __init__(self):
+    def __init__(self, stream: bool = True, client=None, async_client=None):
+        # Stream replies to the terminal as they are generated
+        self.stream = stream
+        
         # Initialize system configuration
         self.system_config = SystemConfig()
         
         # Initialize conversation manager
-        self.conversation_manager = ConversationManager(self.system_config)
+        # client/async_client override the OpenAI clients (offline runs and benchmarks)
+        self.conversation_manager = ConversationManager(self.system_config, client=client, async_client=async_client)
         
         # Initialize tool executor (with confirmation for main conversation)
         self.tool_executor = ToolExecutor(require_confirmation=True)
@@ -27,84 +59,237 @@ class JarvisAssistant:
             ToolExecutor(require_confirmation=False)  # No confirmation for proactive emails
         )
         
+        self.terminal = get_terminal()
+        self._work_ready = None
+        self._sync_requested = None
+        self._sync_finished = None
+        self._register_collectors()
+        
+    def _register_collectors(self):
+        """Export the email pipeline's and the executors' stats on /metrics."""
+        telemetry = get_telemetry()
+        processor = self.email_processor
+        telemetry.add_collector("email_queue", processor.queue.get_stats)
+        telemetry.add_collector("message_ledger", processor.ledger.get_stats)
+        telemetry.add_collector("email_sync", lambda: dict(processor.sync_stats))
+        # Read through the processor: the scheduler is replaced when push is enabled.
+        telemetry.add_collector("poll_scheduler", lambda: processor.poll_scheduler.state())
+        telemetry.add_collector("email_sessions", processor.sessions.get_stats)
+        if processor.classifier is not None:
+            telemetry.add_collector("email_classifier", processor.classifier.get_stats)
+        telemetry.add_collector("projection", self.tool_executor.projector.get_stats)
+        telemetry.add_collector("email_projection", processor.tool_executor.projector.get_stats)
+    
     def start(self):
         """Start the Jarvis assistant."""
         print("🤖 Jarvis Personal Assistant Starting...")
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            print("\n👋 Session interrupted. Goodbye!")
+    
+    async def run(self):
+        """
+        Run the assistant on one event loop: email sync, webhook intake,
+        email workers and the conversation are tasks, and everything blocking
+        (Google API calls, reading stdin) happens on worker threads.
         
+        With JARVIS_PUSH_PORT set, Gmail push notifications trigger the
+        sync and polling drops to a slow safety net. With JARVIS_METRICS_PORT
+        set, turn, model, tool and Google API metrics and the components'
+        stats are served on /metrics.
+        """
         # Initialize credentials
-        get_credentials()
-        
-        # Start email polling in background thread
-        polling_thread = threading.Thread(
-            target=self.email_processor.poll_unread_emails,
-            args=(30,),  # 30 second interval
-            daemon=True
-        )
-        polling_thread.start()
+        await asyncio.to_thread(get_credentials)
         
+        metrics_server = None
+        if METRICS_ENABLED:
+            metrics_server = MetricsServer()
+            print(f"📈 Metrics on http://{metrics_server.host}:{metrics_server.start()}/metrics")
+        background, receiver = self._start_pipeline()
+        self.terminal.start()
         print("✅ Email polling started in background")
         print("💬 Ready for conversation!")
         
-        # Main conversation loop
-        self._run_conversation_loop()
+        try:
+            await self._run_conversation_loop()
+        finally:
+            self.terminal.close()
+            await self._stop_pipeline(background, receiver)
+            if metrics_server is not None:
+                metrics_server.stop()
+            if METRICS_DUMP_FILE:
+                get_telemetry().dump_json(METRICS_DUMP_FILE)
+    
+    def _start_pipeline(self, webhook_interval: float = WEBHOOK_CHECK_INTERVAL, workers: int = EMAIL_WORKERS):
+        """
+        Start the email pipeline tasks (sync, poller, webhook intake, workers
+        and, with push enabled, the receiver and watch renewal) on the
+        running loop. Returns (tasks, receiver) for _stop_pipeline().
+        """
+        self._work_ready = asyncio.Event()
+        self._work_done = asyncio.Event()
+        self._sync_requested = asyncio.Event()
+        self._sync_finished = asyncio.Event()
+        receiver = None
+        if PUSH_ENABLED:
+            loop = asyncio.get_running_loop()
+            receiver = PushReceiver(lambda history_id: loop.call_soon_threadsafe(self._sync_requested.set))
+            print(f"✅ Listening for Gmail push notifications on port {receiver.start()}")
+            get_telemetry().add_collector("push_receiver", receiver.get_stats)
+            self.email_processor.poll_scheduler = AdaptivePollScheduler(
+                min_interval=PUSH_POLL_MIN_INTERVAL, max_interval=PUSH_POLL_MAX_INTERVAL
+            )
+        
+        background = [
+            asyncio.create_task(self._sync_emails(), name="email-sync"),
+            asyncio.create_task(self._poll_emails(), name="email-poller"),
+            asyncio.create_task(self._watch_webhook_emails(webhook_interval), name="webhook-intake"),
+        ] + [
+            asyncio.create_task(self._email_worker(), name=f"email-worker-{i}")
+            for i in range(workers)
+        ]
+        if receiver and PUBSUB_TOPIC:
+            background.append(asyncio.create_task(self._renew_watch(PUBSUB_TOPIC), name="gmail-watch"))
+        return background, receiver
+    
+    async def _stop_pipeline(self, background, receiver):
+        """Stop what _start_pipeline() started."""
+        if receiver is not None:
+            receiver.stop()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        # Handled emails waiting for their mark-as-read should not wait out a lease.
+        await self.email_processor.aflush_read_marks()
     
-    def _run_conversation_loop(self):
+    async def _run_conversation_loop(self):
         """Main conversation loop."""
         while True:
             try:
                 # Get user input
-                user_input = input("\nWhat would you like Jarvis to do? ")
-                
-                # Check for exit commands
-                if user_input.strip().lower() in ["thank you", "goodbye", "exit", "quit"]:
-                    print("👋 Session ended. Have a great day!")
-                    break
-                
-                # Process user input
-                self._process_user_input(user_input)
-                
-                # Process any webhook emails
-                self.email_processor.process_webhook_emails()
-                
-            except KeyboardInterrupt:
-                print("\n👋 Session interrupted. Goodbye!")
+                user_input = await self.terminal.aask("\nWhat would you like Jarvis to do? ")
+            except EOFError:
+                print("\n👋 Session ended. Have a great day!")
                 break
+            
+            # Check for exit commands
+            if user_input.strip().lower() in EXIT_COMMANDS:
+                print("👋 Session ended. Have a great day!")
+                break
+            
+            try:
+                # Process user input
+                await self._aprocess_user_input(user_input)
             except Exception as e:
                 print(f"❌ Error in conversation loop: {e}")
     
-    def _process_user_input(self, user_input: str):
-        """Process user input and generate response."""
-        # Add user message to conversation
-        self.conversation_manager.add_user_message(user_input)
-        
-        # Get AI response
-        msg = self.conversation_manager.create_chat_completion()
-        
-        # Process tool calls
-        while hasattr(msg, "tool_calls") and msg.tool_calls:
-            tool_outputs = self.tool_executor.process_tool_calls(msg.tool_calls)
-            
-            # Add messages to conversation
-            self.conversation_manager.messages.append(msg)
-            for tool_output in tool_outputs:
-                self.conversation_manager.add_tool_message(
-                    tool_output["tool_call_id"],
-                    tool_output["name"],
-                    tool_output["content"]
-                )
-            
-            # Get next response
-            msg = self.conversation_manager.create_chat_completion()
-            
-            if not (hasattr(msg, "tool_calls") and msg.tool_calls):
-                break
-        
-        # Add final message
-        self.conversation_manager.messages.append(msg)
-        
-        # Print response
+    def _on_delta(self, text: str):
+        """Print streamed reply text as it arrives."""
+        print(text, end="", flush=True)
+    
+    def _print_reply(self, msg):
+        """Finish printing the assistant's reply."""
         if hasattr(msg, "content") and msg.content:
-            print(msg.content)
+            # Streamed replies were printed piece by piece; just end the line.
+            print() if self.stream else print(msg.content)
+    
+    async def _aprocess_user_input(self, user_input: str):
+        """Process user input and generate response on the asyncio runtime."""
+        msg = await arun_turn(
+            self.conversation_manager, self.tool_executor, user_input,
+            stream=self.stream, on_delta=self._on_delta if self.stream else None
+        )
+        self._print_reply(msg)
+    
+    async def _poll_emails(self):
+        """
+        Request a Gmail sync once none has run for the poll scheduler's
+        current delay. Any sync, also one triggered by a push notification,
+        restarts the wait.
+        """
+        scheduler = self.email_processor.poll_scheduler
+        while True:
+            self._sync_finished.clear()
+            try:
+                await asyncio.wait_for(self._sync_finished.wait(), scheduler.next_delay())
+            except asyncio.TimeoutError:
+                self._sync_requested.set()
+                await self._sync_finished.wait()
+    
+    async def _sync_emails(self):
+        """
+        Sync Gmail whenever a poll or a push notification asks for it and
+        queue new emails for the workers. Requests that arrive while a sync
+        is waiting or running are folded into the next one.
+        """
+        while True:
+            await self._sync_requested.wait()
+            # Let a burst of notifications settle so it costs one history sync.
+            await asyncio.sleep(PUSH_COALESCE_SECONDS)
+            self._sync_requested.clear()
+            try:
+                await self._wait_for_room("Gmail sync")
+                emails, history_id = await asyncio.to_thread(self.email_processor.collect_new_emails)
+                if await asyncio.to_thread(self.email_processor.enqueue_emails, emails, "poll"):
+                    self._work_ready.set()
+                # The emails are durable in the queue, so the sync point can move on.
+                await asyncio.to_thread(self.email_processor.commit_sync, history_id)
+            except Exception as e:
+                print(f"Polling error: {e}")
+            self._sync_finished.set()
+    
+    async def _renew_watch(self, topic: str):
+        """Keep Gmail publishing mailbox changes to the Pub/Sub topic."""
+        while True:
+            try:
+                response = await asyncio.to_thread(watch_mailbox, topic)
+                print(f"✅ Gmail push notifications active (historyId {response['historyId']})")
+                await asyncio.sleep(WATCH_RENEW_SECONDS)
+            except Exception as e:
+                print(f"Gmail watch error: {e}")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+    
+    async def _watch_webhook_emails(self, interval: int):
+        """Queue emails the webhook stored in new_emails.json."""
+        while True:
+            try:
+                await self._wait_for_room("Webhook intake")
+                if await asyncio.to_thread(self.email_processor.ingest_webhook_emails):
+                    self._work_ready.set()
+            except Exception as e:
+                print(f"Webhook intake error: {e}")
+            await asyncio.sleep(interval)
+    
+    async def _wait_for_room(self, intake: str):
+        """Wait while EMAIL_QUEUE_SIZE or more emails are waiting to be handled."""
+        queue = self.email_processor.queue
+        paused = False
+        while await asyncio.to_thread(queue.pending) >= EMAIL_QUEUE_SIZE:
+            if not paused:
+                print(f"[Polling] {intake} paused: {EMAIL_QUEUE_SIZE} or more emails are waiting")
+                paused = True
+            self._work_done.clear()
+            try:
+                await asyncio.wait_for(self._work_done.wait(), WORKER_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _email_worker(self):
+        """Process queued emails one at a time."""
+        queue = self.email_processor.queue
+        while True:
+            items = await asyncio.to_thread(queue.lease, 1)
+            if not items:
+                self._work_ready.clear()
+                try:
+                    await asyncio.wait_for(self._work_ready.wait(), WORKER_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self.email_processor.ahandle(items[0])
+            self._work_done.set()
 
 def main():
     """Main entry point."""
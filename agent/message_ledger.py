@@ -0,0 +1,160 @@
+"""
+Message Ledger
+Persistent record of every email taken in, so no email is fetched or sent
+to the model twice.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from email_queue import LEASE_SECONDS
+
+# Where the ledger is stored.
+LEDGER_FILE = "processed_emails.db"
+# Characters of the agent's final answer kept as the outcome.
+OUTCOME_MAX_CHARS = 500
+# IDs per IN (...) query; SQLite limits the number of bound variables.
+QUERY_CHUNK = 500
+
+# What begin() found: the caller may process the message, it was processed
+# already, or another worker holds a live claim on it.
+STARTED = "started"
+DONE = "done"
+BUSY = "busy"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    outcome TEXT
+);
+"""
+
+
+class MessageLedger:
+    """
+    Message ID -> state, timestamps and outcome.
+
+    States move queued -> processing -> done (or failed, which may be
+    retried). unseen() is checked before fetching message content and
+    begin() before calling the model, so a message that shows up again, in
+    an overlapping poll, a full resync or a redelivered webhook, costs
+    neither a Gmail fetch nor a completion.
+
+    A 'processing' row is a claim: begin() refuses it until it is older
+    than claim_seconds (the queue's lease), after which its worker is
+    presumed dead and the message can be taken over.
+    """
+
+    def __init__(self, path: str = LEDGER_FILE, claim_seconds: float = LEASE_SECONDS):
+        self.path = path
+        self.claim_seconds = claim_seconds
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.stats = {"skipped_fetches": 0, "skipped_completions": 0, "busy": 0, "takeovers": 0,
+                      "done": 0, "failed": 0}
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def unseen(self, message_ids: List[str]) -> List[str]:
+        """The IDs not in the ledger yet, in their original order."""
+        known = set()
+        with self._lock:
+            for start in range(0, len(message_ids), QUERY_CHUNK):
+                chunk = message_ids[start:start + QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT message_id FROM messages WHERE message_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                known.update(row[0] for row in rows)
+            self.stats["skipped_fetches"] += len(known)
+        return [message_id for message_id in message_ids if message_id not in known]
+
+    def record_queued(self, message_ids: List[str]):
+        """Record messages handed to the work queue."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages (message_id, state, first_seen, updated_at) VALUES (?, 'queued', ?, ?)",
+                [(message_id, now, now) for message_id in message_ids]
+            )
+
+    def begin(self, message_id: str) -> str:
+        """
+        Claim a message for processing. Returns STARTED, or DONE if it was
+        already processed, or BUSY if another worker's claim is still live.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT state, updated_at FROM messages WHERE message_id = ?",
+                               (message_id,)).fetchone()
+            if row is not None and row[0] == "done":
+                self.stats["skipped_completions"] += 1
+                return DONE
+            if row is not None and row[0] == "processing":
+                if now - row[1] < self.claim_seconds:
+                    self.stats["busy"] += 1
+                    return BUSY
+                self.stats["takeovers"] += 1
+            conn.execute(
+                "INSERT INTO messages (message_id, state, attempts, first_seen, updated_at) "
+                "VALUES (?, 'processing', 1, ?, ?) "
+                "ON CONFLICT (message_id) DO UPDATE SET state = 'processing', attempts = attempts + 1, "
+                "updated_at = excluded.updated_at",
+                (message_id, now, now)
+            )
+            return STARTED
+
+    def finish(self, message_id: str, outcome: Optional[str] = None):
+        """Mark a message as processed, keeping the start of the agent's answer."""
+        self._set_state(message_id, "done", (outcome or "")[:OUTCOME_MAX_CHARS])
+
+    def fail(self, message_id: str, error: str):
+        """Mark a processing attempt as failed."""
+        self._set_state(message_id, "failed", error[:OUTCOME_MAX_CHARS])
+
+    def _set_state(self, message_id: str, state: str, outcome: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE messages SET state = ?, outcome = ?, updated_at = ? WHERE message_id = ?",
+                         (state, outcome, time.time(), message_id))
+            self.stats[state] += 1
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """The ledger entry for a message, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, attempts, first_seen, updated_at, outcome FROM messages WHERE message_id = ?",
+                (message_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("state", "attempts", "first_seen", "updated_at", "outcome"), row))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus the number of messages per state."""
+        with self._lock:
+            stats = dict(self.stats)
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM messages GROUP BY state").fetchall()
+        stats["states"] = {state: count for state, count in rows}
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,162 @@
+"""
+Poll Scheduler
+Decides how long to wait before the next Gmail poll, based on recent
+activity, errors and the polling budget.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Interval right after a poll found new mail.
+MIN_INTERVAL = 10.0
+# Longest wait during quiet periods.
+MAX_INTERVAL = 600.0
+# Longest wait after repeated errors.
+ERROR_MAX_INTERVAL = 900.0
+# Growth of the interval per quiet poll and per failed poll.
+QUIET_FACTOR = 1.5
+ERROR_FACTOR = 2.0
+# Rate-limit errors (429, rateLimitExceeded) back off this much faster.
+RATE_LIMIT_FACTOR = 4.0
+# Each delay is randomized by +/- this fraction.
+JITTER = 0.2
+# The polling budget is counted over this many seconds.
+QUOTA_WINDOW = 3600.0
+# Most polls allowed per window; set JARVIS_POLL_BUDGET_PER_HOUR to enable.
+POLL_BUDGET = int(os.environ.get('JARVIS_POLL_BUDGET_PER_HOUR', '0')) or None
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+def _rate_limit_info(error: Exception):
+    """(is_rate_limited, retry_after_seconds) for an API error."""
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None)
+    reason = None
+    if hasattr(error, 'error_details') and isinstance(error.error_details, list) and error.error_details:
+        reason = error.error_details[0].get('reason')
+    limited = status == 429 or (status == 403 and reason in RATE_LIMIT_REASONS)
+    retry_after = None
+    if resp is not None and hasattr(resp, 'get'):
+        try:
+            retry_after = float(resp.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+    return limited, retry_after
+
+
+class AdaptivePollScheduler:
+    """
+    Adaptive poll interval.
+
+    A poll that finds new mail resets the interval to min_interval; every
+    quiet poll stretches it by QUIET_FACTOR up to max_interval. Failed polls
+    back off exponentially up to ERROR_MAX_INTERVAL (faster for rate-limit
+    errors, and never sooner than a Retry-After header asks). With
+    max_polls_per_window set, polls are spaced so the budget for the
+    current window is never exceeded. All delays get +/- JITTER.
+    """
+
+    def __init__(self, min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 error_max_interval: float = ERROR_MAX_INTERVAL, max_polls_per_window: Optional[int] = POLL_BUDGET,
+                 window: float = QUOTA_WINDOW, jitter: float = JITTER):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.error_max_interval = error_max_interval
+        self.max_polls_per_window = max_polls_per_window
+        self.window = window
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._interval = min_interval
+        self._mode = "active"
+        self._consecutive_errors = 0
+        self._quiet_polls = 0
+        self._retry_after = 0.0
+        self._last_poll: Optional[float] = None
+        self._polls = deque()
+        self.stats = {"polls": 0, "active_polls": 0, "quiet_polls": 0, "errors": 0, "rate_limited": 0,
+                      "budget_waits": 0}
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next poll, counted from now."""
+        with self._lock:
+            if self._last_poll is None:
+                return 0.0
+            now = time.monotonic()
+            delay = self._interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = max(delay, self._retry_after)
+            delay = max(0.0, self._last_poll + delay - now)
+            budget_delay = self._budget_delay(now)
+            if budget_delay > delay:
+                self.stats["budget_waits"] += 1
+                delay = budget_delay
+            return delay
+
+    def _budget_delay(self, now: float) -> float:
+        if not self.max_polls_per_window:
+            return 0.0
+        while self._polls and self._polls[0] <= now - self.window:
+            self._polls.popleft()
+        if len(self._polls) < self.max_polls_per_window:
+            return 0.0
+        # The window is full: wait until its oldest poll drops out.
+        return self._polls[0] + self.window - now
+
+    def _record_poll(self):
+        now = time.monotonic()
+        self._last_poll = now
+        self._polls.append(now)
+        self.stats["polls"] += 1
+
+    def record_result(self, new_items: int):
+        """Record a successful poll that found `new_items` new emails."""
+        with self._lock:
+            self._record_poll()
+            self._consecutive_errors = 0
+            self._retry_after = 0.0
+            if new_items:
+                self._interval = self.min_interval
+                self._quiet_polls = 0
+                self._mode = "active"
+                self.stats["active_polls"] += 1
+            else:
+                self._interval = min(self.max_interval, max(self._interval, self.min_interval) * QUIET_FACTOR)
+                self._quiet_polls += 1
+                self._mode = "quiet"
+                self.stats["quiet_polls"] += 1
+
+    def record_error(self, error: Exception):
+        """Record a failed poll."""
+        limited, retry_after = _rate_limit_info(error)
+        with self._lock:
+            self._record_poll()
+            self._consecutive_errors += 1
+            self.stats["errors"] += 1
+            factor = ERROR_FACTOR
+            if limited:
+                factor = RATE_LIMIT_FACTOR
+                self.stats["rate_limited"] += 1
+            self._interval = min(self.error_max_interval, max(self._interval, self.min_interval) * factor)
+            self._retry_after = retry_after or 0.0
+            self._mode = "rate_limited" if limited else "backoff"
+
+    def state(self) -> Dict[str, Any]:
+        """Current interval, mode and counters."""
+        with self._lock:
+            now = time.monotonic()
+            polls_in_window = sum(1 for t in self._polls if t > now - self.window)
+            state = {
+                "mode": self._mode,
+                "interval": self._interval,
+                "consecutive_errors": self._consecutive_errors,
+                "quiet_polls": self._quiet_polls,
+                "retry_after": self._retry_after,
+                "seconds_since_last_poll": None if self._last_poll is None else now - self._last_poll,
+                "polls_in_window": polls_in_window,
+                "max_polls_per_window": self.max_polls_per_window,
+            }
+            state.update(self.stats)
+            return state
@@ -0,0 +1,136 @@
+"""
+Push Receiver
+Minimal HTTP endpoint for Gmail push notifications delivered by a Pub/Sub
+push subscription.
+"""
+
+import base64
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+# Set JARVIS_PUSH_PORT to start the receiver (0 picks a free port).
+PUSH_ENABLED = 'JARVIS_PUSH_PORT' in os.environ
+PUSH_PORT = int(os.environ.get('JARVIS_PUSH_PORT') or 0)
+PUSH_PATH = '/gmail/push'
+# If set, push requests must carry ?token=<value> (configured on the subscription).
+PUSH_TOKEN = os.environ.get('JARVIS_PUSH_TOKEN')
+# Without a token anyone who can reach the port could trigger syncs, so the
+# receiver then only listens on loopback unless JARVIS_PUSH_HOST says otherwise.
+PUSH_HOST = os.environ.get('JARVIS_PUSH_HOST') or ('0.0.0.0' if PUSH_TOKEN else '127.0.0.1')
+# Pub/Sub topic Gmail publishes to, e.g. projects/<project>/topics/<topic>.
+PUBSUB_TOPIC = os.environ.get('JARVIS_PUBSUB_TOPIC')
+# Largest request body accepted; Gmail notifications are a few hundred bytes.
+MAX_BODY_BYTES = 64 * 1024
+
+def decode_notification(envelope: Dict[str, Any]) -> Dict[str, Any]:
+    """Pub/Sub push envelope -> Gmail notification ({"emailAddress", "historyId"})."""
+    data = envelope['message']['data']
+    notification = json.loads(base64.b64decode(data))
+    if 'historyId' not in notification:
+        raise ValueError("notification has no historyId")
+    return notification
+
+
+class PushReceiver:
+    """
+    Accepts Pub/Sub push requests on PUSH_PATH and calls on_notification
+    with the Gmail historyId of each valid one.
+
+    The handler only decodes and acknowledges (204); the callback must be
+    cheap because Pub/Sub redelivers requests that are not answered in
+    time. Coalescing bursts and running the history sync is up to the
+    callback's owner.
+    """
+
+    def __init__(self, on_notification: Callable[[str], None], host: str = PUSH_HOST, port: int = PUSH_PORT,
+                 path: str = PUSH_PATH, token: Optional[str] = PUSH_TOKEN):
+        self.on_notification = on_notification
+        self.host = host
+        self.port = port
+        self.path = path
+        self.token = token
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"received": 0, "rejected": 0, "malformed": 0, "latest_history_id": None}
+
+    def _count(self, key: str, history_id: Optional[str] = None):
+        with self._lock:
+            self.stats[key] += 1
+            if history_id is not None:
+                self.stats["latest_history_id"] = history_id
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != receiver.path:
+                    self._reply(404)
+                    return
+                if receiver.token and parse_qs(url.query).get('token', [None])[0] != receiver.token:
+                    receiver._count("rejected")
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers['Content-Length'])
+                except (TypeError, ValueError):
+                    length = -1
+                if length < 0:
+                    receiver._count("malformed")
+                    self._reply(400)
+                    return
+                if length > MAX_BODY_BYTES:
+                    receiver._count("malformed")
+                    self._reply(413)
+                    return
+                try:
+                    notification = decode_notification(json.loads(self.rfile.read(length)))
+                except (ValueError, KeyError, TypeError) as e:
+                    # Acknowledge anyway: redelivering a malformed message would not fix it.
+                    print(f"[Push] Ignoring malformed notification: {e}")
+                    receiver._count("malformed")
+                    self._reply(204)
+                    return
+                history_id = str(notification['historyId'])
+                receiver._count("received", history_id)
+                self._reply(204)
+                receiver.on_notification(history_id)
+
+            def do_GET(self):
+                # Health check.
+                self._reply(200 if urlparse(self.path).path == '/healthz' else 404)
+
+            def _reply(self, status: int):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> int:
+        """Start serving on a background thread. Returns the bound port."""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="push-receiver", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,162 @@
+"""
+Result Projection
+Reduces raw Google API results to the fields the model actually needs
+before they are serialized into the conversation.
+"""
+
+import json
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+# Fields kept for each tool's results. Tools not listed are passed through.
+DEFAULT_FIELDS = {
+    "list_events": ["id", "summary", "start", "end", "attendees", "status"],
+    "create_event": ["id", "summary", "start", "end", "attendees", "status", "htmlLink", "invitations"],
+    "update_event": ["id", "summary", "start", "end", "attendees", "status", "htmlLink", "invitations"],
+    "list_emails": ["id", "from", "reply_to", "subject", "body", "snippet"],
+    "list_tasks": ["id", "title", "status", "due", "notes"],
+    "add_task": ["id", "title", "status", "due"],
+    "complete_task": ["id", "title", "status"],
+}
+# Email bodies and task notes are cut to this many characters.
+MAX_TEXT_CHARS = 1000
+# At most this many items of a list result are kept.
+MAX_ITEMS = 50
+# Serialized results above this size have items dropped from the end.
+MAX_RESULT_CHARS = 12000
+
+TRUNCATION_MARK = "...[truncated]"
+
+def _serialize(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _truncate(text: str, limit: int) -> str:
+    if text and len(text) > limit:
+        return text[:limit] + TRUNCATION_MARK
+    return text
+
+
+class ResultProjector:
+    """
+    Per-tool projection and size capping of tool results.
+    Keeps byte/token counters so the savings can be reported per tool.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, List[str]]] = None, max_text_chars: int = MAX_TEXT_CHARS,
+                 max_items: int = MAX_ITEMS, max_result_chars: int = MAX_RESULT_CHARS):
+        self.fields = dict(DEFAULT_FIELDS)
+        self.fields.update(fields or {})
+        self.max_text_chars = max_text_chars
+        self.max_items = max_items
+        self.max_result_chars = max_result_chars
+        self._projectors: Dict[str, Callable[[Any, List[str]], Any]] = {
+            "list_events": self._project_event_list,
+            "create_event": self._project_event,
+            "update_event": self._project_event,
+            "list_emails": self._project_email_result,
+            "list_tasks": self._project_task_list,
+            "add_task": self._project_task,
+            "complete_task": self._project_task,
+        }
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _project_event(self, event: Any, fields: List[str]) -> Any:
+        if not isinstance(event, dict) or "error" in event:
+            return event
+        projected = {}
+        for field in fields:
+            if field not in event:
+                continue
+            value = event[field]
+            if field in ("start", "end") and isinstance(value, dict):
+                # {'dateTime': ..., 'timeZone': ...} -> the instant, or the day for all-day events.
+                value = value.get("dateTime") or value.get("date")
+            elif field == "attendees":
+                value = [a.get("email") for a in value if isinstance(a, dict)]
+            projected[field] = value
+        return projected
+
+    def _project_event_list(self, events: Any, fields: List[str]) -> Any:
+        if not isinstance(events, list):
+            return events
+        return [self._project_event(event, fields) for event in events]
+
+    def _project_email(self, email: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        projected = {field: email[field] for field in fields if email.get(field)}
+        if "body" in projected:
+            projected["body"] = _truncate(projected["body"], self.max_text_chars)
+            # The snippet only repeats the start of the body.
+            projected.pop("snippet", None)
+        return projected
+
+    def _project_email_result(self, result: Any, fields: List[str]) -> Any:
+        if not isinstance(result, dict) or not isinstance(result.get("emails"), list):
+            return result
+        projected = dict(result)
+        projected["emails"] = [self._project_email(email, fields) for email in result["emails"]]
+        return projected
+
+    def _project_task(self, task: Any, fields: List[str]) -> Any:
+        if not isinstance(task, dict) or "error" in task:
+            return task
+        projected = {field: task[field] for field in fields if task.get(field)}
+        if "notes" in projected:
+            projected["notes"] = _truncate(projected["notes"], self.max_text_chars)
+        return projected
+
+    def _project_task_list(self, tasks: Any, fields: List[str]) -> Any:
+        if not isinstance(tasks, list):
+            return tasks
+        return [self._project_task(task, fields) for task in tasks]
+
+    def _cap(self, value: Any) -> str:
+        """
+        Serialize `value`, keeping at most max_items list items and dropping
+        more from the end until it fits max_result_chars. Omitted items are
+        replaced by a note so the model knows the list is incomplete.
+        """
+        items_key = None
+        items = value
+        if isinstance(value, dict) and isinstance(value.get("emails"), list):
+            items_key, items = "emails", value["emails"]
+        if not isinstance(items, list):
+            return _serialize(value)
+
+        def render(keep: int) -> str:
+            kept = items[:keep]
+            if keep < len(items):
+                kept = kept + [{"note": f"{len(items) - keep} more items omitted to save space"}]
+            return _serialize(dict(value, **{items_key: kept}) if items_key else kept)
+
+        keep = min(len(items), self.max_items)
+        serialized = render(keep)
+        while keep > 1 and len(serialized) > self.max_result_chars:
+            keep //= 2
+            serialized = render(keep)
+        return serialized
+
+    def project(self, tool_name: str, result: Any) -> str:
+        """Project `result` for `tool_name` and return it serialized for the conversation."""
+        projector = self._projectors.get(tool_name)
+        fields = self.fields.get(tool_name)
+        projected = projector(result, fields) if projector and fields else result
+        serialized = self._cap(projected)
+        self._record(tool_name, len(json.dumps(result)), len(serialized.encode("utf-8")))
+        return serialized
+
+    def _record(self, tool_name: str, raw_bytes: int, projected_bytes: int):
+        with self._lock:
+            entry = self.stats.setdefault(tool_name, {"calls": 0, "raw_bytes": 0, "projected_bytes": 0})
+            entry["calls"] += 1
+            entry["raw_bytes"] += raw_bytes
+            entry["projected_bytes"] += projected_bytes
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Bytes and (estimated, ~4 bytes each) tokens saved per tool."""
+        with self._lock:
+            stats = {tool: dict(entry) for tool, entry in self.stats.items()}
+        for entry in stats.values():
+            entry["bytes_saved"] = entry["raw_bytes"] - entry["projected_bytes"]
+            entry["tokens_saved"] = entry["bytes_saved"] // 4
+        return stats
@@ -0,0 +1,101 @@
+"""
+Session Manager
+Handles incoming emails in short-lived conversations of their own and posts
+a compact summary of each one back to the main conversation.
+"""
+
+import asyncio
+import threading
+from typing import Dict, Any
+from conversation_manager import ConversationManager
+from agent_loop import arun_turn
+
+# Emails handled at the same time.
+SESSION_WORKERS = 4
+# Token budget of a single email's conversation.
+SESSION_CONTEXT_BUDGET = 6000
+# Characters of the session's final answer kept in the summary.
+SUMMARY_MAX_CHARS = 500
+
+class SessionManager:
+    """
+    Runs each email in a fresh ConversationManager holding only the system
+    prompt, the email and its own tool loop, so the prompt size of a session
+    does not depend on the interactive history or on other emails.
+
+    At most max_workers sessions run at once, gated by a semaphore. When a
+    session ends, a one-line summary (email, tools used, final answer) is
+    left for the main conversation so the user can follow up on it there.
+    """
+
+    def __init__(self, system_config, tool_executor, main_conversation: ConversationManager,
+                 max_workers: int = SESSION_WORKERS, context_budget: int = SESSION_CONTEXT_BUDGET):
+        self.system_config = system_config
+        self.tool_executor = tool_executor
+        self.main_conversation = main_conversation
+        self.max_workers = max_workers
+        self.context_budget = context_budget
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._stats_lock = threading.Lock()
+        self.stats = {"sessions": 0, "failed": 0, "active": 0, "peak_active": 0, "max_prompt_tokens": 0}
+
+    def _new_session(self) -> ConversationManager:
+        # Sessions share the main conversation's clients (and their connection pools).
+        return ConversationManager(self.system_config, context_budget=self.context_budget,
+                                   async_client=self.main_conversation.get_async_client(),
+                                   client=self.main_conversation.client)
+
+    def _started(self):
+        with self._stats_lock:
+            self.stats["active"] += 1
+            self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+
+    def _finished(self, session: ConversationManager, failed: bool):
+        with self._stats_lock:
+            self.stats["active"] -= 1
+            self.stats["sessions"] += 1
+            if failed:
+                self.stats["failed"] += 1
+            self.stats["max_prompt_tokens"] = max(self.stats["max_prompt_tokens"],
+                                                  session.context_window.stats["last_total_tokens"])
+
+    async def arun(self, email: Dict[str, Any], prompt: str, source: str = "poll"):
+        """Handle one email in its own session and return the final assistant message; waits for a free slot first."""
+        async with self._semaphore:
+            session = self._new_session()
+            self._started()
+            failed = True
+            try:
+                msg = await arun_turn(session, self.tool_executor, prompt, source=source)
+                failed = False
+            finally:
+                self._finished(session, failed)
+        self.post_note(self._summarize(email, session, msg))
+        return msg
+
+    def post_note(self, text: str):
+        """
+        Leave a note about an email for the main conversation. It is added at
+        the start of the next turn, so this never waits for the user's turn.
+        """
+        self.main_conversation.post_note(text)
+
+    def _summarize(self, email: Dict[str, Any], session: ConversationManager, msg) -> str:
+        tools = []
+        for message in session.messages:
+            for tool_call in message.get("tool_calls", []) if isinstance(message, dict) else []:
+                if tool_call["function"]["name"] not in tools:
+                    tools.append(tool_call["function"]["name"])
+        answer = (getattr(msg, "content", None) or "").strip()
+        if len(answer) > SUMMARY_MAX_CHARS:
+            answer = answer[:SUMMARY_MAX_CHARS] + "..."
+        summary = f"[Handled email from {email.get('from', 'unknown')} - Subject: {email.get('subject', '')}]"
+        if tools:
+            summary += f" Tools used: {', '.join(tools)}."
+        if answer:
+            summary += f" {answer}"
+        return summary
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
@@ -0,0 +1,104 @@
+"""
+Stage Timer
+Accumulates wall time per pipeline stage (credential loads, client builds,
+Google API calls, model calls, serialization) for benchmarks and profiling.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+# Set JARVIS_STAGE_TIMING=1 to record stages outside the benchmarks.
+STAGE_TIMING = os.environ.get('JARVIS_STAGE_TIMING') == '1'
+# Durations kept per stage for the percentiles.
+MAX_SAMPLES = 5000
+
+class _Timed:
+    __slots__ = ("timer", "stage", "start")
+
+    def __init__(self, timer: "StageTimer", stage: str):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NotTimed:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOT_TIMED = _NotTimed()
+
+
+class StageTimer:
+    """
+    Per-stage count, total and recent durations. While disabled, timed()
+    hands out a shared no-op context manager, so instrumented code pays
+    only an attribute check.
+    """
+
+    def __init__(self, enabled: bool = STAGE_TIMING, max_samples: int = MAX_SAMPLES):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def timed(self, stage: str):
+        """Context manager recording the time spent in its block under `stage`."""
+        return _Timed(self, stage) if self.enabled else _NOT_TIMED
+
+    def record(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["samples"].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: count, total, mean, p50, p95 and max seconds."""
+        with self._lock:
+            stages = {stage: (entry["count"], entry["total"], sorted(entry["samples"]))
+                      for stage, entry in self._stages.items()}
+        result = {}
+        for stage, (count, total, samples) in stages.items():
+            result[stage] = {
+                "count": count,
+                "total": total,
+                "mean": total / count,
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max": samples[-1],
+            }
+        return result
+
+
+_timer = StageTimer()
+
+def get_stage_timer() -> StageTimer:
+    """Return the process-wide stage timer."""
+    return _timer
+
+def timed(stage: str):
+    """Time a block under `stage` on the process-wide timer."""
+    return _timer.timed(stage)
@@ -3,12 +3,9 @@ System Configuration
 Handles system setup, contacts, prompts, configuration management, and environment variables.
 """
 
-import json
 import os
-import sys
 from datetime import datetime
 import pytz
-from typing import List, Dict, Any
 from dotenv import load_dotenv
 
 class SystemConfig:
@@ -16,13 +13,10 @@ class SystemConfig:
         # Load environment variables
         self._load_environment_variables()
         
-        # Initialize timezone and date
+        # Initialize timezone; the date and time are sent per request (get_dynamic_context)
         self.cairo_tz = pytz.timezone('Africa/Cairo')
-        self.current_date = datetime.now(self.cairo_tz).strftime("%Y-%m-%d")
         
-        # Load contacts and create system prompt
-        self.contacts = self._load_contacts()
-        self.contacts_str = self._format_contacts()
+        # Contacts are looked up with the resolve_contact tool, not listed in the prompt
         self.system_prompt = self._create_system_prompt()
         
     def _load_environment_variables(self):
@@ -48,40 +42,26 @@ class SystemConfig:
             print(f"OpenAI API key loaded successfully (length: {len(self.openai_key)})")
             
         
-    def _load_contacts(self) -> List[Dict[str, str]]:
-        """Load contacts from contacts.json file."""
-        contacts_path = os.path.join(os.path.dirname(__file__), 'contacts.json')
-        try:
-            with open(contacts_path, 'r') as f:
-                return json.load(f)['contacts']
-        except FileNotFoundError:
-            print(f"Warning: contacts.json not found at {contacts_path}")
-            return []
-        except json.JSONDecodeError:
-            print("Warning: Invalid JSON in contacts.json")
-            return []
-    
-    def _format_contacts(self) -> str:
-        """Format contacts for the system prompt."""
-        return "\n".join([f"- {c['name']}: {c['email']}" for c in self.contacts])
-    
     def _create_system_prompt(self) -> str:
-        """Create the system prompt with current date and contacts."""
+        """
+        Create the system prompt. It holds no date, time or other changing
+        state, so every request starts with the same bytes and the provider
+        can reuse its cached prefix; that state goes in get_dynamic_context().
+        """
         return (
-            f"The current date is: {self.current_date}. "
             "You are Jarvis, a proactive AI assistant for David. "
             "You help manage David's emails, upcoming calendar events, and todos. "
             "You can read, summarize, and send emails, and manage Google Tasks. "
             "When David asks to schedule a meeting with a friend in his Contacts list, "
-            "you must always first check David's calendar for availability at the requested time using the list_events tool. "
+            "you must always first check David's calendar for availability at the requested time using the check_availability tool. "
             "If David is available, create a calendar event and send a calendar invitation email to the friend. "
-            "If David is not available, propose the next available time slot and repeat the process as needed. "
-            "You always use the Contacts list to resolve names to email addresses. "
-            "Here is the Contacts list (name: email):\n" + self.contacts_str + "\n" 
-            "IMPORTANT: David is located in Cairo, Egypt (UTC+2). When scheduling events, always interpret times as Cairo time. "
-            "For example, if David says '10pm', interpret it as 10:00 PM Cairo time (UTC+2), not UTC. "
-            "Convert all times to RFC3339 format with the correct Cairo timezone offset (+03:00). "
-            "When creating events, use format like '2025-09-02T22:00:00+03:00' for 10:00 PM Cairo time. "
+            "If David is not available, use the find_free_slots tool to propose the next available time slots. "
+            "You always use the resolve_contact tool to resolve names to email addresses and never guess an address; "
+            "if it returns several plausible matches or only fuzzy ones, ask David which person he means. "
+            "IMPORTANT: David is located in Cairo, Egypt. When scheduling events, always interpret times as Cairo time. "
+            "For example, if David says '10pm', interpret it as 10:00 PM Cairo time, not UTC. "
+            "Convert all times to RFC3339 format with the Cairo UTC offset given in the current time note at the end of the conversation. "
+            "When creating events, use format like '2025-09-02T22:00:00+03:00' for 10:00 PM Cairo time at offset +03:00. "
             "You are efficient, polite, and always keep David informed of any changes or confirmations. "
             "You never double-book David and always respect his existing commitments. "
             "You can also help David by summarizing his inbox, upcoming events, and pending todos. "
@@ -93,6 +73,13 @@ class SystemConfig:
         """Get the current system prompt."""
         return self.system_prompt
     
+    def get_dynamic_context(self) -> str:
+        """Per-request context sent after the conversation: the current Cairo date, time and UTC offset."""
+        now = datetime.now(self.cairo_tz)
+        offset = now.strftime("%z")
+        return (f"Current time note: it is {now.strftime('%A, %Y-%m-%d %H:%M')} in Cairo "
+                f"(UTC offset {offset[:3]}:{offset[3:]}).")
+    
     def get_openai_key(self) -> str:
         """Get the OpenAI API key."""
         return self.openai_key
@@ -0,0 +1,442 @@
+"""
+Telemetry
+Structured spans for agent turns (model calls, tool calls, Google API
+requests), aggregated into Prometheus-style counters and histograms and
+served on a local /metrics endpoint, with a JSON dump of the metrics and
+the most recent traces. Components register collectors for their own
+stats (queue depth, cache hit ratios, circuit states, ...), which are
+read on every scrape.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Set JARVIS_TELEMETRY=0 to turn spans and metrics off.
+TELEMETRY_ENABLED = os.environ.get('JARVIS_TELEMETRY', '1') != '0'
+# Set JARVIS_METRICS_PORT to serve /metrics and /metrics.json (0 picks a free port).
+METRICS_ENABLED = 'JARVIS_METRICS_PORT' in os.environ
+METRICS_PORT = int(os.environ.get('JARVIS_METRICS_PORT') or 0)
+# Local only by default: traces contain email subjects and tool arguments.
+METRICS_HOST = os.environ.get('JARVIS_METRICS_HOST', '127.0.0.1')
+# If set, the JSON dump is written to this file when the assistant exits.
+METRICS_DUMP_FILE = os.environ.get('JARVIS_METRICS_DUMP')
+# Finished traces (root spans with their children) kept for the JSON dump.
+MAX_TRACES = 100
+# Root spans kept as traces; other roots, like the mail sync's Google
+# requests, only feed the metrics.
+TRACE_ROOTS = ("turn",)
+# Children kept per span; a runaway tool loop should not grow a trace without bound.
+MAX_CHILDREN = 200
+
+# Histogram bucket upper bounds.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "jarvis_turn_seconds": ("histogram", "Wall time of an agent turn, by source.", SECONDS_BUCKETS),
+    "jarvis_turn_completions": ("histogram", "Model calls per agent turn, by source.", COUNT_BUCKETS),
+    "jarvis_llm_seconds": ("histogram", "Chat completion latency, by source.", SECONDS_BUCKETS),
+    "jarvis_llm_tokens_total": ("counter", "Tokens used by chat completions, by source and type (prompt, "
+                                "cached: prompt tokens served from the provider's prompt cache, completion).", None),
+    "jarvis_tool_seconds": ("histogram", "Tool call wall time, by tool and status.", SECONDS_BUCKETS),
+    "jarvis_tool_result_bytes": ("histogram", "Size of the tool result sent to the model, by tool.", BYTES_BUCKETS),
+    "jarvis_tool_errors_total": ("counter", "Tool calls that returned an error, by tool.", None),
+    "jarvis_google_request_seconds": ("histogram", "Google API request time including retries, by api, "
+                                      "endpoint and status.", SECONDS_BUCKETS),
+    "jarvis_google_retries_total": ("counter", "Retried Google API attempts, by api and endpoint.", None),
+}
+
+def _labels_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(parts))
+
+def _flatten(name: str, value: Any, samples: List[Tuple[str, str, float]]):
+    """(metric name, labels, value) gauges for the numbers and strings in a nested stats dict."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(_metric_name(name, str(key)), item, samples)
+    elif isinstance(value, (bool, int, float)):
+        samples.append((name, "", float(value)))
+    elif isinstance(value, str):
+        # States like a circuit's "open" become a labelled 1.
+        samples.append((name, _format_labels((("state", value),)), 1.0))
+
+def _collector_gauges(stats: Dict[str, Dict[str, Any]]) -> str:
+    """Collector stats in the Prometheus text format, one gauge per number."""
+    lines = []
+    for collector, values in stats.items():
+        samples = []
+        _flatten(_metric_name("jarvis", collector), values, samples)
+        typed = set()
+        for name, labels, value in samples:
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{labels} {_format_number(value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class MetricsRegistry:
+    """Counters and cumulative histograms keyed by metric name and label set."""
+
+    def __init__(self, metrics: Optional[Dict[str, tuple]] = None):
+        self.metrics = metrics or METRICS
+        self._lock = threading.Lock()
+        # name -> labels key -> value (counter) or {"buckets", "sum", "count"} (histogram)
+        self._series: Dict[str, Dict[tuple, Any]] = {name: {} for name in self.metrics}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self.metrics[name][2]
+        key = _labels_key(labels)
+        with self._lock:
+            entry = self._series[name].get(key)
+            if entry is None:
+                entry = self._series[name][key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def reset(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+    def _copy(self) -> Dict[str, Dict[tuple, Any]]:
+        with self._lock:
+            return {name: {key: (dict(value, buckets=list(value["buckets"])) if isinstance(value, dict) else value)
+                           for key, value in series.items()}
+                    for name, series in self._series.items()}
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, series in self._copy().items():
+            kind, help_text, buckets = self.metrics[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value["buckets"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_number(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Per metric, one entry per label set: the counter value, or count, sum, mean and estimated p50/p95."""
+        result = {}
+        for name, series in self._copy().items():
+            kind, _, buckets = self.metrics[name]
+            entries = []
+            for labels, value in sorted(series.items()):
+                entry = {"labels": dict(labels)}
+                if kind == "counter":
+                    entry["value"] = value
+                else:
+                    entry.update(count=value["count"], sum=value["sum"], mean=value["sum"] / value["count"],
+                                 p50=_bucket_quantile(buckets, value, 0.5),
+                                 p95=_bucket_quantile(buckets, value, 0.95),
+                                 buckets=dict(zip((str(b) for b in buckets), value["buckets"])))
+                entries.append(entry)
+            if entries:
+                result[name] = entries
+        return result
+
+def _bucket_quantile(buckets: tuple, value: Dict[str, Any], fraction: float) -> Optional[float]:
+    """Upper bound of the bucket holding the quantile, like histogram_quantile() without interpolation."""
+    rank = value["count"] * fraction
+    cumulative = 0
+    for bound, count in zip(buckets, value["buckets"]):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return None  # beyond the largest bucket
+
+
+class Span:
+    """
+    One timed operation. Attributes are free-form; spans opened while
+    another is current become its children, and a span without a parent
+    is kept as a trace when it ends.
+    """
+
+    __slots__ = ("name", "attributes", "parent", "children", "start", "duration", "error", "_started", "_token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.children: List["Span"] = []
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def attribute(self, name: str, default: Any = None) -> Any:
+        """The attribute on this span or its nearest ancestor that has it."""
+        span = self
+        while span is not None:
+            if name in span.attributes:
+                return span.attributes[name]
+            span = span.parent
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {"name": self.name, "start": self.start, "duration": self.duration, **self.attributes}
+        if self.error:
+            result["error"] = self.error
+        if self.children:
+            result["children"] = [child.to_dict() for child in self.children]
+        return result
+
+
+class _NoSpan:
+    """Stand-in handed out while telemetry is off."""
+
+    __slots__ = ()
+    name = None
+    parent = None
+
+    def set(self, **attributes):
+        pass
+
+    def attribute(self, name: str, default: Any = None) -> Any:
+        return default
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+_current: contextvars.ContextVar = contextvars.ContextVar("jarvis_span", default=None)
+
+
+class _SpanContext:
+    __slots__ = ("telemetry", "span")
+
+    def __init__(self, telemetry: "Telemetry", span: Span):
+        self.telemetry = telemetry
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.span._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.duration = time.perf_counter() - span._started
+        if exc is not None and span.error is None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(span._token)
+        self.telemetry._finished(span)
+        return False
+
+
+class Telemetry:
+    """Process-wide spans, recent traces and metrics."""
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, max_traces: int = MAX_TRACES):
+        self.enabled = enabled
+        self.metrics = MetricsRegistry()
+        self.traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        # name -> callable returning a stats dict
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def span(self, name: str, **attributes):
+        """Context manager timing a block as a span; yields the Span so attributes can be added."""
+        if not self.enabled:
+            return _NO_SPAN
+        parent = _current.get()
+        span = Span(name, attributes, parent)
+        if parent is not None and len(parent.children) < MAX_CHILDREN:
+            parent.children.append(span)
+        return _SpanContext(self, span)
+
+    def _finished(self, span: Span):
+        self._observe(span)
+        if span.parent is None and span.name in TRACE_ROOTS:
+            with self._lock:
+                self.traces.append(span)
+
+    def _observe(self, span: Span):
+        """Fold a finished span into the metrics."""
+        attributes = span.attributes
+        source = span.attribute("source", "other")
+        if span.name == "turn":
+            self.metrics.observe("jarvis_turn_seconds", span.duration, source=source)
+            self.metrics.observe("jarvis_turn_completions", attributes.get("completions", 0), source=source)
+        elif span.name == "llm":
+            self.metrics.observe("jarvis_llm_seconds", span.duration, source=source)
+            for kind in ("prompt", "cached", "completion"):
+                tokens = attributes.get(f"{kind}_tokens")
+                if tokens:
+                    self.metrics.inc("jarvis_llm_tokens_total", tokens, source=source, type=kind)
+        elif span.name == "tool":
+            failed = span.error is not None or "error" in attributes
+            self.metrics.observe("jarvis_tool_seconds", span.duration, tool=attributes["tool"],
+                                 status="error" if failed else "ok")
+            if failed:
+                self.metrics.inc("jarvis_tool_errors_total", tool=attributes["tool"])
+        elif span.name == "google":
+            labels = {"api": attributes["api"], "endpoint": attributes.get("endpoint") or attributes["api"]}
+            self.metrics.observe("jarvis_google_request_seconds", span.duration,
+                                 status=attributes.get("status", "error"), **labels)
+            if attributes.get("retries"):
+                self.metrics.inc("jarvis_google_retries_total", attributes["retries"], **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a histogram value that is not a span duration."""
+        if self.enabled:
+            self.metrics.observe(name, value, **labels)
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, Any]]):
+        """
+        Export the stats dict returned by `collect()` on every scrape: as
+        jarvis_<name>_* gauges on /metrics and under "stats" in dump().
+        Adding a collector under an existing name replaces it.
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Current stats of every collector; a failing collector reports its error."""
+        with self._lock:
+            collectors = dict(self._collectors)
+        stats = {}
+        for name, collect in sorted(collectors.items()):
+            try:
+                stats[name] = collect()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return stats
+
+    def prometheus(self) -> str:
+        """Span metrics and collector stats in the Prometheus text exposition format."""
+        return self.metrics.prometheus() + _collector_gauges(self.collect())
+
+    def current_span(self):
+        return _current.get() or _NO_SPAN
+
+    def reset(self):
+        self.metrics.reset()
+        with self._lock:
+            self.traces.clear()
+
+    def dump(self) -> Dict[str, Any]:
+        """Metric summaries, collector stats and the most recent traces, newest last."""
+        with self._lock:
+            traces = list(self.traces)
+        return {"timestamp": time.time(), "metrics": self.metrics.snapshot(), "stats": self.collect(),
+                "traces": [trace.to_dict() for trace in traces]}
+
+    def dump_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.dump(), f, indent=2, default=str)
+
+
+_telemetry = Telemetry()
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide telemetry."""
+    return _telemetry
+
+def span(name: str, **attributes):
+    """Open a span on the process-wide telemetry."""
+    return _telemetry.span(name, **attributes)
+
+
+class MetricsServer:
+    """Serves GET /metrics (Prometheus text format) and GET /metrics.json (dump()) on a daemon thread."""
+
+    def __init__(self, telemetry: Optional[Telemetry] = None, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.telemetry = telemetry or get_telemetry()
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _handler(self):
+        telemetry = self.telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    self._reply(200, telemetry.prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+                elif path == "/metrics.json":
+                    self._reply(200, json.dumps(telemetry.dump(), default=str), "application/json")
+                else:
+                    self._reply(404, "not found\n", "text/plain")
+
+            def _reply(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> int:
+        """Start serving; returns the bound port."""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,74 @@
+"""
+Terminal
+Single owner of stdin, so user input and confirmation prompts never
+compete for the same line.
+"""
+
+import asyncio
+import queue
+import sys
+import threading
+from typing import Optional
+
+# How often a waiting reader re-checks whether the terminal was closed.
+POLL_SECONDS = 0.2
+
+class Terminal:
+    """
+    Serializes prompts on the terminal.
+
+    Until start() is called, ask() is a plain input() call. After start(), a
+    daemon thread reads stdin line by line and ask() hands out those lines,
+    which lets the asyncio runtime wait for input without blocking the event
+    loop or keeping the process alive on shutdown.
+    """
+
+    def __init__(self):
+        self._prompt_lock = threading.Lock()
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._reader: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def start(self):
+        """Start reading stdin on a background thread."""
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_lines, name="stdin-reader", daemon=True)
+            self._reader.start()
+
+    def _read_lines(self):
+        for line in sys.stdin:
+            self._lines.put(line.rstrip("\n"))
+        # EOF: wake up whoever is waiting.
+        self._lines.put(None)
+
+    def close(self):
+        """Release any thread waiting in ask()."""
+        self._closed.set()
+
+    def ask(self, prompt: str) -> str:
+        """Print `prompt` and return the next line typed. Raises EOFError when input ends."""
+        with self._prompt_lock:
+            if self._reader is None:
+                return input(prompt)
+            print(prompt, end="", flush=True)
+            while not self._closed.is_set():
+                try:
+                    line = self._lines.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    self._lines.put(None)
+                    raise EOFError
+                return line
+            raise EOFError
+
+    async def aask(self, prompt: str) -> str:
+        """ask() for coroutines; the wait happens off the event loop."""
+        return await asyncio.to_thread(self.ask, prompt)
+
+
+_terminal = Terminal()
+
+def get_terminal() -> Terminal:
+    """Return the process-wide terminal."""
+    return _terminal
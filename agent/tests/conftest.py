@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+# SystemConfig warns when no key is set; the fakes never use it.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from bench.scenarios import BenchEnvironment
+from tool_cache import get_tool_cache
+from tools import event_cache
+from tools.event_cache import EventStore
+from tools.request_governor import get_governor
+
+
+@pytest.fixture
+def env(monkeypatch):
+    """Fake Google APIs without latency, in a scratch working directory."""
+    governor = get_governor()
+    monkeypatch.setattr(governor, "backoff_base", 0.0)
+    for breaker in governor._breakers.values():
+        breaker.success()
+    # Process-wide caches must not carry state from another test's fakes.
+    monkeypatch.setattr(event_cache, "_store", EventStore())
+    get_tool_cache().clear()
+    with BenchEnvironment(google_latency=0, llm_latency=0) as environment:
+        yield environment
+
+
+@pytest.fixture
+def processor(env):
+    from conversation_manager import ConversationManager
+    from email_processor import EmailProcessor
+    from system_config import SystemConfig
+    from tool_executor import ToolExecutor
+
+    email_processor = EmailProcessor(ConversationManager(SystemConfig()), ToolExecutor(require_confirmation=False))
+    yield email_processor
+    email_processor.queue.close()
+    email_processor.ledger.close()
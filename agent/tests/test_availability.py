@@ -0,0 +1,47 @@
+from tools.availability_tools import find_free_slots
+
+# Friday 4 and Sunday 6 January 2030; Cairo is at +02:00 in winter.
+FRIDAY = "2030-01-04"
+SUNDAY = "2030-01-06"
+
+
+def _at(day, clock):
+    return f"{day}T{clock}:00+02:00"
+
+
+def _starts(result):
+    return [slot["start"][11:16] for slot in result["slots"]]
+
+
+def test_slots_stay_on_the_grid(env):
+    result = find_free_slots(50, time_min=_at(SUNDAY, "09:00"), time_max=_at(SUNDAY, "18:00"))
+    assert _starts(result) == ["09:00", "10:00", "11:00"]
+    assert result["slots"][0]["end"] == _at(SUNDAY, "09:50")
+
+
+def test_gap_start_is_rounded_up(env):
+    env.http.calendar.add_event("Standup", _at(SUNDAY, "09:00"), _at(SUNDAY, "09:10"))
+    assert _starts(find_free_slots(30, time_min=_at(SUNDAY, "09:00"), count=2)) == ["09:15", "09:45"]
+
+
+def test_gap_exactly_as_long_as_the_meeting(env):
+    env.http.calendar.add_event("Morning", _at(SUNDAY, "09:00"), _at(SUNDAY, "10:00"))
+    env.http.calendar.add_event("Rest of the day", _at(SUNDAY, "10:30"), _at(SUNDAY, "18:00"))
+    result = find_free_slots(30, time_min=_at(SUNDAY, "09:00"), count=2)
+    assert [slot["start"] for slot in result["slots"]] == [_at(SUNDAY, "10:00"), _at("2030-01-07", "09:00")]
+
+
+def test_weekend_is_skipped_unless_asked(env):
+    assert find_free_slots(30, time_min=_at(FRIDAY, "09:00"), count=1)["slots"][0]["start"] == _at(SUNDAY, "09:00")
+    with_weekends = find_free_slots(30, time_min=_at(FRIDAY, "09:00"), count=1, include_weekends=True)
+    assert with_weekends["slots"][0]["start"] == _at(FRIDAY, "09:00")
+
+
+def test_time_max_cuts_the_search(env):
+    result = find_free_slots(60, time_min=_at(SUNDAY, "16:20"), time_max=_at(SUNDAY, "18:00"))
+    assert _starts(result) == ["16:30"]
+
+
+def test_invalid_arguments():
+    assert "error" in find_free_slots(0)
+    assert "error" in find_free_slots(30, working_hours_start=18, working_hours_end=9)
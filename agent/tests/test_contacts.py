@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from email_classifier import EmailClassifier, AGENT
+from tools.contacts_tools import ContactIndex
+
+
+def _write(path, contacts):
+    with open(path, "w") as f:
+        json.dump({"contacts": contacts}, f)
+    # The index notices changes by mtime and size; make sure the mtime moves.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def contacts_file(tmp_path):
+    path = str(tmp_path / "contacts.json")
+    _write(path, [{"name": "Ahmed Shehata", "email": "ahmed@example.com"},
+                  {"name": "Mona Ali", "email": "mona.ali@example.com"}])
+    return path
+
+
+def test_resolve_exact_prefix_and_fuzzy(contacts_file):
+    index = ContactIndex(contacts_file)
+    assert index.resolve("ahmed shehata")[0]["match"] == "exact"
+    assert [(m["email"], m["match"]) for m in index.resolve("mon")] == [("mona.ali@example.com", "prefix")]
+    assert [(m["email"], m["match"]) for m in index.resolve("Ahmed Shehatta")] == [("ahmed@example.com", "fuzzy")]
+    assert index.resolve("zzz") == []
+
+
+def test_file_changes_are_picked_up(contacts_file):
+    index = ContactIndex(contacts_file, reload_check_seconds=0)
+    assert not index.is_contact("sara@example.com")
+    _write(contacts_file, [{"name": "Sara", "email": "Sara@Example.com"}])
+    assert index.is_contact("sara@example.com")
+    assert not index.is_contact("ahmed@example.com")
+
+
+def test_classifier_uses_the_current_contacts(contacts_file):
+    index = ContactIndex(contacts_file, reload_check_seconds=0)
+    classifier = EmailClassifier(index)
+    email = {"from": "Sara <sara@example.com>", "subject": "Lunch", "body": "Hi David"}
+    assert classifier.classify(email)["known_sender"] is False
+    _write(contacts_file, [{"name": "Sara", "email": "sara@example.com"}])
+    decision = classifier.classify(email)
+    assert decision["known_sender"] is True
+    assert decision["action"] == AGENT
@@ -0,0 +1,66 @@
+from context_window import SUMMARY_PREFIX, ContextWindow
+
+SYSTEM = {"role": "system", "content": "You are Jarvis."}
+FILLER = " lorem ipsum dolor sit amet" * 60
+
+
+def _turn(n, tool=False):
+    turn = [{"role": "user", "content": f"request {n}{FILLER}"}]
+    if tool:
+        turn.append({"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call{n}", "type": "function", "function": {"name": "list_events", "arguments": "{}"}}]})
+        turn.append({"role": "tool", "tool_call_id": f"call{n}", "name": "list_events", "content": f"[]{FILLER}"})
+    turn.append({"role": "assistant", "content": f"answer {n}"})
+    return turn
+
+
+def _conversation(turns, tool=False):
+    return [SYSTEM] + [m for n in range(turns) for m in _turn(n, tool)]
+
+
+def test_messages_within_budget_are_untouched():
+    window = ContextWindow(max_tokens=100_000)
+    messages = _conversation(3)
+    before = list(messages)
+    window.fit(messages)
+    assert messages == before
+    assert window.stats["evicted_turns"] == 0
+
+
+def test_oldest_turns_are_evicted_whole_and_summarized():
+    window = ContextWindow(max_tokens=1500)
+    messages = _conversation(8, tool=True)
+    total = window.fit(messages)
+
+    assert total <= 1500
+    assert messages[0] is SYSTEM
+    summary = messages[1]
+    assert summary["role"] == "system" and summary["content"].startswith(SUMMARY_PREFIX)
+    assert "- Asked: request 0" in summary["content"]
+    assert "Tools: list_events" in summary["content"]
+    # What is left starts with a user message, so no tool result lost its call.
+    assert messages[2]["role"] == "user"
+    assert messages[-1]["content"] == "answer 7"
+    assert window.stats["evicted_turns"] > 0
+
+
+def test_summary_stays_pinned_and_accumulates():
+    window = ContextWindow(max_tokens=1500)
+    messages = _conversation(8)
+    window.fit(messages)
+    evicted = window.stats["evicted_turns"]
+    messages.extend(_turn(8) + _turn(9))
+    window.fit(messages)
+
+    summaries = [m for m in messages if m["content"] and m["content"].startswith(SUMMARY_PREFIX)]
+    assert len(summaries) == 1 and messages[1] is summaries[0]
+    assert "request 0" in summaries[0]["content"]
+    assert f"request {window.stats['evicted_turns'] - 1}" in summaries[0]["content"]
+    assert window.stats["evicted_turns"] > evicted
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    window = ContextWindow(max_tokens=300, summarizer=None)
+    messages = [SYSTEM] + _turn(0) + _turn(1)
+    window.fit(messages)
+    assert messages == [SYSTEM] + _turn(1)
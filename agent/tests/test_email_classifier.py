@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from email_classifier import AGENT, DROP, NOTIFY, EmailClassifier
+from tools.contacts_tools import ContactIndex
+
+CONTACT = "Mona Ali <mona@example.com>"
+STRANGER = "Sam <sam@example.com>"
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    path = tmp_path / "contacts.json"
+    path.write_text(json.dumps({"contacts": [{"name": "Mona Ali", "email": "mona@example.com"}]}))
+    return EmailClassifier(ContactIndex(str(path)))
+
+
+def _email(sender=STRANGER, subject="Hello", body="Just saying hi.", **headers):
+    return {"from": sender, "subject": subject, "body": body, **headers}
+
+
+@pytest.mark.parametrize("email, rule", [
+    (_email(list_unsubscribe="<mailto:unsubscribe@example.com>"), "mailing_list"),
+    (_email(precedence="Bulk"), "bulk_precedence"),
+    (_email(auto_submitted="auto-replied"), "auto_submitted"),
+    (_email(sender="GitHub <noreply@github.com>"), "no_reply_sender"),
+    (_email(labels=["INBOX", "CATEGORY_PROMOTIONS"]), "category_label"),
+])
+def test_bulk_mail_from_strangers_is_dropped(classifier, email, rule):
+    assert classifier.classify(email) == {"action": DROP, "rule": rule, "intent": None, "known_sender": False}
+
+
+def test_contacts_are_never_treated_as_bulk(classifier):
+    decision = classifier.classify(_email(sender=CONTACT, list_unsubscribe="<mailto:u@example.com>"))
+    assert (decision["action"], decision["rule"]) == (AGENT, "known_sender")
+
+
+@pytest.mark.parametrize("subject, body, intent", [
+    ("Tomorrow", "Sorry, I can't make it to the meeting.", "cancel"),
+    ("Our sync", "Could we reschedule to Monday?", "reschedule"),
+    ("Re: Thursday", "Works for me, see you then.", "confirm"),
+    ("Coffee?", "Are you available to catch up next week?", "meeting_request"),
+    ("Photos", "Here are the photos from the trip.", None),
+])
+def test_intents(classifier, subject, body, intent):
+    assert classifier.intent(_email(subject=subject, body=body)) == intent
+
+
+def test_actions_follow_intent_and_sender(classifier):
+    assert classifier.classify(_email(body="Can we meet on Sunday?"))["action"] == AGENT
+    assert classifier.classify(_email(body="Confirmed, see you there."))["action"] == NOTIFY
+    assert classifier.classify(_email(sender=CONTACT, body="Confirmed, see you there."))["action"] == NOTIFY
+    assert classifier.classify(_email(sender=CONTACT))["action"] == AGENT
+    assert classifier.classify(_email())["rule"] == "unknown_sender"
+
+    stats = classifier.get_stats()
+    assert stats["total"] == 5
+    assert stats["actions"][AGENT]["count"] == 2
+    assert stats["rules"]["intent:confirm"]["count"] == 2
+
+
+def test_unknown_sender_action_is_configurable(tmp_path):
+    classifier = EmailClassifier(ContactIndex(str(tmp_path / "missing.json")), unknown_sender_action=DROP)
+    assert classifier.classify(_email())["action"] == DROP
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import email_queue
+from fakes.openai_client import FakeAsyncOpenAI, ScriptedResponder
+from poll_scheduler import AdaptivePollScheduler
+
+CONTACT = "Ahmed Shehata <ahmedshehata20047@gmail.com>"
+
+
+def _sync(processor):
+    emails, history_id = processor.collect_new_emails()
+    processor.enqueue_emails(emails)
+    processor.commit_sync(history_id)
+    return [email["id"] for email in emails]
+
+
+async def _drain(processor):
+    """What the pipeline's email workers do, until nothing is due."""
+    while True:
+        items = await asyncio.to_thread(processor.queue.lease, 4)
+        if not items:
+            return
+        await asyncio.gather(*(processor.ahandle(item) for item in items))
+        await processor.aflush_read_marks()
+
+
+def test_handled_emails_are_marked_as_read_together(env, processor):
+    _sync(processor)
+    message_ids = [env.http.gmail.add_message("someone@example.com", f"Re: Thursday {i}", "Works for me, see you then.")
+                   for i in range(3)]
+    _sync(processor)
+
+    env.http.request_log.clear()
+    asyncio.run(_drain(processor))
+    assert [path for _, path in env.http.request_log if path.endswith("batchModify")] == [
+        "/gmail/v1/users/me/messages/batchModify"]
+    assert all("UNREAD" not in env.http.gmail.messages[m]["labelIds"] for m in message_ids)
+    assert processor.queue.depth() == {"done": 3}
+
+
+def test_failed_mark_as_read_is_retried(env, processor, monkeypatch):
+    monkeypatch.setattr(email_queue, "RETRY_BASE_SECONDS", 0.0)
+    _sync(processor)
+    # A confirmation from an unknown sender is only reported, so no model call is needed.
+    message_id = env.http.gmail.add_message("someone@example.com", "Re: Thursday", "Works for me, see you then.")
+    _sync(processor)
+
+    env.http.fail("batchModify", status=400)
+    # Without a retry delay the queue hands the item straight back.
+    asyncio.run(_drain(processor))
+    assert processor.queue.get_stats()["retried"] == 1
+    # The retry skipped the model (the ledger had it as done) and only marked it as read.
+    assert processor.ledger.get_stats()["skipped_completions"] == 1
+    assert processor.ledger.get(message_id)["state"] == "done"
+    assert "UNREAD" not in env.http.gmail.messages[message_id]["labelIds"]
+    assert processor.queue.depth() == {"done": 1}
+
+
+def test_busy_item_is_left_leased(env, processor):
+    _sync(processor)
+    message_id = env.http.gmail.add_message("someone@example.com", "Re: Thursday", "Works for me, see you then.")
+    _sync(processor)
+    # Another worker holds the claim.
+    processor.ledger.begin(message_id)
+    asyncio.run(_drain(processor))
+    assert processor.queue.depth() == {"leased": 1}
+    assert "UNREAD" in env.http.gmail.messages[message_id]["labelIds"]
+
+
+@pytest.fixture
+def assistant(env):
+    from main import JarvisAssistant
+
+    responder = ScriptedResponder([
+        ("subject: lunch", [{"content": "Told David about the lunch invitation."}]),
+    ])
+    jarvis = JarvisAssistant(stream=False, async_client=FakeAsyncOpenAI(responder))
+    jarvis.email_processor.poll_scheduler = AdaptivePollScheduler(min_interval=0.05, max_interval=0.1, jitter=0)
+    yield jarvis
+    jarvis.email_processor.queue.close()
+    jarvis.email_processor.ledger.close()
+
+
+def test_pipeline_processes_polled_email(env, assistant):
+    processor = assistant.email_processor
+
+    async def run():
+        background, receiver = assistant._start_pipeline(webhook_interval=0.05, workers=2)
+        try:
+            # The first sync only records where the mailbox is.
+            while processor._load_history_id() is None:
+                await asyncio.sleep(0.02)
+            message_id = env.http.gmail.add_message(CONTACT, "Lunch", "Are you free for lunch on Sunday?")
+            for _ in range(200):
+                if processor.queue.depth() == {"done": 1}:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await assistant._stop_pipeline(background, receiver)
+        return message_id
+
+    message_id = asyncio.run(run())
+    assert processor.queue.depth() == {"done": 1}
+    assert processor.ledger.get(message_id)["outcome"] == "Told David about the lunch invitation."
+    assert "UNREAD" not in env.http.gmail.messages[message_id]["labelIds"]
+    # The session's summary waits for the next turn of the main conversation.
+    assert any("Lunch" in note for note in assistant.conversation_manager._pending_notes)
+
+
+def test_intake_pauses_while_the_queue_is_full(env, assistant, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "EMAIL_QUEUE_SIZE", 1)
+    processor = assistant.email_processor
+    processor.enqueue_emails([{"id": "backlog", "from": "a@example.com", "subject": "Hi", "body": "Hello"}])
+
+    async def run():
+        # No workers: the queue stays full.
+        background, receiver = assistant._start_pipeline(webhook_interval=0.05, workers=0)
+        try:
+            await asyncio.sleep(0.5)
+        finally:
+            await assistant._stop_pipeline(background, receiver)
+
+    asyncio.run(run())
+    # The poller asked for syncs, but none got as far as reading the mailbox.
+    assert processor._load_history_id() is None
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import email_queue
+from email_queue import EmailQueue, message_key
+
+
+def _email(message_id):
+    return {"id": message_id, "from": "a@example.com", "subject": "Hi", "body": "Hello"}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = EmailQueue(str(tmp_path / "queue.db"))
+    yield q
+    q.close()
+
+
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue_many([_email("m1"), _email("m2"), _email("m1")]) == 2
+    assert queue.enqueue(_email("m2")) is False
+    assert queue.depth() == {"ready": 2}
+
+
+def test_message_key_hashes_emails_without_id():
+    email = {"from": "a@example.com", "subject": "Hi", "body": "Hello"}
+    assert message_key(email) == message_key(dict(email))
+    assert message_key(email).startswith("sha1:")
+    assert message_key(_email("m1")) == "m1"
+
+
+def test_lease_and_ack(queue):
+    queue.enqueue(_email("m1"), source="webhook")
+    items = queue.lease(5)
+    assert [(i["message_id"], i["source"], i["attempts"]) for i in items] == [("m1", "webhook", 1)]
+    assert queue.lease(5) == []
+    queue.ack("m1")
+    assert queue.depth() == {"done": 1}
+    # Handled messages are still recognized as duplicates.
+    assert queue.enqueue(_email("m1")) is False
+
+
+def test_nack_retries_then_parks_as_dead(tmp_path, monkeypatch):
+    monkeypatch.setattr(email_queue, "RETRY_BASE_SECONDS", 0.0)
+    queue = EmailQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.enqueue(_email("m1"))
+    queue.lease()
+    queue.nack("m1", "boom")
+    assert queue.depth() == {"ready": 1}
+    assert queue.lease()[0]["attempts"] == 2
+    queue.nack("m1", "boom again")
+    assert queue.depth() == {"dead": 1}
+    queue.close()
+
+
+def test_expired_lease_is_handed_out_again(tmp_path):
+    queue = EmailQueue(str(tmp_path / "queue.db"), lease_seconds=0.05)
+    queue.enqueue(_email("m1"))
+    assert queue.lease()
+    assert queue.lease() == []
+    time.sleep(0.1)
+    assert [i["message_id"] for i in queue.lease()] == ["m1"]
+    assert queue.get_stats()["expired_leases"] == 1
+    queue.close()
+
+
+def test_pending_counts_unhandled_items(queue):
+    queue.enqueue_many([_email("m1"), _email("m2"), _email("m3")])
+    first, second = queue.lease(2)
+    queue.ack(first["message_id"])
+    assert queue.pending() == 2
+    queue.nack(second["message_id"], "boom")
+    # Waiting for a retry still counts.
+    assert queue.pending() == 2
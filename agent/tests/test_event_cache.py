@@ -0,0 +1,16 @@
+from tools.event_cache import EventStore
+
+
+def test_window_moves_after_a_day(env):
+    store = EventStore()
+    store.refresh()
+    start, end = store._window
+    store.refresh(force=True)
+    assert (store.stats["full_syncs"], store.stats["incremental_syncs"]) == (1, 1)
+
+    # As if the full sync had run two days ago.
+    two_days = 2 * 24 * 3600
+    store._window = (start - two_days, end - two_days)
+    store.refresh(force=True)
+    assert store.stats["full_syncs"] == 2
+    assert store._window[0] >= start
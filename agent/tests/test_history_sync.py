@@ -0,0 +1,37 @@
+def _sync(processor):
+    emails, history_id = processor.collect_new_emails()
+    processor.commit_sync(history_id)
+    return [email["id"] for email in emails], history_id
+
+
+def test_incremental_sync_returns_new_messages(env, processor):
+    _sync(processor)
+    message_id = env.http.gmail.add_message("a@example.com", "Hi", "Hello")
+    assert _sync(processor) == ([message_id], processor._load_history_id())
+    # Nothing new: the history is not walked again for the same messages.
+    assert _sync(processor)[0] == []
+
+
+def test_failed_fetch_keeps_the_sync_point(env, processor):
+    _sync(processor)
+    start = processor._load_history_id()
+    message_id = env.http.gmail.add_message("a@example.com", "Hi", "Hello")
+    env.http.fail(f"/messages/{message_id}", status=400)
+
+    assert _sync(processor) == ([], None)
+    assert processor._load_history_id() == start
+    assert processor.sync_stats["failed_fetches"] == 1
+
+    # The next poll picks the message up from the same historyId.
+    ids, history_id = _sync(processor)
+    assert ids == [message_id]
+    assert history_id != start
+
+
+def test_deleted_message_does_not_hold_the_sync_point(env, processor):
+    _sync(processor)
+    message_id = env.http.gmail.add_message("a@example.com", "Hi", "Hello")
+    env.http.fail(f"/messages/{message_id}", status=404)
+    ids, history_id = _sync(processor)
+    assert ids == []
+    assert history_id is not None
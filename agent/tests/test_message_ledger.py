@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from message_ledger import MessageLedger, STARTED, DONE, BUSY
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    l = MessageLedger(str(tmp_path / "ledger.db"), claim_seconds=60)
+    yield l
+    l.close()
+
+
+def test_ledger_unseen_keeps_order(ledger):
+    ledger.record_queued(["m2"])
+    assert ledger.unseen(["m3", "m2", "m1"]) == ["m3", "m1"]
+
+
+def test_ledger_begin_refuses_live_claim(ledger):
+    assert ledger.begin("m1") == STARTED
+    assert ledger.begin("m1") == BUSY
+    ledger.finish("m1", "done it")
+    assert ledger.begin("m1") == DONE
+    assert ledger.get("m1")["outcome"] == "done it"
+
+
+def test_ledger_stale_claim_can_be_taken_over(tmp_path):
+    ledger = MessageLedger(str(tmp_path / "ledger.db"), claim_seconds=0.05)
+    assert ledger.begin("m1") == STARTED
+    time.sleep(0.1)
+    assert ledger.begin("m1") == STARTED
+    assert ledger.get("m1")["attempts"] == 2
+    assert ledger.get_stats()["takeovers"] == 1
+    ledger.close()
+
+
+def test_ledger_failed_message_can_be_retried(ledger):
+    ledger.begin("m1")
+    ledger.fail("m1", "timeout")
+    assert ledger.begin("m1") == STARTED
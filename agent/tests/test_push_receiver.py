@@ -0,0 +1,75 @@
+import base64
+import http.client
+import json
+import threading
+
+import pytest
+
+from push_receiver import MAX_BODY_BYTES, PushReceiver
+
+
+def _envelope(history_id):
+    data = base64.b64encode(json.dumps({"emailAddress": "david@example.com", "historyId": history_id}).encode())
+    return json.dumps({"message": {"data": data.decode(), "messageId": "1"}}).encode()
+
+
+@pytest.fixture
+def receiver():
+    notified = []
+    received = threading.Event()
+
+    def on_notification(history_id):
+        notified.append(history_id)
+        received.set()
+
+    push = PushReceiver(on_notification, host="127.0.0.1", port=0, token="secret")
+    push.notified, push.received = notified, received
+    push.start()
+    yield push
+    push.stop()
+
+
+def _post(receiver, path, body=b"", headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", receiver.port, timeout=5)
+    try:
+        if headers is None:
+            connection.request("POST", path, body=body)
+        else:
+            # Only the given headers, e.g. without Content-Length.
+            connection.putrequest("POST", path, skip_accept_encoding=True)
+            for name, value in headers.items():
+                connection.putheader(name, value)
+            connection.endheaders(body)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_valid_notification_is_passed_on(receiver):
+    assert _post(receiver, "/gmail/push?token=secret", _envelope(1234)) == 204
+    # The callback runs after the reply.
+    assert receiver.received.wait(5)
+    assert receiver.notified == ["1234"]
+    assert receiver.get_stats()["latest_history_id"] == "1234"
+
+
+def test_wrong_token_is_rejected(receiver):
+    assert _post(receiver, "/gmail/push?token=guess", _envelope(1)) == 403
+    assert _post(receiver, "/gmail/push", _envelope(1)) == 403
+    assert receiver.notified == []
+    assert receiver.get_stats()["rejected"] == 2
+
+
+def test_body_length_is_checked(receiver):
+    assert _post(receiver, "/gmail/push?token=secret", headers={}) == 400
+    assert _post(receiver, "/gmail/push?token=secret", headers={"Content-Length": str(MAX_BODY_BYTES + 1)}) == 413
+    assert receiver.notified == []
+    assert receiver.get_stats()["malformed"] == 2
+
+
+def test_malformed_notification_is_acknowledged(receiver):
+    # Pub/Sub would only redeliver it.
+    assert _post(receiver, "/gmail/push?token=secret", b'{"message": {}}') == 204
+    assert _post(receiver, "/elsewhere?token=secret", _envelope(1)) == 404
+    assert receiver.notified == []
+    assert receiver.get_stats()["malformed"] == 1
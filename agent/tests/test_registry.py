@@ -0,0 +1,42 @@
+from tools.registry import _validate, get_tool_registry
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "duration_minutes": {"type": "integer"},
+        "send_updates": {"type": "string", "enum": ["all", "none"]},
+        "guests": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary"],
+}
+
+
+def test_valid_arguments_have_no_problems():
+    arguments = {"summary": "Sync", "duration_minutes": 30, "send_updates": "all", "guests": ["a@example.com"]}
+    assert _validate(arguments, SCHEMA, "arguments") == []
+
+
+def test_problems_are_reported_by_path():
+    problems = _validate({"duration_minutes": "30", "send_updates": "some", "guests": ["a@example.com", 5],
+                          "colour": "red"}, SCHEMA, "arguments")
+    assert problems == [
+        "missing required arguments.summary",
+        "arguments.duration_minutes must be of type integer",
+        "arguments.send_updates must be one of ['all', 'none']",
+        "arguments.guests[1] must be of type string",
+        "unknown arguments.colour",
+    ]
+
+
+def test_booleans_are_not_numbers():
+    assert _validate(True, {"type": "integer"}, "count") == ["count must be of type integer"]
+    assert _validate(1.5, {"type": "number"}, "ratio") == []
+
+
+def test_registered_schemas_reject_malformed_calls():
+    spec = get_tool_registry().get("create_event")
+    assert spec.validate({"summary": "Sync", "start": "2030-01-06T09:00:00+02:00",
+                          "end": "2030-01-06T10:00:00+02:00"}) == []
+    assert spec.validate({"summary": "Sync", "start": 9}) == [
+        "missing required arguments.end", "arguments.start must be of type string"]
@@ -0,0 +1,112 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from tools.mail_tools import mark_emails_as_read, send_email
+from tools.request_governor import CircuitOpenError, RequestGovernor
+
+
+def _calls(env, path):
+    return sum(1 for _, logged in env.http.request_log if logged.endswith(path))
+
+
+def _failing(times, error=ConnectionError):
+    """A call that raises `error` `times` times, then returns "ok"."""
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) <= times:
+            raise error("connection reset")
+        return "ok"
+
+    call.attempts = attempts
+    return call
+
+
+def test_idempotent_request_is_retried(env):
+    message_id = env.http.gmail.add_message("a@example.com", "Hi", "Hello")
+    env.http.fail("batchModify", status=503, times=2)
+    mark_emails_as_read([message_id])
+    assert _calls(env, "/batchModify") == 3
+    assert "UNREAD" not in env.http.gmail.messages[message_id]["labelIds"]
+
+
+def test_send_is_not_repeated_after_a_server_error(env):
+    env.http.fail("/messages/send", status=503)
+    with pytest.raises(HttpError):
+        send_email("a@example.com", "Hi", "Hello")
+    assert _calls(env, "/messages/send") == 1
+
+
+def test_rate_limited_send_is_retried(env):
+    env.http.fail("/messages/send", status=429)
+    assert send_email("a@example.com", "Hi", "Hello")["status"] == "sent"
+    assert _calls(env, "/messages/send") == 2
+
+
+def test_non_idempotent_call_is_not_retried():
+    governor = RequestGovernor(backoff_base=0.0)
+    call = _failing(1)
+    with pytest.raises(ConnectionError):
+        governor.execute("gmail", call, idempotent=False)
+    assert len(call.attempts) == 1
+    assert governor.get_stats()["gmail"]["retries"] == 0
+
+
+def test_retries_of_one_request_do_not_open_the_circuit():
+    governor = RequestGovernor(backoff_base=0.0, max_retries=4, failure_threshold=2)
+    assert governor.execute("gmail", _failing(4)) == "ok"
+    stats = governor.get_stats()["gmail"]
+    assert (stats["retries"], stats["circuit"]) == (4, "closed")
+
+
+def test_circuit_opens_per_failed_request_and_keeps_the_real_error():
+    governor = RequestGovernor(backoff_base=0.0, max_retries=1, failure_threshold=2)
+    for _ in range(2):
+        # The request that opens the circuit still reports what went wrong.
+        with pytest.raises(ConnectionError):
+            governor.execute("gmail", _failing(10))
+    call = _failing(0)
+    with pytest.raises(CircuitOpenError):
+        governor.execute("gmail", call)
+    assert call.attempts == []
+    stats = governor.get_stats()["gmail"]
+    assert (stats["failures"], stats["circuit_opens"], stats["rejected"]) == (2, 1, 1)
+
+
+def test_request_stops_retrying_once_the_circuit_opens():
+    governor = RequestGovernor(backoff_base=0.0, max_retries=4)
+    breaker = governor._breakers["gmail"]
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        # Meanwhile other requests open the circuit.
+        breaker.state = "open"
+        raise ConnectionError("connection reset")
+
+    with pytest.raises(ConnectionError):
+        governor.execute("gmail", call)
+    assert len(attempts) == 1
+
+
+def test_backoff_is_capped_and_honours_retry_after(monkeypatch):
+    from tools import request_governor
+    delays = []
+    monkeypatch.setattr(request_governor.time, "sleep", delays.append)
+    governor = RequestGovernor(backoff_base=1.0, backoff_max=2.0, max_retries=4)
+    assert governor.execute("gmail", _failing(4)) == "ok"
+    assert len(delays) == 4
+    assert all(0 <= delay <= cap for delay, cap in zip(delays, [1.0, 2.0, 2.0, 2.0]))
+
+    delays.clear()
+    error = HttpError(httplib2.Response({"status": 429, "retry-after": "7"}), b"{}")
+
+    def rate_limited():
+        if not delays:
+            raise error
+        return "ok"
+
+    assert governor.execute("gmail", rate_limited) == "ok"
+    assert delays == [7.0]
@@ -0,0 +1,40 @@
+import json
+import urllib.request
+
+from telemetry import MetricsServer, Telemetry
+
+
+def test_collectors_are_exported_as_gauges():
+    telemetry = Telemetry()
+    telemetry.add_collector("governor", lambda: {"gmail": {"retries": 2, "circuit": "open", "rate": 0.5}})
+    telemetry.add_collector("broken", lambda: 1 / 0)
+
+    text = telemetry.prometheus()
+    assert "# TYPE jarvis_governor_gmail_retries gauge" in text
+    assert "jarvis_governor_gmail_retries 2\n" in text
+    assert "jarvis_governor_gmail_rate 0.5\n" in text
+    assert 'jarvis_governor_gmail_circuit{state="open"} 1\n' in text
+    assert telemetry.dump()["stats"]["broken"] == {"error": "division by zero"}
+
+
+def test_metrics_endpoints_include_component_stats(env):
+    from main import JarvisAssistant
+
+    assistant = JarvisAssistant(stream=False)
+    server = MetricsServer(host="127.0.0.1", port=0)
+    port = server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            text = response.read().decode("utf-8")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json") as response:
+            stats = json.load(response)["stats"]
+    finally:
+        server.stop()
+        assistant.email_processor.queue.close()
+        assistant.email_processor.ledger.close()
+
+    assert "jarvis_email_queue_enqueued" in text
+    assert "jarvis_google_clients_requests_gmail_circuit" in text
+    for name in ("email_queue", "poll_scheduler", "email_classifier", "tool_cache", "event_store",
+                 "google_clients", "projection"):
+        assert name in stats
@@ -0,0 +1,71 @@
+import pytest
+
+from bench.scenarios import _tomorrow_at
+from tool_cache import MISS, ToolResultCache, cache_key
+
+
+@pytest.fixture
+def executors(env):
+    from tool_executor import ToolExecutor
+    return ToolExecutor(require_confirmation=False), ToolExecutor(require_confirmation=False)
+
+
+def _day():
+    return {"time_min": _tomorrow_at(0).isoformat(), "time_max": _tomorrow_at(23).isoformat()}
+
+
+def _lookups(executor, tool_name):
+    counters = executor.get_cache_stats()["tools"].get(tool_name, {})
+    return counters.get("hits", 0), counters.get("misses", 0)
+
+
+def _create(executor, hour):
+    return executor.execute_tool("create_event", {
+        "summary": f"Meeting at {hour}", "start": _tomorrow_at(hour).isoformat(), "end": _tomorrow_at(hour + 1).isoformat()})
+
+
+def test_executors_share_one_cache(executors):
+    interactive, email = executors
+    assert interactive.cache is email.cache
+
+
+def test_write_from_one_executor_invalidates_the_other(executors):
+    interactive, email = executors
+    assert interactive.execute_tool("list_events", _day()) == []
+    _create(email, 10)
+    assert [e["summary"] for e in interactive.execute_tool("list_events", _day())] == ["Meeting at 10"]
+
+
+def test_repeated_read_is_served_from_the_cache(executors):
+    interactive, _ = executors
+    hits, misses = _lookups(interactive, "list_events")
+    interactive.execute_tool("list_events", _day())
+    interactive.execute_tool("list_events", _day())
+    assert _lookups(interactive, "list_events") == (hits + 1, misses + 1)
+
+
+def test_free_slots_are_only_cached_with_an_explicit_start(executors):
+    interactive, email = executors
+    lookups = _lookups(interactive, "find_free_slots")
+    interactive.execute_tool("find_free_slots", {"duration_minutes": 30})
+    interactive.execute_tool("find_free_slots", {"duration_minutes": 30})
+    assert _lookups(interactive, "find_free_slots") == lookups
+
+    arguments = {"duration_minutes": 60, **_day()}
+    before = interactive.execute_tool("find_free_slots", arguments)
+    _create(email, 9)
+    after = interactive.execute_tool("find_free_slots", arguments)
+    assert before != after
+
+
+def test_invalidate_bumps_the_generation():
+    cache = ToolResultCache()
+    key = cache_key("list_events", {"time_min": "a"})
+    generation = cache.generation("list_events")
+    cache.put("list_events", key, ["event"], ttl=60, seconds=0.1, generation=generation)
+    assert cache.get("list_events", key) == ["event"]
+    cache.invalidate("list_events")
+    assert cache.get("list_events", key) is MISS
+    # A result computed before the invalidation must not be stored.
+    cache.put("list_events", key, ["stale"], ttl=60, seconds=0.1, generation=generation)
+    assert cache.get("list_events", key) is MISS
@@ -0,0 +1,119 @@
+"""
+Tool Cache
+Short-lived cache for the results of read-only tools, so repeated identical
+calls within and across agent turns skip the Google round trips.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from telemetry import get_telemetry
+
+# Set JARVIS_TOOL_CACHE=0 to run every tool call.
+CACHE_ENABLED = os.environ.get('JARVIS_TOOL_CACHE', '1') != '0'
+# Most results kept; the least recently used one is dropped first.
+MAX_ENTRIES = 256
+
+# Returned by get() when there is no fresh entry.
+MISS = object()
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Tool name plus its arguments in a canonical form."""
+    return f"{tool_name}:{json.dumps(arguments, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache of tool results.
+
+    Entries expire after the tool's TTL and are dropped least recently used
+    first beyond max_entries. invalidate() drops every entry of the given
+    tools and bumps their generation; a result computed before that (a read
+    racing a write) is then not stored.
+
+    Per tool it counts hits, misses, invalidations and the seconds hits saved
+    (the latency of the call that produced the cached result).
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (tool_name, expires_at, result, seconds)
+        self._entries: "OrderedDict[str, Tuple[str, float, Any, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def _tool_stats(self, tool_name: str) -> Dict[str, Any]:
+        return self.stats.setdefault(tool_name, {"hits": 0, "misses": 0, "expired": 0, "evicted": 0,
+                                                 "invalidated": 0, "saved_seconds": 0.0})
+
+    def get(self, tool_name: str, key: str) -> Any:
+        """The cached result for `key`, or MISS."""
+        with self._lock:
+            stats = self._tool_stats(tool_name)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                stats["expired"] += 1
+                entry = None
+            if entry is None:
+                stats["misses"] += 1
+                return MISS
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            stats["saved_seconds"] += entry[3]
+            return entry[2]
+
+    def generation(self, tool_name: str) -> int:
+        """Token to pass to put(); taken before running the tool."""
+        with self._lock:
+            return self._generations.get(tool_name, 0)
+
+    def put(self, tool_name: str, key: str, result: Any, ttl: float, seconds: float,
+            generation: Optional[int] = None):
+        """Store a result for `ttl` seconds, unless the tool was invalidated since `generation`."""
+        with self._lock:
+            if generation is not None and self._generations.get(tool_name, 0) != generation:
+                return
+            self._entries[key] = (tool_name, time.monotonic() + ttl, result, seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, (evicted_tool, _, _, _) = self._entries.popitem(last=False)
+                self._tool_stats(evicted_tool)["evicted"] += 1
+
+    def invalidate(self, *tool_names: str):
+        """Drop every cached result of these tools."""
+        names = set(tool_names)
+        with self._lock:
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[0] in names]
+            for key in stale:
+                self._tool_stats(self._entries.pop(key)[0])["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            for name in {entry[0] for entry in self._entries.values()}:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, plus per-tool counters with the hit ratio."""
+        with self._lock:
+            tools = {tool_name: dict(counters) for tool_name, counters in self.stats.items()}
+            entries = len(self._entries)
+        for counters in tools.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_ratio"] = counters["hits"] / lookups if lookups else 0.0
+        return {"entries": entries, "max_entries": self.max_entries, "tools": tools}
+
+
+_cache = ToolResultCache()
+get_telemetry().add_collector("tool_cache", _cache.get_stats)
+
+def get_tool_cache() -> ToolResultCache:
+    """Return the process-wide tool result cache."""
+    return _cache
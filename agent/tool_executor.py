@@ -3,61 +3,118 @@ Tool Executor
 Handles tool calling, execution, and result processing.
 """
 
+import asyncio
+import contextvars
 import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, Any, List, Optional
-from tools.calendar_tools import list_events, create_event, update_event, delete_event
-from tools.mail_tools import list_emails, send_email, mark_email_as_read
-from tools.todos_tools import list_tasks, add_task, complete_task
-from tools.process_new_emails_tools import process_new_email_tool
+from tools.calendar_tools import create_event, update_event
+from tools.mail_tools import send_email, send_emails
+from tools.registry import ToolRegistry, get_tool_registry
+from tool_cache import CACHE_ENABLED, MISS, ToolResultCache, cache_key, get_tool_cache
+from result_projection import ResultProjector
+from stage_timer import get_stage_timer, timed
+from telemetry import get_telemetry, span
+from terminal import get_terminal
+
+# How guests hear about new or changed events: "email" sends our own invitation
+# emails, "calendar" lets Google Calendar send its invitations (sendUpdates).
+INVITATIONS = os.environ.get('JARVIS_INVITATIONS', 'email')
+
+# How many per-call timings to keep for get_timing_stats().
+TIMING_HISTORY = 500
 
 class ToolExecutor:
-    def __init__(self, require_confirmation: bool = True):
+    """
+    Runs the tools in the registry. Write tools (declared with write=True)
+    run one at a time, in the order the model asked for them; every other
+    tool may run concurrently with its neighbours and is abandoned after
+    its timeout.
+    """
+
+    def __init__(self, require_confirmation: bool = True, parallel: bool = True, max_workers: int = 4,
+                 projector: Optional[ResultProjector] = None, registry: Optional[ToolRegistry] = None,
+                 cache: Optional[ToolResultCache] = None):
         self.require_confirmation = require_confirmation
+        self.registry = registry or get_tool_registry()
+        # Results of cacheable read tools, shared by every executor so writes and
+        # new mail invalidate them everywhere; None disables caching.
+        self.cache = cache if cache is not None else (get_tool_cache() if CACHE_ENABLED else None)
+        # Tools that need more than their plain function: confirmation, invitations.
+        self._overrides = {
+            "create_event": self._execute_create_event,
+            "update_event": self._execute_update_event,
+            "send_email": self._execute_send_email,
+        }
+        self.projector = projector or ResultProjector()
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.timings = deque(maxlen=TIMING_HISTORY)
         
     def execute_tool(self, function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a tool with the given arguments."""
+        spec = self.registry.get(function_name)
+        if spec is None:
+            return {"error": f"Unknown tool: {function_name}"}
+        # Models sometimes send null for an argument they mean to leave out.
+        arguments = {name: value for name, value in arguments.items() if value is not None}
+        # Reject malformed calls before any network request is made.
+        problems = spec.validate(arguments)
+        if problems:
+            return {"error": f"Invalid arguments for {function_name}: {'; '.join(problems)}"}
+        if self.cache is not None and spec.cacheable_with(arguments):
+            return self._cached_call(spec, arguments)
+        result = self._call(spec, arguments)
+        if spec.invalidates and self.cache is not None:
+            self.cache.invalidate(*spec.invalidates)
+        return result
+    
+    def _call(self, spec, arguments: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            if function_name == "list_events":
-                result = list_events(**arguments)
-            elif function_name == "create_event":
-                result = self._execute_create_event(arguments)
-            elif function_name == "list_emails":
-                result = list_emails(**arguments)
-            elif function_name == "send_email":
-                result = self._execute_send_email(arguments)
-            elif function_name == "list_tasks":
-                result = list_tasks(**arguments)
-            elif function_name == "add_task":
-                result = add_task(**arguments)
-            elif function_name == "complete_task":
-                result = complete_task(**arguments)
-            elif function_name == "process_new_email":
-                result = process_new_email_tool(**arguments)
-            elif function_name == "update_event":
-                result = self._execute_update_event(arguments)
-            elif function_name == "delete_event":
-                result = delete_event(**arguments)
-            else:
-                result = {"error": f"Unknown tool: {function_name}"}
-                
-            return result
-            
+            override = self._overrides.get(spec.name)
+            if override is not None:
+                return override(arguments)
+            return spec.func(**arguments)
         except Exception as e:
             return {"error": str(e)}
     
+    def _cached_call(self, spec, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Serve a read tool from the cache, or run it and cache a successful result."""
+        key = cache_key(spec.name, arguments)
+        result = self.cache.get(spec.name, key)
+        if result is not MISS:
+            return result
+        generation = self.cache.generation(spec.name)
+        start = time.perf_counter()
+        result = self._call(spec, arguments)
+        if not (isinstance(result, dict) and "error" in result):
+            self.cache.put(spec.name, key, result, spec.ttl, time.perf_counter() - start, generation)
+        return result
+    
     def _execute_create_event(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Execute create_event with guest email handling."""
+        guests = arguments.get("guests")
+        if guests and INVITATIONS == "calendar":
+            arguments = dict(arguments, send_updates="all")
         result = create_event(**arguments)
         
         # Send emails to guests if event was created successfully
-        guests = arguments.get("guests")
         if guests and result and result.get("status") == "confirmed":
-            self._send_meeting_invitations(arguments, guests, "Scheduled")
+            result = dict(result, invitations=self._send_meeting_invitations(arguments, guests, "Scheduled"))
             
         return result
     
     def _execute_update_event(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Execute update_event with guest email handling."""
+        guests = arguments.get("guests")
+        if guests and INVITATIONS == "calendar":
+            arguments = dict(arguments, send_updates="all")
         result = update_event(**arguments)
         
         # Check if update was successful
@@ -66,46 +123,154 @@ class ToolExecutor:
             return result
         
         # Send emails to guests if event was updated successfully
-        guests = arguments.get("guests")
         if guests and result:
-            self._send_meeting_invitations(arguments, guests, "Updated")
+            result = dict(result, invitations=self._send_meeting_invitations(arguments, guests, "Updated"))
             
         return result
     
     def _execute_send_email(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Execute send_email with confirmation if required."""
         if self.require_confirmation:
-            confirm = input(f"Do you want to proceed with send email? (yes/no): ").strip().lower()
-            if confirm != "yes":
+            if not self._confirm("Do you want to proceed with send email? (yes/no): "):
                 return {"status": "cancelled", "reason": "User declined confirmation."}
         
         return send_email(**arguments)
     
-    def _send_meeting_invitations(self, arguments: Dict[str, Any], guests: List[str], action: str):
-        """Send meeting invitations to guests."""
+    def _send_meeting_invitations(self, arguments: Dict[str, Any], guests: List[str], action: str) -> List[Dict[str, Any]]:
+        """Send meeting invitations to guests; returns one result per guest."""
+        if arguments.get("send_updates") == "all":
+            # Calendar already emailed every attendee.
+            return [{"to": guest_email, "status": "sent_by_calendar"} for guest_email in guests]
         subject = f"Meeting {action}: {arguments.get('summary', 'No Title')}"
         start = arguments.get('start', '')
         end = arguments.get('end', '')
-        
-        for guest_email in guests:
-            message_text = f"Hi,\n\nYou have been invited to a meeting.\n\nSummary: {arguments.get('summary', 'No Title')}\nStart: {start}\nEnd: {end}\n\nBest regards,\nDavid"
-            send_email(to=guest_email, subject=subject, message_text=message_text)
+        message_text = f"Hi,\n\nYou have been invited to a meeting.\n\nSummary: {arguments.get('summary', 'No Title')}\nStart: {start}\nEnd: {end}\n\nBest regards,\nDavid"
+        return send_emails([
+            {"to": guest_email, "subject": subject, "message_text": message_text} for guest_email in guests
+        ])
+    
+    def _confirm(self, prompt: str) -> bool:
+        """Ask the user a yes/no question, one prompt at a time."""
+        try:
+            return get_terminal().ask(prompt).strip().lower() == "yes"
+        except EOFError:
+            return False
+    
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Create the worker pool on first use."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._pool
+    
+    def _timed_execute(self, tool_call_id: str, function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a tool and record how long it took."""
+        start = time.perf_counter()
+        with span("tool", tool=function_name) as call:
+            result = self.execute_tool(function_name, arguments)
+            if isinstance(result, dict) and "error" in result:
+                call.set(error=str(result["error"]))
+        seconds = time.perf_counter() - start
+        self.timings.append({
+            "tool": function_name,
+            "tool_call_id": tool_call_id,
+            "seconds": seconds,
+        })
+        get_stage_timer().record(f"tool.{function_name}", seconds)
+        return result
+    
+    def _run_reads(self, calls: List[tuple], results: Dict[str, Any]):
+        """Run a group of read-only calls, concurrently when there is more than one."""
+        if not self.parallel:
+            for call in calls:
+                results[call[0]] = self._timed_execute(*call)
+            return
+        pool = self._get_pool()
+        # Each read runs in a copy of this context, so its span joins the current turn.
+        futures = [(call, pool.submit(contextvars.copy_context().run, self._timed_execute, *call)) for call in calls]
+        deadline = time.monotonic()
+        for (tool_call_id, function_name, _), future in futures:
+            spec = self.registry.get(function_name)
+            timeout = spec.timeout if spec is not None else None
+            try:
+                if timeout is None:
+                    results[tool_call_id] = future.result()
+                else:
+                    # The reads were submitted together, so waiting on earlier ones uses up later ones' time.
+                    results[tool_call_id] = future.result(timeout=max(0.0, deadline + timeout - time.monotonic()))
+            except FutureTimeoutError:
+                results[tool_call_id] = {"error": f"{function_name} timed out after {timeout:g} seconds."}
+    
+    def _parse_call(self, tool_call) -> tuple:
+        """(id, name, arguments); arguments is None if they are not a JSON object."""
+        try:
+            with timed("json_parse"):
+                arguments = json.loads(tool_call.function.arguments or "{}")
+        except ValueError:
+            arguments = None
+        if not isinstance(arguments, dict):
+            arguments = None
+        return tool_call.id, tool_call.function.name, arguments
     
     def process_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Process multiple tool calls and return results."""
-        tool_outputs = []
+        """
+        Process multiple tool calls and return results in the order they were requested.
+        Consecutive read-only calls run concurrently; a write tool waits for the
+        reads before it and finishes before anything after it starts.
+        """
+        calls = [self._parse_call(tool_call) for tool_call in tool_calls]
+        results = {}
+        pending_reads = []
         
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            
-            result = self.execute_tool(function_name, arguments)
-            
-            tool_outputs.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "name": function_name,
-                "content": json.dumps(result)
-            })
-            
-        return tool_outputs
+        for call in calls:
+            if call[2] is None:
+                results[call[0]] = {"error": f"Arguments for {call[1]} are not a valid JSON object."}
+                continue
+            spec = self.registry.get(call[1])
+            if spec is not None and spec.write:
+                if pending_reads:
+                    self._run_reads(pending_reads, results)
+                    pending_reads = []
+                results[call[0]] = self._timed_execute(*call)
+            else:
+                pending_reads.append(call)
+        if pending_reads:
+            self._run_reads(pending_reads, results)
+        
+        with timed("json_serialize"):
+            outputs = [
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_call_id,
+                    "name": function_name,
+                    "content": self.projector.project(function_name, results[tool_call_id])
+                }
+                for tool_call_id, function_name, _ in calls
+            ]
+        telemetry = get_telemetry()
+        for output in outputs:
+            telemetry.observe("jarvis_tool_result_bytes", len(output["content"].encode("utf-8")), tool=output["name"])
+        return outputs
+    
+    async def aprocess_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        process_tool_calls() for the asyncio runtime. googleapiclient is
+        blocking, so the calls run on worker threads while the loop keeps going.
+        """
+        return await asyncio.to_thread(self.process_tool_calls, tool_calls)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Tool result cache size and per-tool hit ratio and saved seconds."""
+        return self.cache.get_stats() if self.cache is not None else {}
+    
+    def get_timing_stats(self) -> Dict[str, Dict[str, float]]:
+        """Summarize recent tool wall times per tool."""
+        stats = {}
+        for timing in list(self.timings):
+            entry = stats.setdefault(timing["tool"], {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["calls"] += 1
+            entry["total_seconds"] += timing["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], timing["seconds"])
+        for entry in stats.values():
+            entry["avg_seconds"] = entry["total_seconds"] / entry["calls"]
+        return stats
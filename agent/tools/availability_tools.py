@@ -0,0 +1,190 @@
+import math
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from tools.oauth_integration import get_service
+from tools.event_cache import CACHE_ENABLED, get_event_store
+from tools.registry import tool
+
+TIME_ZONE = 'Africa/Cairo'
+# Default working hours, local time.
+WORKING_HOURS_START = 9
+WORKING_HOURS_END = 18
+# Egypt's work week runs Sunday to Thursday (Monday=0 ... Sunday=6).
+WORK_DAYS = {6, 0, 1, 2, 3}
+# Proposed slots start on this grid (minutes past the hour).
+SLOT_STEP_MINUTES = 15
+# How far ahead find_free_slots looks when no time_max is given.
+SEARCH_DAYS = 14
+
+def _parse(value, tz):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed
+
+def _format(timestamp, tz):
+    return datetime.fromtimestamp(timestamp, tz).isoformat()
+
+def _busy_from_freebusy(time_min, time_max):
+    service = get_service('calendar')
+    response = service.freebusy().query(body={
+        'timeMin': time_min.isoformat(),
+        'timeMax': time_max.isoformat(),
+        'timeZone': TIME_ZONE,
+        'items': [{'id': 'primary'}],
+    }).execute()
+    busy = response['calendars']['primary'].get('busy', [])
+    return [(_parse(b['start'], time_min.tzinfo).timestamp(), _parse(b['end'], time_min.tzinfo).timestamp(), None)
+            for b in busy]
+
+def _busy_intervals(time_min, time_max):
+    """(start, end, event or None) of everything blocking time in the range."""
+    if CACHE_ENABLED:
+        try:
+            busy = get_event_store().busy_intervals(time_min.isoformat(), time_max.isoformat())
+            if busy is not None:
+                return busy
+        except Exception as e:
+            print(f"Event cache unavailable ({e}), asking the freebusy API.")
+    return _busy_from_freebusy(time_min, time_max)
+
+def _merge(intervals):
+    """Sort and merge overlapping (start, end) intervals."""
+    merged = []
+    for start, end in sorted((i[0], i[1]) for i in intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _free_gaps(window_start, window_end, busy):
+    """Yield the free (start, end) parts of a window, given merged busy intervals."""
+    cursor = window_start
+    for start, end in busy:
+        if end <= cursor:
+            continue
+        if start >= window_end:
+            break
+        if start > cursor:
+            yield cursor, start
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        yield cursor, window_end
+
+def find_free_slots(duration_minutes=30, time_min=None, time_max=None, count=3,
+                    working_hours_start=WORKING_HOURS_START, working_hours_end=WORKING_HOURS_END,
+                    include_weekends=False):
+    """Return the next `count` free slots of `duration_minutes` within working hours."""
+    if duration_minutes <= 0:
+        return {"error": "duration_minutes must be positive."}
+    if not 0 <= working_hours_start < working_hours_end <= 24:
+        return {"error": "Working hours must satisfy 0 <= start < end <= 24."}
+
+    tz = ZoneInfo(TIME_ZONE)
+    range_start = _parse(time_min, tz) if time_min else datetime.now(tz)
+    range_end = _parse(time_max, tz) if time_max else range_start + timedelta(days=SEARCH_DAYS)
+    busy = _merge(_busy_intervals(range_start, range_end))
+
+    duration = duration_minutes * 60
+    step = SLOT_STEP_MINUTES * 60
+    start_ts, end_ts = range_start.timestamp(), range_end.timestamp()
+    slots = []
+    day = range_start.astimezone(tz).date()
+    last_day = range_end.astimezone(tz).date()
+    while day <= last_day and len(slots) < count:
+        if include_weekends or day.weekday() in WORK_DAYS:
+            day_start = datetime.combine(day, time(working_hours_start), tz)
+            day_end = datetime.combine(day, time.min, tz) + timedelta(hours=working_hours_end)
+            window_start = max(day_start.timestamp(), start_ts)
+            window_end = min(day_end.timestamp(), end_ts)
+            for gap_start, gap_end in _free_gaps(window_start, window_end, busy):
+                slot_start = math.ceil(gap_start / step) * step
+                while slot_start + duration <= gap_end and len(slots) < count:
+                    slots.append({"start": _format(slot_start, tz), "end": _format(slot_start + duration, tz)})
+                    # The next slot starts where this one ends, back on the grid.
+                    slot_start = math.ceil((slot_start + duration) / step) * step
+                if len(slots) >= count:
+                    break
+        day += timedelta(days=1)
+
+    return {"slots": slots, "duration_minutes": duration_minutes, "time_zone": TIME_ZONE}
+
+def check_availability(start, end):
+    """Check whether David is free for the whole of [start, end)."""
+    tz = ZoneInfo(TIME_ZONE)
+    range_start, range_end = _parse(start, tz), _parse(end, tz)
+    if range_end <= range_start:
+        return {"error": "end must be after start."}
+    conflicts = []
+    for busy_start, busy_end, event in _busy_intervals(range_start, range_end):
+        conflict = {"start": _format(busy_start, tz), "end": _format(busy_end, tz)}
+        if event is not None:
+            conflict["id"] = event.get("id")
+            conflict["summary"] = event.get("summary", "")
+        conflicts.append(conflict)
+    return {"available": not conflicts, "conflicts": conflicts}
+
+# OpenAI function schemas for availability tools
+# Without time_min the search starts at "now", so only calls that give it are cached.
+@tool(find_free_slots, cacheable=True, cache_requires=("time_min",))
+def get_find_free_slots_schema():
+    return {
+        "name": "find_free_slots",
+        "description": "Find the next free time slots of a given length in David's calendar, within working hours (Cairo time, Sunday to Thursday by default). Use this to propose meeting times instead of reading list_events output.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "duration_minutes": {
+                    "type": "integer",
+                    "description": "Length of the meeting in minutes (default: 30)."
+                },
+                "time_min": {
+                    "type": "string",
+                    "description": "Earliest start to consider (RFC3339, default: now)."
+                },
+                "time_max": {
+                    "type": "string",
+                    "description": "Latest end to consider (RFC3339, default: two weeks from time_min)."
+                },
+                "count": {
+                    "type": "integer",
+                    "description": "How many slots to return (default: 3)."
+                },
+                "working_hours_start": {
+                    "type": "integer",
+                    "description": "First working hour of the day, 0-23 (default: 9)."
+                },
+                "working_hours_end": {
+                    "type": "integer",
+                    "description": "Hour the working day ends, 1-24 (default: 18)."
+                },
+                "include_weekends": {
+                    "type": "boolean",
+                    "description": "Also propose slots on Friday and Saturday (default: false)."
+                }
+            },
+            "required": []
+        }
+    }
+
+@tool(check_availability, cacheable=True)
+def get_check_availability_schema():
+    return {
+        "name": "check_availability",
+        "description": "Check whether David is free for a specific time range. Returns the conflicting events if he is not. Use this before creating or moving an event.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "start": {
+                    "type": "string",
+                    "description": "Start of the range (RFC3339 format, e.g., '2025-09-02T22:00:00+03:00')"
+                },
+                "end": {
+                    "type": "string",
+                    "description": "End of the range (RFC3339 format, e.g., '2025-09-02T23:00:00+03:00')"
+                }
+            },
+            "required": ["start", "end"]
+        }
+    }
@@ -1,10 +1,20 @@
-from googleapiclient.discovery import build
-from tools.oauth_integration import get_credentials
+from tools.oauth_integration import get_service
+from tools.event_cache import CACHE_ENABLED, get_event_store
+from tools.registry import tool
+
+# Cached reads that a calendar write makes stale.
+CALENDAR_READS = ("list_events", "find_free_slots", "check_availability")
 
 # Calendar tool function
 def list_events(time_min, time_max):
-    credentials = get_credentials()
-    service = build('calendar', 'v3', credentials=credentials)
+    if CACHE_ENABLED:
+        try:
+            events = get_event_store().query(time_min, time_max)
+            if events is not None:
+                return events
+        except Exception as e:
+            print(f"Event cache unavailable ({e}), querying Calendar directly.")
+    service = get_service('calendar')
     events_result = service.events().list(
         calendarId='primary',
         timeMin=time_min,
@@ -14,9 +24,8 @@ def list_events(time_min, time_max):
     ).execute()
     return events_result.get('items', [])
 
-def create_event(summary, start, end, guests=None):
-    credentials = get_credentials()
-    service = build('calendar', 'v3', credentials=credentials)
+def create_event(summary, start, end, guests=None, send_updates='none'):
+    service = get_service('calendar')
     event = {
         'summary': summary,
         'start': {'dateTime': start, 'timeZone': 'Africa/Cairo'},
@@ -24,12 +33,13 @@ def create_event(summary, start, end, guests=None):
     }
     if guests:
         event['attendees'] = [{'email': email} for email in guests]
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
+    # send_updates='all' lets Calendar email the invitations itself.
+    created_event = service.events().insert(calendarId='primary', body=event, sendUpdates=send_updates).execute()
+    get_event_store().put(created_event)
     return created_event
 
-def update_event(event_id, summary=None, start=None, end=None, guests=None):
-    credentials = get_credentials()
-    service = build('calendar', 'v3', credentials=credentials)
+def update_event(event_id, summary=None, start=None, end=None, guests=None, send_updates='none'):
+    service = get_service('calendar')
     try:
         # Fetch the existing event
         existing_event = service.events().get(calendarId='primary', eventId=event_id).execute()
@@ -48,7 +58,9 @@ def update_event(event_id, summary=None, start=None, end=None, guests=None):
             event['attendees'] = [{'email': email} for email in guests]
         elif 'attendees' in existing_event:
             event['attendees'] = existing_event['attendees']
-        updated_event = service.events().update(calendarId='primary', eventId=event_id, body=event).execute()
+        updated_event = service.events().update(calendarId='primary', eventId=event_id, body=event,
+                                                sendUpdates=send_updates).execute()
+        get_event_store().put(updated_event)
         return updated_event
     except Exception as e:
         if "Not Found" in str(e) or "404" in str(e):
@@ -57,18 +69,19 @@ def update_event(event_id, summary=None, start=None, end=None, guests=None):
             return {"error": f"Failed to update event: {str(e)}"}
 
 def delete_event(event_id):
-    credentials = get_credentials()
-    service = build('calendar', 'v3', credentials=credentials)
+    service = get_service('calendar')
     service.events().delete(calendarId='primary', eventId=event_id).execute()
+    get_event_store().discard(event_id)
     return f"Event {event_id} deleted successfully."
 
 
 
 # OpenAI function schema for calendar tool
+@tool(list_events, cacheable=True)
 def get_list_events_schema():
     return {
         "name": "list_events",
-        "description": "List all events in a calendar between two RFC3339 datetimes. Use this tool to check if David is available before scheduling or creating any new event. Always use this before calling create_event.",
+        "description": "List all events in a calendar between two RFC3339 datetimes. Use this to find existing events (e.g. the meeting to reschedule or cancel). To check whether David is free, use check_availability; to propose times, use find_free_slots.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -85,10 +98,11 @@ def get_list_events_schema():
         }
     }
 
+@tool(create_event, write=True, invalidates=CALENDAR_READS)
 def get_create_event_schema():
     return {
         "name": "create_event",
-        "description": "Create a new event in the primary calendar. Only use this after confirming with list_events that David is available at the requested time. Never create an event without checking availability first. Optionally, add guests to the event by providing their email addresses.",
+        "description": "Create a new event in the primary calendar. Only use this after confirming with check_availability that David is available at the requested time. Never create an event without checking availability first. Optionally, add guests to the event by providing their email addresses.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -114,6 +128,7 @@ def get_create_event_schema():
         }
     }
         
+@tool(update_event, write=True, invalidates=CALENDAR_READS)
 def get_update_event_schema():
     return {
         "name": "update_event",
@@ -138,6 +153,7 @@ def get_update_event_schema():
     }
 
 
+@tool(delete_event, write=True, invalidates=CALENDAR_READS)
 def get_delete_event_schema():
     return {
         "name": "delete_event",
@@ -0,0 +1,216 @@
+import bisect
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter
+from tools.registry import tool
+
+# Set JARVIS_CONTACTS_FILE to use another address book.
+CONTACTS_FILE = os.environ.get('JARVIS_CONTACTS_FILE',
+                               os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'contacts.json'))
+# Lookups check the file's mtime at most this often (seconds) and reload it when it changed.
+RELOAD_CHECK_SECONDS = 1.0
+# Fuzzy matches need at least this trigram similarity (Dice coefficient, 0..1).
+MIN_FUZZY_SCORE = 0.35
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+def _normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).lower().split())
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Index:
+    """Immutable lookup structures over one version of the address book."""
+
+    def __init__(self, contacts):
+        self.contacts = contacts
+        self.emails = {_normalize(contact.get('email')) for contact in contacts}
+        # normalized name / email / email local part -> contact positions
+        self.exact = {}
+        # sorted (term, position) over full names, name words and emails, for prefix search
+        self.terms = []
+        # trigram -> positions, and each contact's trigram count, for fuzzy search
+        self.trigrams = {}
+        self.sizes = []
+        for position, contact in enumerate(contacts):
+            name = _normalize(contact.get('name'))
+            email = _normalize(contact.get('email'))
+            local_part = email.split('@', 1)[0]
+            for key in {name, email, local_part} - {''}:
+                self.exact.setdefault(key, []).append(position)
+            for term in {name, email, *name.split()} - {''}:
+                self.terms.append((term, position))
+            grams = _trigrams(name) | _trigrams(local_part)
+            for gram in grams:
+                self.trigrams.setdefault(gram, []).append(position)
+            self.sizes.append(len(grams))
+        self.terms.sort()
+
+    def search(self, query, limit):
+        """
+        (position, match, score) of the best matches: exact ones first, then
+        prefix ones; only when there are neither, trigram (fuzzy) ones.
+        """
+        found = {}
+
+        def add(position, match, score):
+            if position not in found:
+                found[position] = (match, score)
+
+        for position in self.exact.get(query, ()):
+            add(position, 'exact', 1.0)
+        i = bisect.bisect_left(self.terms, (query, -1))
+        while i < len(self.terms) and len(found) < limit and self.terms[i][0].startswith(query):
+            term, position = self.terms[i]
+            add(position, 'prefix', round(len(query) / len(term), 3))
+            i += 1
+        if not found:
+            grams = _trigrams(query)
+            shared = Counter(position for gram in grams for position in self.trigrams.get(gram, ()))
+            for position, count in shared.items():
+                score = 2 * count / (len(grams) + self.sizes[position])
+                if score >= MIN_FUZZY_SCORE:
+                    add(position, 'fuzzy', round(score, 3))
+        ranked = sorted(found.items(), key=lambda item: (item[1][0] != 'exact', -item[1][1]))
+        return [(position, match, score) for position, (match, score) in ranked[:limit]]
+
+
+class ContactIndex:
+    """
+    In-memory index of contacts.json with exact, prefix and trigram lookups
+    on names and email addresses.
+
+    Lookups compare the file's mtime and size at most every
+    RELOAD_CHECK_SECONDS and rebuild the index when the file changed. The
+    new index replaces the old one in a single assignment, so lookups never
+    wait for a reload; a file that fails to parse (e.g. mid-write) keeps the
+    previous index.
+    """
+
+    def __init__(self, path=CONTACTS_FILE, reload_check_seconds=RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.reload_check_seconds = reload_check_seconds
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._index = _Index([])
+        # (mtime, size) of the loaded file, None if it was missing; False before the first load.
+        self._signature = False
+        self._checked = 0.0
+        self.stats = {'lookups': 0, 'reloads': 0, 'reload_errors': 0}
+        self._reload()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            signature = self._file_signature()
+            if signature == self._signature:
+                # Another lookup reloaded it meanwhile.
+                return
+            if signature is None:
+                print(f"Warning: contacts.json not found at {self.path}")
+                contacts = []
+            else:
+                try:
+                    with open(self.path, 'r') as f:
+                        contacts = [c for c in json.load(f)['contacts'] if c.get('email')]
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Warning: could not load contacts from {self.path}: {e}")
+                    with self._stats_lock:
+                        self.stats['reload_errors'] += 1
+                    return
+            self._index = _Index(contacts)
+            self._signature = signature
+            with self._stats_lock:
+                self.stats['reloads'] += 1
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked >= self.reload_check_seconds:
+            self._checked = now
+            if self._file_signature() != self._signature:
+                self._reload()
+
+    def contacts(self):
+        """All contacts (name, email) of the current version of the file."""
+        self._maybe_reload()
+        return list(self._index.contacts)
+
+    def is_contact(self, email):
+        """Whether `email` is the address of a contact in the current version of the file."""
+        self._maybe_reload()
+        return _normalize(email) in self._index.emails
+
+    def resolve(self, query, limit=DEFAULT_LIMIT):
+        """Contacts matching `query` (a name, part of one, or an email address), best first."""
+        self._maybe_reload()
+        index = self._index
+        with self._stats_lock:
+            self.stats['lookups'] += 1
+        query = _normalize(query)
+        if not query:
+            return []
+        return [{'name': index.contacts[position].get('name', ''), 'email': index.contacts[position]['email'],
+                 'match': match, 'score': score}
+                for position, match, score in index.search(query, limit)]
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['contacts'] = len(self._index.contacts)
+        return stats
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_contact_index():
+    """Return the process-wide contact index, loading contacts.json on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ContactIndex()
+        return _index
+
+def resolve_contact(query, limit=DEFAULT_LIMIT):
+    matches = get_contact_index().resolve(query, max(1, min(limit, MAX_LIMIT)))
+    if not matches:
+        return {'query': query, 'matches': [], 'message': f"No contact matches '{query}'. Ask David for the email address."}
+    return {'query': query, 'matches': matches}
+
+@tool(resolve_contact, timeout=5)
+def get_resolve_contact_schema():
+    return {
+        "name": "resolve_contact",
+        "description": "Look up a contact's email address by name, partial name or email. Returns the best matches "
+                       "first; 'exact' and 'prefix' matches are reliable, 'fuzzy' ones may be a different person. "
+                       "Use it whenever David refers to someone by name.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "A name (e.g. 'Ahmed' or 'Ahmed Shehata'), or all or part of an email address."
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": f"Maximum number of matches (default: {DEFAULT_LIMIT})."
+                }
+            },
+            "required": ["query"]
+        }
+    }
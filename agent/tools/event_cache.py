@@ -0,0 +1,275 @@
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from tools.oauth_integration import get_service
+from telemetry import get_telemetry
+
+# Set JARVIS_EVENT_CACHE=0 to always query the Calendar API directly.
+CACHE_ENABLED = os.environ.get('JARVIS_EVENT_CACHE', '1') != '0'
+# Seconds a synced copy is trusted before the next incremental sync.
+REFRESH_INTERVAL = 15.0
+# Used for all-day events and times without an offset.
+DEFAULT_TIME_ZONE = 'Africa/Cairo'
+PAGE_SIZE = 2500
+# The full sync only downloads events in [now - SYNC_PAST_DAYS, now + SYNC_FUTURE_DAYS];
+# ranges outside that window are queried from Google directly.
+SYNC_PAST_DAYS = 30
+SYNC_FUTURE_DAYS = 365
+# Once now is this many seconds past the moment the window was centred on,
+# the next refresh runs a full sync again so the window moves along.
+WINDOW_SLIDE_SECONDS = 24 * 3600
+
+def _to_timestamp(value, tz):
+    """RFC3339 string (or a Calendar start/end dict) -> POSIX timestamp."""
+    if isinstance(value, dict):
+        if 'dateTime' in value:
+            value = value['dateTime']
+        else:
+            # All-day events only carry a date, in the calendar's time zone.
+            return datetime.fromisoformat(value['date']).replace(tzinfo=tz).timestamp()
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed.timestamp()
+
+
+class EventStore:
+    """
+    In-process copy of the primary calendar, indexed by start time.
+
+    The first sync downloads the events in a window around now and keeps the
+    nextSyncToken; later syncs only fetch what changed since then (and start
+    over when Google answers 410 Gone). A day after the full sync the window
+    is moved by running it again. query() returns None for ranges
+    outside the window so the caller asks Google instead. Our own
+    create/update/delete calls are written through so the cache never lags
+    behind them.
+
+    Syncs run outside the data lock: readers keep getting the current copy
+    while a sync is in flight, and only wait when there is no copy yet.
+    Writes made during a sync are replayed on top of its result.
+
+    Events are kept in a list sorted by start. A range query bisects to the
+    first event that could still be running at time_min (start >= time_min
+    minus the longest event duration) and scans forward until time_max.
+    """
+
+    def __init__(self, calendar_id='primary', refresh_interval=REFRESH_INTERVAL):
+        self.calendar_id = calendar_id
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        # Held for a whole sync, network calls included; never while holding _lock.
+        self._sync_lock = threading.Lock()
+        self._syncing = False
+        # event_id -> event (None when deleted) written through while a sync was in flight
+        self._writes_during_sync = {}
+        # (start, end) timestamps covered by the full sync
+        self._window = None
+        self._events = {}
+        # event_id -> (start, end) timestamps
+        self._bounds = {}
+        # sorted (start, event_id)
+        self._index = []
+        self._max_duration = 0.0
+        self._tz = ZoneInfo(DEFAULT_TIME_ZONE)
+        self._sync_token = None
+        self._last_sync = None
+        self.stats = {'queries': 0, 'outside_window': 0, 'full_syncs': 0, 'incremental_syncs': 0,
+                      'changes_applied': 0, 'write_throughs': 0, 'write_through_errors': 0}
+
+    @property
+    def synced(self):
+        return self._sync_token is not None
+
+    def _remove(self, event_id):
+        bounds = self._bounds.pop(event_id, None)
+        self._events.pop(event_id, None)
+        if bounds is not None:
+            i = bisect.bisect_left(self._index, (bounds[0], event_id))
+            if i < len(self._index) and self._index[i] == (bounds[0], event_id):
+                del self._index[i]
+
+    def _upsert(self, event):
+        event_id = event['id']
+        self._remove(event_id)
+        if event.get('status') == 'cancelled':
+            return
+        start = _to_timestamp(event['start'], self._tz)
+        end = _to_timestamp(event['end'], self._tz)
+        self._events[event_id] = event
+        self._bounds[event_id] = (start, end)
+        bisect.insort(self._index, (start, event_id))
+        self._max_duration = max(self._max_duration, end - start)
+
+    def _fetch(self, **kwargs):
+        service = get_service('calendar')
+        items = []
+        time_zone = None
+        while True:
+            response = service.events().list(calendarId=self.calendar_id, singleEvents=True,
+                                              maxResults=PAGE_SIZE, **kwargs).execute()
+            items.extend(response.get('items', []))
+            time_zone = response.get('timeZone') or time_zone
+            if 'nextPageToken' not in response:
+                return items, response.get('nextSyncToken'), time_zone
+            kwargs['pageToken'] = response['nextPageToken']
+
+    def _full_sync(self):
+        now = datetime.now(self._tz)
+        window_start, window_end = now - timedelta(days=SYNC_PAST_DAYS), now + timedelta(days=SYNC_FUTURE_DAYS)
+        items, sync_token, time_zone = self._fetch(timeMin=window_start.isoformat(), timeMax=window_end.isoformat())
+        with self._lock:
+            if time_zone:
+                self._tz = ZoneInfo(time_zone)
+            self._events, self._bounds, self._index = {}, {}, []
+            self._max_duration = 0.0
+            for event in items:
+                self._upsert(event)
+            self._window = (window_start.timestamp(), window_end.timestamp())
+            self._sync_token = sync_token
+            self.stats['full_syncs'] += 1
+
+    def _incremental_sync(self, sync_token):
+        try:
+            items, next_token, time_zone = self._fetch(syncToken=sync_token)
+        except HttpError as e:
+            if e.resp.status == 410:
+                self._full_sync()
+                return
+            raise
+        with self._lock:
+            if time_zone:
+                self._tz = ZoneInfo(time_zone)
+            for event in items:
+                self._upsert(event)
+            self._sync_token = next_token or self._sync_token
+            self.stats['incremental_syncs'] += 1
+            self.stats['changes_applied'] += len(items)
+
+    def refresh(self, force=False):
+        """
+        Sync with Google if the local copy is older than refresh_interval.
+        While another thread syncs, returns at once if there is a copy to
+        serve and waits for that sync otherwise.
+        """
+        if not self._sync_lock.acquire(blocking=not self.synced):
+            return
+        try:
+            with self._lock:
+                now = time.monotonic()
+                if not force and self._last_sync is not None and now - self._last_sync < self.refresh_interval:
+                    return
+                sync_token = self._sync_token
+                if self._window_has_drifted():
+                    sync_token = None
+                self._syncing = True
+                self._writes_during_sync = {}
+            try:
+                if sync_token is None:
+                    self._full_sync()
+                else:
+                    self._incremental_sync(sync_token)
+            finally:
+                with self._lock:
+                    # The fetched copy may predate our own writes; they win.
+                    for event_id, event in self._writes_during_sync.items():
+                        if event is None:
+                            self._remove(event_id)
+                        else:
+                            self._upsert(event)
+                    self._syncing = False
+                    self._writes_during_sync = {}
+            self._last_sync = now
+        finally:
+            self._sync_lock.release()
+
+    def _window_has_drifted(self):
+        if self._window is None:
+            return False
+        centre = self._window[0] + SYNC_PAST_DAYS * 24 * 3600
+        return time.time() - centre > WINDOW_SLIDE_SECONDS
+
+    def query(self, time_min, time_max):
+        """
+        Events overlapping [time_min, time_max), ordered by start time, or
+        None when the range is not inside the synced window.
+        """
+        self.refresh()
+        with self._lock:
+            self.stats['queries'] += 1
+            lower = _to_timestamp(time_min, self._tz)
+            upper = _to_timestamp(time_max, self._tz)
+            if self._window is None or lower < self._window[0] or upper > self._window[1]:
+                self.stats['outside_window'] += 1
+                return None
+            i = bisect.bisect_left(self._index, (lower - self._max_duration,))
+            events = []
+            while i < len(self._index) and self._index[i][0] < upper:
+                event_id = self._index[i][1]
+                if self._bounds[event_id][1] > lower:
+                    events.append(self._events[event_id])
+                i += 1
+            return events
+
+    def busy_intervals(self, time_min, time_max):
+        """(start, end, event) for events overlapping the range that block time, or None (see query())."""
+        events = self.query(time_min, time_max)
+        if events is None:
+            return None
+        with self._lock:
+            return [
+                (self._bounds[event['id']][0], self._bounds[event['id']][1], event)
+                for event in events
+                # Events marked "free" and ones the user declined don't block time.
+                if event.get('transparency') != 'transparent' and not any(
+                    a.get('self') and a.get('responseStatus') == 'declined' for a in event.get('attendees', [])
+                )
+                and event['id'] in self._bounds
+            ]
+
+    def put(self, event):
+        """Write-through for an event we created or updated."""
+        self._write_through(event['id'], event)
+
+    def discard(self, event_id):
+        """Write-through for an event we deleted."""
+        self._write_through(event_id, None)
+
+    def _write_through(self, event_id, event):
+        # The write already succeeded at Google, so a cache error must not
+        # surface to the caller; the copy is dropped and rebuilt on next use.
+        with self._lock:
+            if self._syncing:
+                self._writes_during_sync[event_id] = event
+            if not self.synced:
+                return
+            try:
+                if event is None:
+                    self._remove(event_id)
+                else:
+                    self._upsert(event)
+                self.stats['write_throughs'] += 1
+            except Exception as e:
+                print(f"Event cache write-through failed ({e}), resyncing on next use.")
+                self.stats['write_through_errors'] += 1
+                self._sync_token = None
+                self._last_sync = None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['events'] = len(self._events)
+            return stats
+
+
+_store = EventStore()
+
+def get_event_store():
+    """Return the process-wide event store."""
+    return _store
+
+get_telemetry().add_collector('event_store', lambda: get_event_store().get_stats())
@@ -1,12 +1,143 @@
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from tools.oauth_integration import get_credentials
+from googleapiclient.errors import HttpError
+from tools.oauth_integration import get_service
+from tools.request_governor import get_governor
+from tools.registry import tool
 
-# Mail tool function
-def list_emails(labelIds=None, query='', max_results=50):
-    credentials = get_credentials()
-    service = build('gmail', 'v1', credentials=credentials)
+# Gmail allows up to 100 calls per batch request but starts rate limiting
+# well before that, so stay at the size Google recommends.
+BATCH_SIZE = 50
+# Worker threads for fetches a batch request cannot cover, and for concurrent sends.
+FALLBACK_WORKERS = 8
+# Per-item statuses worth a second attempt outside the batch.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Headers requested in metadata mode. The list/automation headers are used
+# by the email classifier to recognize bulk mail.
+METADATA_HEADERS = ['From', 'Reply-To', 'Subject', 'Date',
+                    'List-Unsubscribe', 'List-Id', 'Precedence', 'Auto-Submitted']
+# Partial responses: only the parts of a message resource we actually read.
+FULL_FIELDS = 'id,threadId,labelIds,snippet,payload(mimeType,headers,body/data,parts(mimeType,body/data))'
+METADATA_FIELDS = 'id,threadId,labelIds,snippet,payload/headers'
+# users.messages.batchModify takes at most this many IDs per call.
+BATCH_MODIFY_SIZE = 1000
+
+def _message_get_kwargs(message_id, headers_only=False):
+    if headers_only:
+        return {'userId': 'me', 'id': message_id, 'format': 'metadata',
+                'metadataHeaders': METADATA_HEADERS, 'fields': METADATA_FIELDS}
+    return {'userId': 'me', 'id': message_id, 'format': 'full', 'fields': FULL_FIELDS}
+
+def _parse_message(msg_data):
+    """Turn a Gmail message resource into the dict the tools return."""
+    payload = msg_data.get('payload', {})
+    headers = {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
+    body = ''
+    if 'parts' in payload:
+        for part in payload['parts']:
+            if part['mimeType'] == 'text/plain' and 'data' in part.get('body', {}):
+                body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+                break
+    else:
+        if 'data' in payload.get('body', {}):
+            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    return {
+        'id': msg_data['id'],
+        'from': headers.get('from', ''),
+        'reply_to': headers.get('reply-to', ''),
+        'subject': headers.get('subject', ''),
+        'snippet': msg_data.get('snippet', ''),
+        'body': body,
+        'labels': msg_data.get('labelIds', []),
+        'list_unsubscribe': headers.get('list-unsubscribe', ''),
+        'list_id': headers.get('list-id', ''),
+        'precedence': headers.get('precedence', ''),
+        'auto_submitted': headers.get('auto-submitted', '')
+    }
+
+def _error_status(exception):
+    resp = getattr(exception, 'resp', None)
+    return getattr(resp, 'status', None)
+
+def _fetch_one(message_id, headers_only=False):
+    # Runs on pool threads: get_service() hands each thread its own client.
+    service = get_service('gmail')
+    return service.users().messages().get(**_message_get_kwargs(message_id, headers_only)).execute()
+
+_fallback_pool = None
+_fallback_pool_lock = threading.Lock()
+
+def _get_fallback_pool():
+    # Long-lived so its threads keep their cached Gmail clients between polls and sends.
+    global _fallback_pool
+    with _fallback_pool_lock:
+        if _fallback_pool is None:
+            _fallback_pool = ThreadPoolExecutor(max_workers=FALLBACK_WORKERS, thread_name_prefix='gmail-fetch')
+        return _fallback_pool
+
+def _fetch_with_pool(message_ids, headers_only, results, errors):
+    pool = _get_fallback_pool()
+    futures = {pool.submit(_fetch_one, message_id, headers_only): message_id for message_id in message_ids}
+    for future, message_id in futures.items():
+        try:
+            results[message_id] = future.result()
+        except Exception as e:
+            errors[message_id] = e
+
+def _fetch_with_batch(service, message_ids, headers_only, results, errors):
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            results[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for message_id in message_ids:
+        batch.add(service.users().messages().get(**_message_get_kwargs(message_id, headers_only)),
+                  request_id=message_id)
+    # Batch requests bypass the service's request class; charge one token per call inside.
+    get_governor().execute('gmail', batch.execute, cost=len(message_ids), endpoint='gmail.batch')
+
+def get_emails(message_ids, headers_only=False):
+    """
+    Fetch several messages with as few round trips as possible.
+    Messages are requested through Gmail batch requests of BATCH_SIZE calls;
+    items that fail with a retryable status are retried once on a small
+    thread pool, and a chunk whose whole batch request fails is fetched on
+    the pool instead. Returns (emails in the order of message_ids, errors).
+    """
+    results = {}
+    errors = {}
+    if not message_ids:
+        return [], []
+
+    service = get_service('gmail')
+    for i in range(0, len(message_ids), BATCH_SIZE):
+        chunk = message_ids[i:i + BATCH_SIZE]
+        try:
+            _fetch_with_batch(service, chunk, headers_only, results, errors)
+        except Exception as e:
+            print(f"Batch fetch failed ({e}), falling back to parallel requests.")
+            pending = [message_id for message_id in chunk if message_id not in results]
+            for message_id in pending:
+                errors.pop(message_id, None)
+            _fetch_with_pool(pending, headers_only, results, errors)
+
+    retry_ids = [message_id for message_id, e in errors.items() if _error_status(e) in RETRYABLE_STATUSES]
+    if retry_ids:
+        for message_id in retry_ids:
+            del errors[message_id]
+        _fetch_with_pool(retry_ids, headers_only, results, errors)
+
+    emails = [_parse_message(results[message_id]) for message_id in message_ids if message_id in results]
+    failed = [{'id': message_id, 'error': str(e), 'status': _error_status(e)} for message_id, e in errors.items()]
+    return emails, failed
+
+def list_message_ids(labelIds=None, query='', max_results=50):
+    """List the IDs of messages matching a query without fetching their content."""
+    service = get_service('gmail')
     kwargs = {'userId': 'me', 'maxResults': max_results}
     if labelIds:
         kwargs['labelIds'] = labelIds
@@ -16,32 +147,70 @@ def list_emails(labelIds=None, query='', max_results=50):
         # Default to unread if no query provided
         kwargs['q'] = 'is:unread'
     results = service.users().messages().list(**kwargs).execute()
-    messages = results.get('messages', [])
-    emails = []
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-        headers = {h['name'].lower(): h['value'] for h in msg_data['payload'].get('headers', [])}
-        body = ''
-        if 'parts' in msg_data['payload']:
-            for part in msg_data['payload']['parts']:
-                if part['mimeType'] == 'text/plain':
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                    break
-        else:
-            if 'data' in msg_data['payload']['body']:
-                body = base64.urlsafe_b64decode(msg_data['payload']['body']['data']).decode('utf-8')
-        emails.append({
-            'id': msg['id'],
-            'from': headers.get('from', ''),
-            'reply_to': headers.get('reply-to', ''),
-            'subject': headers.get('subject', ''),
-            'body': body
-        })
-    return {'emails': emails}
+    return [msg['id'] for msg in results.get('messages', [])]
+
+# Mail tool function
+def list_emails(labelIds=None, query='', max_results=50, headers_only=False):
+    message_ids = list_message_ids(labelIds=labelIds, query=query, max_results=max_results)
+    emails, errors = get_emails(message_ids, headers_only=headers_only)
+    result = {'emails': emails}
+    if errors:
+        result['errors'] = errors
+    return result
+
+class HistoryExpiredError(Exception):
+    """Gmail no longer keeps history that far back; a full resync is needed."""
+
+def get_mailbox_history_id():
+    """Return the mailbox's current historyId."""
+    service = get_service('gmail')
+    profile = service.users().getProfile(userId='me').execute()
+    return profile['historyId']
+
+def list_new_message_ids(start_history_id, label_id='INBOX', unread_only=True):
+    """
+    Return (IDs of messages added since start_history_id, latest historyId).
+    Raises HistoryExpiredError when start_history_id is too old for Gmail.
+    """
+    service = get_service('gmail')
+    kwargs = {'userId': 'me', 'startHistoryId': start_history_id,
+              'historyTypes': ['messageAdded'], 'labelId': label_id}
+    message_ids = []
+    seen = set()
+    history_id = start_history_id
+    while True:
+        try:
+            response = service.users().history().list(**kwargs).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryExpiredError(f"History {start_history_id} is no longer available") from e
+            raise
+        history_id = response.get('historyId', history_id)
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                if unread_only and 'UNREAD' not in message.get('labelIds', []):
+                    continue
+                if message['id'] not in seen:
+                    seen.add(message['id'])
+                    message_ids.append(message['id'])
+        if 'nextPageToken' not in response:
+            return message_ids, history_id
+        kwargs['pageToken'] = response['nextPageToken']
+
+def watch_mailbox(topic_name, label_ids=('INBOX',)):
+    """
+    Ask Gmail to publish mailbox changes to a Pub/Sub topic.
+    Returns {'historyId', 'expiration'}; the watch must be renewed before it expires (7 days).
+    """
+    service = get_service('gmail')
+    return service.users().watch(
+        userId='me',
+        body={'topicName': topic_name, 'labelIds': list(label_ids), 'labelFilterBehavior': 'include'}
+    ).execute()
 
 def send_email(to, subject, message_text):
-    credentials = get_credentials()
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service('gmail')
     message = MIMEText(message_text)
     message['to'] = to
     message['subject'] = subject    
@@ -49,10 +218,27 @@ def send_email(to, subject, message_text):
     body = {'raw': raw}
     sent_message = service.users().messages().send(userId='me', body=body).execute()
     print(f"Email sent! Message ID: {sent_message['id']}")
+    return {'status': 'sent', 'to': to, 'id': sent_message['id'], 'threadId': sent_message.get('threadId')}
+
+def send_emails(messages):
+    """
+    Send several emails concurrently on the shared Gmail pool, whose threads
+    keep their Gmail clients between calls. `messages` holds send_email()
+    keyword arguments; returns one result per message, in the same order,
+    with status 'sent' or 'failed'.
+    """
+    pool = _get_fallback_pool()
+    futures = [pool.submit(send_email, **message) for message in messages]
+    results = []
+    for message, future in zip(messages, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append({'status': 'failed', 'to': message['to'], 'error': str(e)})
+    return results
 
 def mark_email_as_read(email_id):
-    credentials = get_credentials()
-    service = build('gmail', 'v1', credentials=credentials)
+    service = get_service('gmail')
     service.users().messages().modify(
         userId='me',
         id=email_id,
@@ -60,7 +246,20 @@ def mark_email_as_read(email_id):
     ).execute()
     print(f"Marked email {email_id} as read.")
 
+def mark_emails_as_read(email_ids):
+    """Mark many emails as read with one batchModify call per 1000 IDs."""
+    service = get_service('gmail')
+    email_ids = list(email_ids)
+    for start in range(0, len(email_ids), BATCH_MODIFY_SIZE):
+        service.users().messages().batchModify(
+            userId='me',
+            body={'ids': email_ids[start:start + BATCH_MODIFY_SIZE], 'removeLabelIds': ['UNREAD']}
+        ).execute()
+    if email_ids:
+        print(f"Marked {len(email_ids)} emails as read.")
+
 # OpenAI function schema for mail tool
+@tool(list_emails, cacheable=True, ttl=30)
 def get_list_emails_schema():
     return {
         "name": "list_emails",
@@ -71,12 +270,17 @@ def get_list_emails_schema():
                 "query": {
                     "type": "string",
                     "description": "Gmail search query (optional)."
+                },
+                "headers_only": {
+                    "type": "boolean",
+                    "description": "Only fetch sender, subject and a short snippet instead of full bodies. Faster; use it when scanning the inbox."
                 }
             },
             "required": []
         }
     } 
 
+@tool(send_email, write=True, invalidates=("list_emails",))
 def get_send_email_schema():
     return {
         "name": "send_email",
@@ -1,10 +1,14 @@
 import os
 import pickle
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-import base64
-from email.mime.text import MIMEText
+from tools.request_governor import get_governor
+from stage_timer import timed
+from telemetry import get_telemetry
 
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = [
@@ -15,7 +19,22 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.modify'
 ]
 
-def get_credentials():
+# API name -> discovery version for every service the tools use.
+SERVICE_VERSIONS = {
+    'calendar': 'v3',
+    'gmail': 'v1',
+    'tasks': 'v1',
+}
+
+# Refresh the access token this long before it actually expires, so a tool
+# call never starts with a token that dies halfway through the request.
+REFRESH_MARGIN = timedelta(minutes=5)
+# After a failed proactive refresh, the still-valid token is used and the
+# refresh retried after this many seconds, doubling per failure up to the max.
+REFRESH_RETRY_SECONDS = 10
+REFRESH_RETRY_MAX_SECONDS = 120
+
+def _load_credentials():
     """
     Loads credentials for Google APIs.
     - In production (CLOUD_RUN env var set), only loads from token.pickle and never runs the OAuth flow.
@@ -40,4 +59,178 @@ def get_credentials():
                 pickle.dump(creds, token)
         else:
             raise RuntimeError("No valid credentials found and cannot run OAuth flow in Cloud Run. Please generate token.pickle locally and deploy it.")
-    return creds
\ No newline at end of file
+    return creds
+
+
+class GoogleClientRegistry:
+    """
+    Process-wide cache for Google credentials and API service objects.
+
+    The credentials are loaded from disk once and refreshed in place shortly
+    before they expire. If that refresh fails while the token still works,
+    it is retried with backoff instead of on every call.
+
+    Service objects are built once per thread: they wrap an httplib2.Http,
+    which is not safe to share between threads. Because the refresh happens
+    in place, every cached service picks up the new token without being
+    rebuilt.
+    """
+
+    def __init__(self, refresh_margin: timedelta = REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._credentials = None
+        # Optional httplib2-compatible transport used instead of real credentials.
+        self._http = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        # Bumped by reset()/use_transport() so threads drop stale services.
+        self._generation = 0
+        # Consecutive failed refreshes, and the monotonic time before which no new attempt is made.
+        self._refresh_failures = 0
+        self._next_refresh = 0.0
+        self._stats = {
+            'credential_loads': 0,
+            'credential_refreshes': 0,
+            'credential_refresh_failures': 0,
+            'service_hits': 0,
+            'service_misses': 0,
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _needs_refresh(self, creds) -> bool:
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth keeps expiry as a naive UTC datetime.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= self.refresh_margin
+
+    def _refresh_deferred(self, creds) -> bool:
+        """True while a failed refresh is backing off and the current token still works."""
+        return creds.valid and time.monotonic() < self._next_refresh
+
+    def get_credentials(self):
+        """Return the shared credentials, loading or refreshing them if needed."""
+        creds = self._credentials
+        if creds is not None and (not self._needs_refresh(creds) or self._refresh_deferred(creds)):
+            return creds
+
+        with self._lock:
+            # Another thread may have loaded or refreshed while we waited.
+            creds = self._credentials
+            if creds is None:
+                with timed("credential_load"):
+                    creds = _load_credentials()
+                self._credentials = creds
+                self._count('credential_loads')
+            if self._needs_refresh(creds) and not self._refresh_deferred(creds):
+                if creds.refresh_token:
+                    try:
+                        with timed("credential_refresh"):
+                            creds.refresh(Request())
+                        self._count('credential_refreshes')
+                        self._refresh_failures = 0
+                        self._next_refresh = 0.0
+                    except Exception:
+                        self._count('credential_refresh_failures')
+                        self._refresh_failures += 1
+                        self._next_refresh = time.monotonic() + min(
+                            REFRESH_RETRY_MAX_SECONDS, REFRESH_RETRY_SECONDS * 2 ** (self._refresh_failures - 1))
+                        # Only fatal if the current token is already unusable.
+                        if not creds.valid:
+                            raise
+                else:
+                    with timed("credential_load"):
+                        creds = _load_credentials()
+                    self._credentials = creds
+                    self._count('credential_loads')
+            return creds
+
+    def _thread_services(self) -> dict:
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.services = {}
+            local.generation = self._generation
+        return local.services
+
+    def get_service(self, api: str):
+        """Return a cached service object for `api` ('calendar', 'gmail' or 'tasks')."""
+        if api not in SERVICE_VERSIONS:
+            raise ValueError(f"Unknown Google API: {api}")
+
+        # Always go through get_credentials() so the proactive refresh
+        # also happens for callers that only ever hit the cache.
+        credentials = self.get_credentials() if self._http is None else None
+        services = self._thread_services()
+        service = services.get(api)
+        if service is not None:
+            self._count('service_hits')
+            return service
+
+        self._count('service_misses')
+        # Every request the service makes is rate limited and retried by the governor.
+        request_builder = get_governor().request_class(api)
+        with timed("client_build"):
+            if self._http is not None:
+                service = build(api, SERVICE_VERSIONS[api], http=self._http, requestBuilder=request_builder,
+                                cache_discovery=False)
+            else:
+                service = build(api, SERVICE_VERSIONS[api], credentials=credentials, requestBuilder=request_builder,
+                                cache_discovery=False)
+        services[api] = service
+        return service
+
+    def use_transport(self, http):
+        """
+        Route every service through `http` instead of authenticated HTTP.
+        Meant for offline runs against a fake backend (see fakes.google_http);
+        the transport must be safe to share between threads. Pass None to go
+        back to the real credentials.
+        """
+        with self._lock:
+            self._http = http
+            self._generation += 1
+
+    def reset(self):
+        """Forget the cached credentials and every thread's services."""
+        with self._lock:
+            self._credentials = None
+            self._generation += 1
+
+    def get_stats(self) -> dict:
+        """Return a snapshot of the hit/miss and refresh counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['service_hits'] + stats['service_misses']
+        stats['service_hit_ratio'] = stats['service_hits'] / lookups if lookups else 0.0
+        creds = self._credentials
+        stats['credential_expiry'] = creds.expiry.isoformat() if creds is not None and creds.expiry else None
+        return stats
+
+
+_registry = GoogleClientRegistry()
+
+def get_registry() -> GoogleClientRegistry:
+    """Return the process-wide client registry."""
+    return _registry
+
+def get_credentials():
+    """Return the shared Google credentials."""
+    return _registry.get_credentials()
+
+def get_service(api: str):
+    """Return the cached Google API service object for `api`."""
+    return _registry.get_service(api)
+
+def get_client_stats() -> dict:
+    """Return the client registry and request governor counters for monitoring."""
+    stats = _registry.get_stats()
+    stats['requests'] = get_governor().get_stats()
+    return stats
+
+get_telemetry().add_collector('google_clients', get_client_stats)
@@ -1,3 +1,5 @@
+from tools.registry import tool
+
 def process_new_email_tool(email_data):
     """
     Tool for the agent to process a new email and decide what to do.
@@ -14,6 +16,7 @@ def process_new_email_tool(email_data):
         "body": body
     }
 
+@tool(process_new_email_tool)
 def get_process_new_email_schema():
     return {
         "name": "process_new_email",
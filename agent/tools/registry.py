@@ -0,0 +1,159 @@
+import importlib
+import threading
+
+# Modules whose schema getters register tools; imported on first use of the registry.
+TOOL_MODULES = (
+    'tools.calendar_tools',
+    'tools.mail_tools',
+    'tools.todos_tools',
+    'tools.process_new_emails_tools',
+    'tools.availability_tools',
+    'tools.contacts_tools',
+)
+# Seconds a read tool may run before its result is abandoned.
+DEFAULT_READ_TIMEOUT = 30.0
+# Seconds a cacheable tool's result is reused unless the tool sets its own ttl.
+DEFAULT_CACHE_TTL = 60.0
+
+_JSON_TYPES = {
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'array': list,
+    'object': dict,
+}
+
+
+class ToolSpec:
+    """A registered tool: its handler, its OpenAI schema and how it may be run."""
+
+    def __init__(self, name, func, schema, write=False, cacheable=False, timeout=None, ttl=None, invalidates=(),
+                 cache_requires=()):
+        self.name = name
+        self.func = func
+        self.schema = schema
+        self.write = write
+        self.cacheable = cacheable
+        self.timeout = timeout
+        self.ttl = ttl
+        # Cached tools whose results this tool makes stale.
+        self.invalidates = tuple(invalidates)
+        # Arguments that must be given for a result to be cached; without them
+        # the tool falls back to a default that changes, like "now".
+        self.cache_requires = tuple(cache_requires)
+
+    def cacheable_with(self, arguments):
+        """Whether the result of a call with these arguments may be cached."""
+        return self.cacheable and all(name in arguments for name in self.cache_requires)
+
+    def validate(self, arguments):
+        """Return a list of problems with `arguments`; empty if they match the schema."""
+        return _validate(arguments, self.schema.get('parameters', {}), 'arguments')
+
+
+def _validate(value, schema, path):
+    expected = schema.get('type')
+    python_type = _JSON_TYPES.get(expected)
+    # bool is an int subclass, but JSON true is not an integer.
+    if python_type is not None and (not isinstance(value, python_type) or
+                                    (isinstance(value, bool) and expected in ('integer', 'number'))):
+        return [f"{path} must be of type {expected}"]
+    if 'enum' in schema and value not in schema['enum']:
+        return [f"{path} must be one of {schema['enum']}"]
+    problems = []
+    if expected == 'object':
+        properties = schema.get('properties', {})
+        for name in schema.get('required', []):
+            if name not in value:
+                problems.append(f"missing required {path}.{name}")
+        for name, item in value.items():
+            if name not in properties:
+                problems.append(f"unknown {path}.{name}")
+            else:
+                problems.extend(_validate(item, properties[name], f"{path}.{name}"))
+    elif expected == 'array' and 'items' in schema:
+        for index, item in enumerate(value):
+            problems.extend(_validate(item, schema['items'], f"{path}[{index}]"))
+    return problems
+
+
+class ToolRegistry:
+    """
+    Name -> ToolSpec table. Tools register through the @tool decorator on
+    their schema getter, so the schema is built once at import; the OpenAI
+    tools list is assembled once and shared by every conversation.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._tools = None
+        self._lock = threading.Lock()
+
+    def register(self, spec):
+        with self._lock:
+            if spec.name in self._specs:
+                raise ValueError(f"Tool {spec.name} is already registered")
+            self._specs[spec.name] = spec
+            self._tools = None
+
+    def get(self, name):
+        """Return the ToolSpec for `name`, or None."""
+        return self._specs.get(name)
+
+    def names(self):
+        return list(self._specs)
+
+    def write_tools(self):
+        return {name for name, spec in self._specs.items() if spec.write}
+
+    def openai_tools(self):
+        """The `tools` list for chat completions, built once."""
+        tools = self._tools
+        if tools is None:
+            with self._lock:
+                if self._tools is None:
+                    self._tools = [{"type": "function", "function": spec.schema} for spec in self._specs.values()]
+                tools = self._tools
+        return tools
+
+
+_registry = ToolRegistry()
+_loaded = False
+_load_lock = threading.Lock()
+
+def tool(func, write=False, cacheable=False, timeout=None, ttl=None, invalidates=(), cache_requires=()):
+    """
+    Register `func` as a tool, using the decorated getter's schema:
+
+        @tool(list_events, cacheable=True)
+        def get_list_events_schema(): ...
+
+    Read tools get DEFAULT_READ_TIMEOUT unless `timeout` is given; write
+    tools are never abandoned midway. Cacheable tools' results are reused
+    for `ttl` seconds (DEFAULT_CACHE_TTL), until a tool listing them in
+    `invalidates` runs; calls missing an argument in `cache_requires` are
+    not cached.
+    """
+    if timeout is None and not write:
+        timeout = DEFAULT_READ_TIMEOUT
+    if ttl is None and cacheable:
+        ttl = DEFAULT_CACHE_TTL
+
+    def decorator(get_schema):
+        schema = get_schema()
+        _registry.register(ToolSpec(schema['name'], func, schema, write, cacheable, timeout, ttl, invalidates,
+                                    cache_requires))
+        return get_schema
+    return decorator
+
+def get_tool_registry():
+    """Return the process-wide tool registry with every tool module loaded."""
+    global _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                for module in TOOL_MODULES:
+                    importlib.import_module(module)
+                _loaded = True
+    return _registry
@@ -0,0 +1,264 @@
+import random
+import socket
+import threading
+import time
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from stage_timer import timed
+from telemetry import span
+
+# Requests per second and burst size per API. Gmail allows 250 quota units
+# per user per second (messages.get costs 5), Calendar about 600 requests
+# per user per minute; Tasks has a daily quota, so it is kept modest.
+API_RATE_LIMITS = {
+    'gmail': (40.0, 100),
+    'calendar': (10.0, 20),
+    'tasks': (5.0, 10),
+}
+# Statuses worth retrying, plus 403s carrying one of these reasons.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# POST methods that are safe to repeat. Other POSTs (messages.send,
+# events.insert, tasks.insert, ...) may have taken effect before a 5xx or a
+# dropped connection, so they are only retried when rate limited.
+IDEMPOTENT_POSTS = {
+    'gmail.users.messages.batchModify',
+    'gmail.users.messages.modify',
+    'gmail.users.watch',
+    'calendar.freebusy.query',
+}
+MAX_RETRIES = 4
+# Retry delay: random between 0 and BACKOFF_BASE * 2^attempt, capped.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 16.0
+# Consecutive failed calls that open an API's circuit, and how long it stays open.
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while its circuit is open."""
+
+
+def _retry_info(error):
+    """
+    (failure, retry_after seconds or None) for an exception raised by a
+    request. failure is 'rate_limited' or 'unavailable' for failures worth
+    retrying, None for errors in the request itself.
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        reason = None
+        if isinstance(error.error_details, list) and error.error_details:
+            reason = error.error_details[0].get('reason')
+        if status == 429 or (status == 403 and reason in RATE_LIMIT_REASONS):
+            failure = 'rate_limited'
+        elif status in RETRYABLE_STATUSES:
+            failure = 'unavailable'
+        else:
+            failure = None
+        try:
+            retry_after = float(error.resp.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+        return failure, retry_after
+    # Dropped connections and timeouts.
+    if isinstance(error, (socket.timeout, ConnectionError, TimeoutError)):
+        return 'unavailable', None
+    return None, None
+
+def _is_idempotent(request):
+    """Whether an HttpRequest can be sent again without repeating its effect."""
+    return request.method != 'POST' or request.methodId in IDEMPOTENT_POSTS
+
+def _status(error):
+    """Status label of a failed request: the HTTP status, or what went wrong before one arrived."""
+    if isinstance(error, HttpError):
+        return str(error.resp.status)
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    return type(error).__name__
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """Take `cost` tokens, sleeping until they are available. Returns the seconds waited."""
+        cost = min(cost, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return waited
+                wait = (cost - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """Closed -> open after FAILURE_THRESHOLD failures -> half-open after OPEN_SECONDS -> closed on success."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                # Let a single trial request through.
+                self._trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trial_running = False
+
+    def failure(self):
+        """Record a failure; returns True if this opened the circuit."""
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+class RequestGovernor:
+    """
+    Shared gate for every Google API request: a token bucket per API keeps
+    the request rate under its quota, retryable failures (429, 5xx,
+    rate-limit 403s, dropped connections) are retried with jittered
+    exponential backoff, and a circuit breaker per API stops calling an API
+    that keeps failing. Other errors (404, 410, ...) are raised unchanged.
+    Requests that are not idempotent are only retried when rate limited.
+    The breaker counts each request once, however often it was retried.
+
+    The registry builds every service with request_class(api), so plain
+    `.execute()` calls go through execute(); batch requests call execute()
+    themselves with the number of calls they carry as cost.
+    """
+
+    def __init__(self, limits=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        limits = limits or API_RATE_LIMITS
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets = {api: TokenBucket(rate, burst) for api, (rate, burst) in limits.items()}
+        self._breakers = {api: CircuitBreaker(failure_threshold, open_seconds) for api in limits}
+        self._request_classes = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {api: {'requests': 0, 'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0,
+                             'circuit_opens': 0, 'throttled': 0, 'throttle_seconds': 0.0}
+                       for api in limits}
+
+    def _count(self, api, name, amount=1):
+        with self._stats_lock:
+            self._stats[api][name] += amount
+
+    def execute(self, api, call, cost=1, endpoint=None, idempotent=True):
+        """
+        Run `call()` for `api` under the rate limit, retry and circuit-breaker
+        policy, as a span labelled with `endpoint` (e.g. gmail.users.messages.list).
+        Pass idempotent=False for calls that must not be repeated after a
+        server error or a dropped connection.
+        """
+        with span("google", api=api, endpoint=endpoint or api, cost=cost) as request:
+            try:
+                result = self._execute(api, call, cost, idempotent, request)
+            except Exception as e:
+                request.set(status=_status(e))
+                raise
+            request.set(status="ok")
+            return result
+
+    def _execute(self, api, call, cost, idempotent, request):
+        bucket = self._buckets[api]
+        breaker = self._breakers[api]
+        self._count(api, 'requests')
+        self._count(api, 'calls', cost)
+        if not breaker.allow():
+            self._count(api, 'rejected')
+            raise CircuitOpenError(f"Google {api} API is unavailable after repeated failures; try again shortly.")
+        attempt = 0
+        while True:
+            waited = bucket.acquire(cost)
+            if waited:
+                self._count(api, 'throttled')
+                self._count(api, 'throttle_seconds', waited)
+            try:
+                with timed(f"google.{api}"):
+                    result = call()
+            except Exception as e:
+                failure, retry_after = _retry_info(e)
+                if failure is None:
+                    # The API answered; the request itself was wrong.
+                    breaker.success()
+                    raise
+                retry = idempotent or failure == 'rate_limited'
+                # Stop early once other requests have opened the circuit,
+                # but with this request's own error.
+                if not retry or attempt >= self.max_retries or breaker.state == 'open':
+                    self._count(api, 'failures')
+                    if breaker.failure():
+                        self._count(api, 'circuit_opens')
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                time.sleep(max(delay, retry_after or 0.0))
+                attempt += 1
+                self._count(api, 'retries')
+                request.set(retries=attempt)
+                continue
+            breaker.success()
+            return result
+
+    def request_class(self, api):
+        """HttpRequest subclass whose execute() goes through this governor, for build(requestBuilder=...)."""
+        if api not in self._request_classes:
+            governor = self
+
+            class GovernedHttpRequest(HttpRequest):
+                def execute(self, http=None, num_retries=0):
+                    return governor.execute(api, lambda: HttpRequest.execute(self, http=http), endpoint=self.methodId,
+                                            idempotent=_is_idempotent(self))
+
+            self._request_classes[api] = GovernedHttpRequest
+        return self._request_classes[api]
+
+    def get_stats(self):
+        """Counters and circuit state per API."""
+        with self._stats_lock:
+            stats = {api: dict(counters) for api, counters in self._stats.items()}
+        for api, counters in stats.items():
+            counters['circuit'] = self._breakers[api].state
+        return stats
+
+
+_governor = RequestGovernor()
+
+def get_governor():
+    """Return the process-wide request governor."""
+    return _governor
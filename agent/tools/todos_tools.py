@@ -1,27 +1,25 @@
-from googleapiclient.discovery import build
-from tools.oauth_integration import get_credentials  # Reuse your OAuth helper
+from tools.oauth_integration import get_service
+from tools.registry import tool
 
 def list_tasks(tasklist_id='@default'):
-    creds = get_credentials()
-    service = build('tasks', 'v1', credentials=creds)
+    service = get_service('tasks')
     results = service.tasks().list(tasklist=tasklist_id, showCompleted=True).execute()
     return results.get('items', [])
 
 def add_task(title, tasklist_id='@default'):
-    creds = get_credentials()
-    service = build('tasks', 'v1', credentials=creds)
+    service = get_service('tasks')
     task = {'title': title}
     result = service.tasks().insert(tasklist=tasklist_id, body=task).execute()
     return result
 
 def complete_task(task_id, tasklist_id='@default'):
-    creds = get_credentials()
-    service = build('tasks', 'v1', credentials=creds)
+    service = get_service('tasks')
     task = service.tasks().get(tasklist=tasklist_id, task=task_id).execute()
     task['status'] = 'completed'
     result = service.tasks().update(tasklist=tasklist_id, task=task_id, body=task).execute()
     return result
 
+@tool(list_tasks, cacheable=True)
 def get_list_tasks_schema():
     return {
         "name": "list_tasks",
@@ -38,6 +36,7 @@ def get_list_tasks_schema():
         }
     }
 
+@tool(add_task, write=True, invalidates=("list_tasks",))
 def get_add_task_schema():
     return {
         "name": "add_task",
@@ -58,6 +57,7 @@ def get_add_task_schema():
         }
     }
 
+@tool(complete_task, write=True, invalidates=("list_tasks",))
 def get_complete_task_schema():
     return {
         "name": "complete_task",